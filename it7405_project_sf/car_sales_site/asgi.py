@@ -3,14 +3,34 @@ ASGI config for car_sales_site project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests served here use asgi_urls, which routes the read-heavy pages to
+the async views in cars/async_views.py.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'car_sales_site.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'car_sales_site.asgi_urls'
+
+
+class CarSalesASGIHandler(ASGIHandler):
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response
+
+
+def get_application():
+    django.setup(set_prefix=False)
+    return CarSalesASGIHandler()
+
+
+application = get_application()
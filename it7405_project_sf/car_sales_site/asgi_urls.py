@@ -0,0 +1,18 @@
+"""
+URLconf of the ASGI app (see asgi.py): the async versions of the read
+pages in front of the normal URLconf, which handles everything else.
+"""
+from django.urls import path, include
+
+from cars import async_views, views as cars_views
+
+urlpatterns = [
+    path('', async_views.home, name='home'),
+    path('cars/', async_views.car_list, name='car_list'),
+    # must stay in front of cars/<str:id>/
+    path('cars/more/', cars_views.car_list_more, name='car_list_more'),
+    path('cars/<str:id>/', async_views.car_detail, name='car_detail'),
+    path('reviews/', async_views.reviews_page, name='reviews'),
+
+    path('', include('car_sales_site.urls')),
+]
@@ -41,7 +41,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so it times everything below it (see cars/instrumentation.py)
+    'cars.middleware.DatabaseInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # static files straight from STATIC_ROOT (precompressed, far-future
+    # caching); answers before anything below runs. WhiteNoise, made
+    # async-capable so the ASGI chain stays async.
+    'cars.middleware.StaticFilesMiddleware',
+    # gzip for rendered pages when the browser accepts it (streamed pages
+    # flushed chunk by chunk). CSRF tokens are masked per response, which
+    # keeps BREACH from recovering them.
+    'cars.middleware.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,7 +64,9 @@ ROOT_URLCONF = 'car_sales_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend plus render timing for the instrumentation middleware
+        'BACKEND': 'cars.instrumentation.InstrumentedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,17 +86,149 @@ WSGI_APPLICATION = 'car_sales_site.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# CLIENT is passed to pymongo's MongoClient (and to the motor client of the
+# async views). djongo keeps one MongoClient per process and every thread
+# shares its pool, but closing a Django connection closes that client, so
+# CONN_MAX_AGE = None keeps the pool open across requests instead of
+# reconnecting on each one.
+#
+# Size maxPoolSize for the busiest process: threads (or concurrent async
+# requests) per worker. Requests that cannot get a connection within
+# waitQueueTimeoutMS fail instead of piling up. See cars/pool_metrics.py
+# and /pool-stats/ for checkout, wait and connection counts.
+
 DATABASES = {
     'default': {
         'ENGINE': 'djongo',
         'NAME': 'car_sales_db',
         'ENFORCE_SCHEMA': False,
+        'CONN_MAX_AGE': None,
         'CLIENT': {
             'host': 'mongodb://localhost:27017',
-        }   
+            'maxPoolSize': 50,
+            'minPoolSize': 0,
+            'maxIdleTimeMS': 5 * 60 * 1000,
+            'waitQueueTimeoutMS': 2000,
+            'connectTimeoutMS': 5000,
+            'serverSelectionTimeoutMS': 5000,
+            'socketTimeoutMS': 30000,
+        }
     }
 }
 
+# Register the pool event listener (cars/pool_metrics.py).
+MONGO_POOL_METRICS = True
+
+# Per-request instrumentation (cars/middleware.py): Server-Timing header and
+# a warning on the 'cars.instrumentation' logger for requests over any of
+# these thresholds.
+DB_INSTRUMENTATION = {
+    'SERVER_TIMING': True,
+    'SLOW_REQUEST_MS': 500,
+    'SLOW_DB_MS': 200,
+    'MAX_OPS': 20,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'cars': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+#
+# 'fragments' holds rendered template fragments ({% cachefragment %} in
+# cars/templatetags/fragment_cache.py). The file based backend is shared
+# by every process on the machine; set FRAGMENT_CACHE_ALIAS = 'default'
+# to keep fragments in per-process local memory instead.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'car-sales',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+    # resolved request.user objects (cars/auth.py); shared by every process
+    # on the machine so that one process dropping an entry drops it for all
+    'users': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'users',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    # only used with the cache session engine (see Sessions below)
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+FRAGMENT_CACHE_ALIAS = 'fragments'
+
+# Fragment keys change with the model versions, so stale entries are never
+# read; the timeout only bounds how long they take up space.
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# car_list as a streamed response (cars/streaming.py): the page head and
+# the filter form go out at once, then the cards follow in chunks straight
+# from the database cursor, so a page can be long without the whole
+# response being built in memory first.
+CAR_LIST_STREAMING = True
+CAR_LIST_STREAM_PAGE_SIZE = 96
+
+# Test drives the showroom can take per day and time of day
+# (cars/slots.py). A full slot can no longer be booked.
+TEST_DRIVE_SLOT_CAPACITY = {
+    'morning': 4,
+    'afternoon': 4,
+    'evening': 2,
+}
+
+
+# Sessions and authentication
+# https://docs.djangoproject.com/en/3.2/topics/http/sessions/
+#
+# Sessions are kept in a signed cookie, so reading one costs no database
+# query. To keep them server side instead (e.g. to end a session from
+# the server), set
+#     SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+# which stores them in the SESSION_CACHE_ALIAS cache; use a cache every
+# web process shares.
+#
+# request.user comes from the USER_CACHE_ALIAS cache (cars/auth.py), so
+# an authenticated request normally does no auth-related database work.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+SESSION_CACHE_ALIAS = 'sessions'
+
+AUTHENTICATION_BACKENDS = ['cars.auth.CachedModelBackend']
+USER_CACHE_ALIAS = 'users'
+USER_CACHE_TIMEOUT = 60 * 60
 
 
 # Password validation
@@ -125,11 +269,61 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# `manage.py collectstatic` copies the static files here, renames them
+# with a content hash (styles.abc123.css, also inside url() references in
+# CSS) and writes .gz and .br copies next to them. WhiteNoise then serves
+# the hashed names with "Cache-Control: max-age=315360000, immutable" and
+# the smallest encoding the browser accepts. With DEBUG off, collectstatic
+# must run before the site starts (the manifest maps names to hashes).
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Uploaded files and the resized car images (cars/images.py). Served by
+# Django only while DEBUG is on; in production the web server serves
+# MEDIA_ROOT under MEDIA_URL.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Widths of the resized car images; each is written as WebP and JPEG.
+CAR_IMAGE_WIDTHS = (240, 480, 800, 1200)
+CAR_IMAGE_QUALITY = {'webp': 80, 'jpeg': 82}
+# Remote images bigger than this are rejected.
+CAR_IMAGE_MAX_BYTES = 15 * 1024 * 1024
+CAR_IMAGE_FETCH_TIMEOUT = 10
+
+
+# Background jobs (cars/jobs.py)
+#
+# Work that can follow a form POST (confirmation emails, fetching a new
+# car image) is queued in MongoDB and run by `manage.py run_jobs`. With
+# JOBS_IN_PROCESS each web process runs the queue on a thread of its own
+# instead, e.g. under runserver when no worker is started.
+
+JOBS_IN_PROCESS = False
+JOBS_BATCH_SIZE = 50
+JOBS_MAX_ATTEMPTS = 5
+# seconds before a failed job is retried, doubled after every attempt
+JOBS_RETRY_DELAY = 30
+# a job not finished this long after it was taken is taken again
+# (its worker is assumed dead)
+JOBS_LEASE_SECONDS = 5 * 60
+
+
+# Email (the confirmation emails sent by cars/tasks.py). Printed to the
+# worker's console; configure an SMTP backend to really send them.
+# https://docs.djangoproject.com/en/3.2/topics/email/
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'Car Sales <no-reply@carsales.example>'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# `manage.py test` runs on an in-process MongoDB stand-in (cars/test_runner.py)
+TEST_RUNNER = 'cars.test_runner.StandInTestRunner'
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
@@ -14,3 +16,6 @@ urlpatterns = [
     # Cars app
     path('', include('cars.urls')),
 ]
+
+# resized car images (only while DEBUG is on; see settings.MEDIA_ROOT)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,8 +1,93 @@
-from django.contrib import admin
-from .models import Car, Order, Offer, Review, Appointment
+from django import forms
+from django.contrib import admin, messages
+
+from .car_stats import get_car_stats
+from .images import ImageError, process_upload
+from .jobs import FAILED, enqueue, retry_failed
+from .models import Car, Order, Offer, Review, Appointment, Job
+
+
+class CarAdminForm(forms.ModelForm):
+    image_upload = forms.ImageField(
+        required=False,
+        help_text="Upload a photo instead of linking one; it replaces the image URL.",
+    )
+
+    class Meta:
+        model = Car
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['image_url'].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('image_url') and not cleaned_data.get('image_upload'):
+            self.add_error('image_url', "Give an image URL or upload a photo.")
+        return cleaned_data
+
+
+@admin.register(Car)
+class CarAdmin(admin.ModelAdmin):
+    form = CarAdminForm
+    list_display = ('__str__', 'price', 'image_widths')
+    readonly_fields = ('image_key', 'image_width', 'image_height', 'image_widths', 'offers_and_orders')
+
+    @admin.display(description="Offers and purchase requests")
+    def offers_and_orders(self, obj):
+        if obj._id is None:
+            return "-"
+        stats = get_car_stats(obj._id)
+        offers = ', '.join(f"{n} {status}" for status, n in stats['offers'].items())
+        orders = ', '.join(f"{n} {status}" for status, n in stats['orders'].items())
+        text = f"{stats['offer_count']} offers ({offers}); {stats['order_count']} purchase requests ({orders})"
+        if stats['offer_count']:
+            text += f"; highest ${stats['offer_max']}, average ${stats['offer_average']}"
+        return text
+
+    def save_model(self, request, obj, form, change):
+        # resized copies for the cards and the detail page (cars/images.py):
+        # an upload is only available during this request; an image URL is
+        # fetched by a background job (cars/tasks.py) so saving does not wait
+        fetch = False
+        if form.cleaned_data.get('image_upload'):
+            try:
+                process_upload(obj, form.cleaned_data['image_upload'])
+            except ImageError as e:
+                messages.warning(request, f"The image was saved as a link only: {e}")
+        elif 'image_url' in form.changed_data or not obj.image_key:
+            fetch = True
+        super().save_model(request, obj, form, change)
+        if fetch:
+            enqueue('car_image', car_id=str(obj._id))
+            messages.info(request, "The resized copies of the image are being made in the background.")
+
 
-admin.site.register(Car)
 admin.site.register(Order)
 admin.site.register(Offer)
 admin.site.register(Review)
-admin.site.register(Appointment)
+
+
+@admin.register(Appointment)
+class AppointmentAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'preferred_date', 'preferred_time', 'status')
+    list_filter = ('status', 'preferred_time')
+
+    def save_model(self, request, obj, form, change):
+        # staff may book a slot past its capacity (cars/slots.py)
+        obj.ignore_slot_capacity = True
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at', 'last_error')
+    list_filter = ('status', 'task')
+    readonly_fields = ('claimed_by', 'last_error', 'created_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description="Retry the selected failed jobs")
+    def retry_jobs(self, request, queryset):
+        count = retry_failed(job._id for job in queryset if job.status == FAILED)
+        self.message_user(request, f"{count} jobs queued again.")
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class CarsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cars'
+
+    def ready(self):
+        # Connect the model signal handlers
+        from . import signals  # noqa: F401
+
+        # Register the background tasks run by cars/jobs.py
+        from . import tasks  # noqa: F401
+
+        # Count MongoDB pool events; must happen before the first client
+        # is created (djongo and motor create theirs lazily)
+        from django.conf import settings
+        if getattr(settings, 'MONGO_POOL_METRICS', True):
+            from . import pool_metrics
+            pool_metrics.register()
+
+        # Per-request MongoDB operation timing (cars/middleware.py)
+        from . import instrumentation
+        instrumentation.register()
@@ -0,0 +1,45 @@
+"""
+Async MongoDB access for the ASGI views (cars/async_views.py).
+
+djongo only has the blocking pymongo driver, so the async views use a
+motor client built from the same DATABASES settings (NAME and CLIENT).
+motor is only imported here, so the WSGI site does not need it.
+
+A motor client belongs to the event loop it was first used on; one
+client is kept per loop and reused by every request on it.
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+
+
+# event loop -> {alias: client}
+_clients = weakref.WeakKeyDictionary()
+
+
+def _client_settings(using):
+    database = settings.DATABASES[using]
+    return database['NAME'], dict(database.get('CLIENT', {}))
+
+
+def get_async_db(using='default'):
+    """
+    Return the motor database for the given Django connection alias.
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    name, options = _client_settings(using)
+    if using not in clients:
+        clients[using] = AsyncIOMotorClient(io_loop=loop, **options)
+    return clients[using][name]
+
+
+def get_async_collection(model_or_name, using='default'):
+    if isinstance(model_or_name, str):
+        name = model_or_name
+    else:
+        name = model_or_name._meta.db_table
+    return get_async_db(using)[name]
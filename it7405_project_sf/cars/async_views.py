@@ -0,0 +1,217 @@
+"""
+Async versions of the read-heavy pages, served by the ASGI app.
+
+car_sales_site/asgi.py routes `/`, `/cars/`, `/cars/<id>/` and `/reviews/`
+here (see car_sales_site/asgi_urls.py); everything else, and the review
+form POST, still goes to the normal views.
+
+The queries are the same as in cars/views.py (the pipelines come from
+cars/queries.py etc.) but run on a motor client, and independent ones are
+started together with asyncio.gather(), so one request waits for the
+slowest query instead of the sum of all of them. Values the templates
+would otherwise load lazily through djongo (the user, the model versions
+used by {% cachefragment %}) are loaded before rendering, because the
+blocking driver cannot be used from the event loop.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import car_stats, conditional, views
+from .async_mongo import get_async_collection
+from .instrumentation import record_operation
+from .counters import COUNTERS_PROJECTION, COUNTERS_QUERY, counters_from_docs
+from .forms import ReviewForm
+from .models import Car, Review, ReviewStats, SimilarCars, SiteCounter
+from .queries import (
+    car_from_doc,
+    car_page_from_docs,
+    car_page_pipeline,
+    decode_car_cursor,
+    parse_car_filters,
+    review_page_from_docs,
+    review_page_pipeline,
+)
+from .recommendations import (
+    RECOMMENDATION_COUNT,
+    similar_cars_changed,
+    similar_cars_from_docs,
+    similar_cars_pipeline,
+)
+from .review_stats import STATS_NAME, stats_from_doc
+from .versions import VERSIONS_PROJECTION, VERSIONS_QUERY, versions_from_docs
+
+
+# ---------- helpers ----------
+
+# motor runs commands on its own threads, outside the request context the
+# pymongo command listener relies on, so they are timed here instead
+# (see cars/instrumentation.py)
+
+async def _timed(statement, operation):
+    started = time.perf_counter()
+    try:
+        return await operation
+    finally:
+        record_operation(statement, (time.perf_counter() - started) * 1000)
+
+
+async def _find(model, query, projection=None, limit=0):
+    collection = get_async_collection(model)
+    cursor = collection.find(query, projection, limit=limit)
+    return await _timed(f"find {collection.name}", cursor.to_list(length=None))
+
+
+async def _find_one(model, query, projection=None):
+    collection = get_async_collection(model)
+    return await _timed(f"find {collection.name}", collection.find_one(query, projection))
+
+
+async def _aggregate(model, pipeline):
+    collection = get_async_collection(model)
+    cursor = collection.aggregate(pipeline)
+    return await _timed(f"aggregate {collection.name}", cursor.to_list(length=None))
+
+
+def _load_user(request):
+    # the user comes from the file based user cache (a djongo query on a
+    # miss); run in a worker thread (not the single thread-sensitive one)
+    # so requests do not queue up
+    return request.user.is_authenticated
+
+
+async def _prepare(request, *queries):
+    """
+    Run the page's queries together with the user and version lookups
+    every page needs. Returns the results of `queries`.
+    """
+    results = await asyncio.gather(
+        sync_to_async(_load_user, thread_sensitive=False)(request),
+        _find(SiteCounter, VERSIONS_QUERY, VERSIONS_PROJECTION),
+        *queries,
+    )
+    versions_from_docs(results[1], request)
+    return results[2:]
+
+
+def _not_modified(request, etag, last_modified):
+    """
+    The 304 (or 412) response for a conditional GET, or None.
+    Same rules as django.views.decorators.http.condition.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _with_validators(response, etag, last_modified):
+    if etag and not response.has_header('ETag'):
+        response['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+# ---------- pages ----------
+
+async def home(request):
+    counter_docs, stats_doc = await _prepare(
+        request,
+        _find(SiteCounter, COUNTERS_QUERY, COUNTERS_PROJECTION),
+        _find_one(ReviewStats, {'name': STATS_NAME}),
+    )
+    context = views.home_context(counters_from_docs(counter_docs), stats_from_doc(stats_doc))
+    return render(request, 'cars/home.html', context)
+
+
+async def car_list(request):
+    filters = parse_car_filters(request.GET)
+    after = decode_car_cursor(request.GET.get('after'))
+
+    # the versions are all the validators need, so check them first
+    await _prepare(request)
+    etag = conditional.car_list_etag(request)
+    last_modified = conditional.car_list_last_modified(request)
+    response = _not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    docs = await _aggregate(Car, car_page_pipeline(filters, after))
+    cars, next_cursor = car_page_from_docs(docs, after)
+    response = render(request, 'cars/car_list.html',
+                      views.car_list_context(request, cars, next_cursor, after))
+    return _with_validators(response, etag, last_modified)
+
+
+async def car_detail(request, id):
+    try:
+        car_id = ObjectId(id)
+    except (InvalidId, TypeError):
+        raise Http404("Invalid object ID.")
+
+    # the car with its offer/order figures, its precomputed similar cars
+    # and the versions, all at once
+    car_docs, similar_docs = await _prepare(
+        request,
+        _aggregate(Car, car_stats.car_with_stats_pipeline(car_id)),
+        _aggregate(SimilarCars, similar_cars_pipeline(car_id)),
+    )
+    if not car_docs:
+        raise Http404("Car not found.")
+    car_doc = car_docs[0]
+
+    conditional.car_detail_changed(request, car_doc, similar_docs[0] if similar_docs else None)
+    etag = conditional.car_detail_etag(request, id)
+    last_modified = conditional.car_detail_last_modified(request, id)
+    response = _not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    car = car_from_doc(car_doc)
+    car.updated_at = car_doc.get('updated_at')
+    other_cars = similar_cars_from_docs(similar_docs)
+    if other_cars is None:
+        docs = await _find(Car, {'_id': {'$ne': car_id}}, limit=RECOMMENDATION_COUNT)
+        other_cars = [car_from_doc(doc) for doc in docs]
+
+    response = render(request, 'cars/car_detail.html', {
+        'car': car,
+        'car_stats': car_stats.stats_from_doc(car_doc.get('stats')),
+        'other_cars': other_cars,
+        'similar_changed': similar_cars_changed(similar_docs),
+    })
+    return _with_validators(response, etag, last_modified)
+
+
+async def reviews_page(request):
+    if request.method == 'POST':
+        # writes go through the ORM (signals keep the stats up to date)
+        return await sync_to_async(views.reviews_page)(request)
+
+    rating_filter, sort, after, before = views.review_page_params(request)
+
+    await _prepare(request)
+    etag = conditional.reviews_etag(request)
+    last_modified = conditional.reviews_last_modified(request)
+    response = _not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    # the page of reviews and the precomputed stats, at once
+    page_docs, stats_doc = await asyncio.gather(
+        _aggregate(Review, review_page_pipeline(rating_filter, sort, after, before)),
+        _find_one(ReviewStats, {'name': STATS_NAME}),
+    )
+    reviews, next_cursor, prev_cursor = review_page_from_docs(page_docs, after, before)
+
+    response = render(request, 'cars/reviews.html', views.reviews_context(
+        ReviewForm(), reviews, next_cursor, prev_cursor, stats_from_doc(stats_doc),
+        rating_filter, sort,
+    ))
+    return _with_validators(response, etag, last_modified)
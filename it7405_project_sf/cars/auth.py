@@ -0,0 +1,56 @@
+"""
+User lookups without a database round trip.
+
+AuthenticationMiddleware resolves request.user through the backend's
+get_user() on every authenticated request, which used to be one query
+for the User row (on top of the session row, now gone with the signed
+cookie sessions in settings.py).
+
+CachedModelBackend keeps the User in the USER_CACHE_ALIAS cache under
+"user:<id>" and only reads the database on a miss. The password hash is
+part of the cached object, so Django's session hash check still logs
+out sessions whose password changed.
+
+The entry is dropped by the User save/delete signals (cars/signals.py):
+account_settings saving UserUpdateForm, a login updating last_login, a
+password change, the admin. USER_CACHE_TIMEOUT bounds how long a change
+made without signals (queryset.update()) can go unnoticed.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+
+USER_CACHE_TIMEOUT = 60 * 60
+
+
+def user_cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def _user_key(user_id):
+    return f'user:{user_id}'
+
+
+def invalidate_user(user_id):
+    user_cache().delete(_user_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() is served from the cache.
+    """
+
+    def get_user(self, user_id):
+        cache = user_cache()
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = UserModel._default_manager.get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(key, user, getattr(settings, 'USER_CACHE_TIMEOUT', USER_CACHE_TIMEOUT))
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,82 @@
+"""
+Shared, cached list of car labels for the test-drive appointment form.
+
+AppointmentForm used to query and label the whole inventory every time it
+was built. The list is now built once (one projected, sorted query)
+and kept in each process's local cache under the current "car" version
+(cars/versions.py). Saving or deleting a car, an import or a seed bumps
+the version, so every process rebuilds the list on its next use;
+CAR_CHOICES_TIMEOUT only bounds how long old lists take up memory.
+
+The form no longer renders the list as <option> tags; the picker on the
+appointments page asks `car_choice_search` for matching labels instead.
+"""
+from django.core.cache import cache
+
+from . import versions
+from .models import Car
+
+
+CAR_CHOICES_CACHE_KEY = 'cars:choices:{version}'
+CAR_CHOICES_TIMEOUT = 600
+
+# How many matches the picker endpoint returns.
+CAR_PICKER_LIMIT = 20
+
+
+def car_label(make, model, year):
+    return f"{make} {model} ({year})"
+
+
+def _build_choices():
+    docs = Car.objects.mongo_find(
+        {}, {'make': 1, 'model': 1, 'year': 1}
+    ).sort([('make', 1), ('model', 1), ('year', 1)])
+
+    labels = []
+    by_id = {}
+    seen = set()
+    for doc in docs:
+        label = car_label(doc.get('make', ''), doc.get('model', ''), doc.get('year', ''))
+        by_id[str(doc['_id'])] = label
+        if label not in seen:
+            seen.add(label)
+            labels.append(label)
+    return {'labels': labels, 'by_id': by_id}
+
+
+def get_car_choices(request=None):
+    """
+    {'labels': [label, ...] sorted by make/model/year, without duplicates,
+     'by_id': {car id (hex): label}}
+
+    Costs the version read (memoized on `request`) when the list is cached.
+    """
+    key = CAR_CHOICES_CACHE_KEY.format(version=versions.get_versions(request)['car'])
+    return cache.get_or_set(key, _build_choices, CAR_CHOICES_TIMEOUT)
+
+
+def is_valid_car_label(label, request=None):
+    return label in get_car_choices(request)['labels']
+
+
+def label_for_car_id(car_id, request=None):
+    """
+    Label for ?car=<mongo_id>, or None. Served from the cache.
+    """
+    return get_car_choices(request)['by_id'].get(car_id)
+
+
+def search_car_labels(term, limit=CAR_PICKER_LIMIT, request=None):
+    """
+    Labels containing every word of `term` (case-insensitive), in order.
+    """
+    words = term.lower().split()
+    matches = []
+    for label in get_car_choices(request)['labels']:
+        lower = label.lower()
+        if all(word in lower for word in words):
+            matches.append(label)
+            if len(matches) >= limit:
+                break
+    return matches
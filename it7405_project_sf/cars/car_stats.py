@@ -0,0 +1,301 @@
+"""
+Per-car offer and order figures (a small read model for Offer and Order).
+
+One CarStats document per car that has offers or orders:
+  offer_count  - number of offers
+  offer_sum    - total of their amounts (average = offer_sum / offer_count)
+  offer_max    - highest amount (None without offers)
+  offers       - {"pending": n, "accepted": n, "rejected": n}
+  order_count  - number of purchase requests
+  orders       - {"pending": n, "confirmed": n, "rejected": n}
+  updated_at   - time of the last change (car_detail's ETag)
+
+It is updated by the Offer and Order signals in cars/signals.py with one
+atomic $inc/$max update per change: make_offer and buy_car creating,
+the admin changing a status or an amount, delete_offer and delete_order
+deleting. Only removing the highest offer needs a read: one query on
+offer_car_amount_idx for the next highest.
+
+car_with_stats_pipeline() reads a car together with its figures, so
+car_detail gets both in the query that loads the car.
+`manage.py rebuild_car_stats` recomputes every document from scratch.
+"""
+import time
+
+from bson.decimal128 import Decimal128
+from django.utils import timezone
+from pymongo import ReplaceOne
+
+from .models import CarStats, Offer, Order
+from .mongo import get_collection
+
+
+OFFER_STATUSES = [value for value, _ in Offer._meta.get_field('status').choices]
+ORDER_STATUSES = [value for value, _ in Order._meta.get_field('status').choices]
+
+WRITE_BATCH_SIZE = 1000
+
+
+def _decimal128(value):
+    return Decimal128(str(value))
+
+
+def _decimal(value):
+    # djongo hands DecimalField values back as Decimal128
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return value
+
+
+def _update(car_id, update, upsert=False):
+    """
+    Apply `update` to a car's document. Deletes never upsert: deleting a
+    car deletes its offers and orders too, and their signals must not
+    bring the car's document back.
+    """
+    update.setdefault('$currentDate', {})['updated_at'] = True
+    return get_collection(CarStats).find_one_and_update(
+        {'car_id': car_id}, update, projection={'offer_max': 1}, upsert=upsert,
+    )
+
+
+def _refresh_offer_max(car_id, removed_amount):
+    """
+    The offer with the highest amount went away (or went down): look up
+    the next highest. Only written while offer_max is still the removed
+    amount, so a higher offer created meanwhile is kept.
+    """
+    doc = next(iter(
+        Offer.objects.mongo_find({'car_id': car_id}, {'amount': 1}).sort('amount', -1).limit(1)
+    ), None)
+    CarStats.objects.mongo_update_one(
+        {'car_id': car_id, 'offer_max': _decimal128(removed_amount)},
+        {'$set': {'offer_max': doc['amount'] if doc is not None else None}},
+    )
+
+
+def _was_max(stats, amount):
+    return stats is not None and _decimal(stats.get('offer_max')) == amount
+
+
+# ---------- offers ----------
+
+def offer_created(offer):
+    amount = _decimal128(_decimal(offer.amount))
+    _update(offer.car_id, {
+        '$inc': {'offer_count': 1, 'offer_sum': amount, f'offers.{offer.status}': 1},
+        '$max': {'offer_max': amount},
+    }, upsert=True)
+
+
+def offer_changed(offer, old_status, old_amount):
+    """
+    An existing offer was edited (its status and/or its amount).
+    """
+    amount, old_amount = _decimal(offer.amount), _decimal(old_amount)
+    update = {'$inc': {}}
+    if old_status is not None and old_status != offer.status:
+        update['$inc'][f'offers.{old_status}'] = -1
+        update['$inc'][f'offers.{offer.status}'] = 1
+    if old_amount is not None and old_amount != amount:
+        update['$inc']['offer_sum'] = _decimal128(amount - old_amount)
+        update['$max'] = {'offer_max': _decimal128(amount)}
+    if not update['$inc']:
+        return
+
+    stats = _update(offer.car_id, update)
+    if old_amount is not None and amount < old_amount and _was_max(stats, old_amount):
+        _refresh_offer_max(offer.car_id, old_amount)
+
+
+def offer_deleted(offer):
+    amount = _decimal(offer.amount)
+    stats = _update(offer.car_id, {
+        '$inc': {
+            'offer_count': -1,
+            'offer_sum': _decimal128(-amount),
+            f'offers.{offer.status}': -1,
+        },
+    })
+    if _was_max(stats, amount):
+        _refresh_offer_max(offer.car_id, amount)
+
+
+# ---------- orders ----------
+
+def order_created(order):
+    _update(order.car_id, {
+        '$inc': {'order_count': 1, f'orders.{order.status}': 1},
+    }, upsert=True)
+
+
+def order_changed(order, old_status):
+    if old_status is not None and old_status != order.status:
+        _update(order.car_id, {
+            '$inc': {f'orders.{old_status}': -1, f'orders.{order.status}': 1},
+        })
+
+
+def order_deleted(order):
+    _update(order.car_id, {
+        '$inc': {'order_count': -1, f'orders.{order.status}': -1},
+    })
+
+
+# ---------- rebuild ----------
+
+def rebuild_pipeline(order_model=Order):
+    """
+    Offers grouped by (car, status), with the orders grouped the same way
+    appended through $unionWith, then everything grouped by car: one
+    aggregation over both collections.
+    """
+    return [
+        {'$group': {
+            '_id': {'car_id': '$car_id', 'status': '$status'},
+            'count': {'$sum': 1},
+            'sum': {'$sum': '$amount'},
+            'max': {'$max': '$amount'},
+        }},
+        {'$addFields': {'kind': 'offers'}},
+        {'$unionWith': {
+            'coll': order_model._meta.db_table,
+            'pipeline': [
+                {'$group': {
+                    '_id': {'car_id': '$car_id', 'status': '$status'},
+                    'count': {'$sum': 1},
+                }},
+                {'$addFields': {'kind': 'orders'}},
+            ],
+        }},
+        {'$group': {
+            '_id': '$_id.car_id',
+            'rows': {'$push': {
+                'kind': '$kind',
+                'status': '$_id.status',
+                'count': '$count',
+                'sum': '$sum',
+                'max': '$max',
+            }},
+        }},
+    ]
+
+
+def _stats_doc(car_id, rows, now):
+    doc = {
+        'car_id': car_id,
+        'offer_count': 0,
+        'offer_sum': _decimal128(0),
+        'offer_max': None,
+        'offers': {},
+        'order_count': 0,
+        'orders': {},
+        'updated_at': now,
+    }
+    offer_sum = 0
+    for row in rows:
+        if row['kind'] == 'orders':
+            doc['order_count'] += row['count']
+            doc['orders'][row['status']] = row['count']
+            continue
+        doc['offer_count'] += row['count']
+        doc['offers'][row['status']] = row['count']
+        offer_sum += _decimal(row.get('sum')) or 0
+        amount = _decimal(row.get('max'))
+        if amount is not None and (doc['offer_max'] is None or amount > _decimal(doc['offer_max'])):
+            doc['offer_max'] = row['max']
+    doc['offer_sum'] = _decimal128(offer_sum)
+    return doc
+
+
+def rebuild(stats_model=CarStats, offer_model=Offer, order_model=Order, stdout=None):
+    """
+    Recompute every car's document with rebuild_pipeline() and drop the
+    documents of cars that no longer have offers or orders. Changes made
+    while it runs may be overwritten; run it when the site is quiet.
+    Returns the number of cars with figures.
+
+    The model arguments let migrations pass their historical models.
+    """
+    started = time.perf_counter()
+    now = timezone.now()
+    collection = get_collection(stats_model)
+
+    cars = 0
+    batch = []
+    for row in get_collection(offer_model).aggregate(rebuild_pipeline(order_model)):
+        if row['_id'] is None:
+            continue
+        cars += 1
+        batch.append(ReplaceOne({'car_id': row['_id']}, _stats_doc(row['_id'], row['rows'], now),
+                                upsert=True))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+
+    # every document written above has updated_at >= now
+    removed = collection.delete_many(
+        {'$or': [{'updated_at': {'$lt': now}}, {'updated_at': None}]}
+    ).deleted_count
+
+    if stdout is not None:
+        stdout.write(
+            f"{cars} cars with offers or orders, {removed} stale documents removed "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+    return cars
+
+
+# ---------- reading ----------
+
+def car_with_stats_pipeline(car_id, projection=None):
+    """
+    One car (all fields, or `projection`) with its CarStats document as
+    `stats` (missing when the car has no offers or orders).
+    """
+    pipeline = [{'$match': {'_id': car_id}}, {'$limit': 1}]
+    if projection is not None:
+        pipeline.append({'$project': projection})
+    pipeline += [
+        {'$lookup': {
+            'from': CarStats._meta.db_table,
+            'localField': '_id',
+            'foreignField': 'car_id',
+            'as': 'stats',
+        }},
+        {'$addFields': {'stats': {'$arrayElemAt': ['$stats', 0]}}},
+    ]
+    return pipeline
+
+
+def stats_from_doc(doc):
+    """
+    A template-friendly dict for a CarStats document (or None):
+      offer_count, offer_max, offer_average, offers {status: n},
+      order_count, orders {status: n}, pending_offers, pending_orders
+    """
+    doc = doc or {}
+    offer_count = max(doc.get('offer_count', 0), 0)
+    offer_sum = _decimal(doc.get('offer_sum')) or 0
+    offers = doc.get('offers') or {}
+    orders = doc.get('orders') or {}
+
+    return {
+        'offer_count': offer_count,
+        'offer_max': _decimal(doc.get('offer_max')) if offer_count else None,
+        'offer_average': round(offer_sum / offer_count, 2) if offer_count else None,
+        'offers': {s: max(offers.get(s, 0), 0) for s in OFFER_STATUSES},
+        'order_count': max(doc.get('order_count', 0), 0),
+        'orders': {s: max(orders.get(s, 0), 0) for s in ORDER_STATUSES},
+        'pending_offers': max(offers.get('pending', 0), 0),
+        'pending_orders': max(orders.get('pending', 0), 0),
+    }
+
+
+def get_car_stats(car_id):
+    """
+    stats_from_doc() for one car, read on its own (one indexed lookup).
+    """
+    return stats_from_doc(CarStats.objects.mongo_find_one({'car_id': car_id}))
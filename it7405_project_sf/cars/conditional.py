@@ -0,0 +1,151 @@
+"""
+Validators for conditional GETs (ETag / Last-Modified).
+
+Used with django.views.decorators.http.condition(): the functions below
+run before the view, so a returning visitor whose copy is still current
+gets a 304 without the page queries or the template being run.
+
+  car_list     - the "car" version (cars/versions.py) + the query string
+  reviews_page - the "review" version + the query string
+  car_detail   - the car's updated_at + when its similar-cars list was
+                 last recomputed (that happens whenever a listed car
+                 changes, see cars/recommendations.py) + when its offer
+                 and order figures last changed (cars/car_stats.py)
+
+The ETag also carries the user id and the CSRF cookie, because the
+navbar shows the username and the review form embeds a CSRF token.
+
+car_detail's validators read the documents the page is rendered from
+(car_detail_docs()) and leave them on the request, so a page that has
+to be rendered does not query them a second time.
+"""
+import hashlib
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+
+from .car_stats import car_with_stats_pipeline
+from .models import Car, SimilarCars
+from .queries import aware
+from .recommendations import similar_cars_pipeline
+from .versions import get_versions, last_changed
+
+
+def _etag(request, *parts):
+    parts = parts + (
+        request.user.pk if request.user.is_authenticated else '',
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+    digest = hashlib.md5('|'.join(str(p) for p in parts).encode()).hexdigest()
+    # weak: the CSRF token in the page is masked differently on every render
+    return f'W/"{digest}"'
+
+
+def _is_read(request):
+    return request.method in ('GET', 'HEAD')
+
+
+def _query_string(request):
+    return '&'.join(sorted(request.GET.urlencode().split('&')))
+
+
+# ---------- car_list ----------
+
+def car_list_etag(request):
+    if not _is_read(request):
+        return None
+    return _etag(request, 'car_list', get_versions(request)['car'], _query_string(request))
+
+
+def car_list_last_modified(request):
+    if not _is_read(request):
+        return None
+    return last_changed('car', request)
+
+
+# ---------- reviews_page ----------
+
+def reviews_etag(request):
+    if not _is_read(request):
+        return None
+    return _etag(request, 'reviews', get_versions(request)['review'], _query_string(request))
+
+
+def reviews_last_modified(request):
+    if not _is_read(request):
+        return None
+    return last_changed('review', request)
+
+
+# ---------- car_detail ----------
+
+def car_detail_changed(request, car_doc, similar_doc):
+    """
+    Latest of the car's, its similar-cars list's and its offer/order
+    figures' modification times, memoized on the request. `car_doc` comes
+    from car_with_stats_pipeline(). None when the car does not exist or
+    has never been timestamped.
+    """
+    changed = None
+    if car_doc is not None and car_doc.get('updated_at') is not None:
+        if similar_doc is not None:
+            similar_changed = similar_doc.get('updated_at')
+        else:
+            # the page falls back to arbitrary other cars
+            similar_changed = last_changed('car', request)
+        stats_changed = (car_doc.get('stats') or {}).get('updated_at')
+        times = [aware(car_doc['updated_at']), aware(similar_changed), aware(stats_changed)]
+        changed = max(t for t in times if t is not None)
+
+    request._car_detail_changed = changed
+    return changed
+
+
+def car_detail_docs(request, id):
+    """
+    The rows car_detail is rendered from: (car_with_stats_pipeline() rows,
+    similar_cars_pipeline() rows), each list empty when there is nothing.
+    Read once per request, by whichever of the validators and the view
+    asks first (the async view reads the same two in parallel).
+    """
+    if hasattr(request, '_car_detail_docs'):
+        return request._car_detail_docs
+
+    car_docs = similar_docs = []
+    try:
+        car_id = ObjectId(id)
+    except (InvalidId, TypeError):
+        car_id = None
+    if car_id is not None:
+        car_docs = list(Car.objects.mongo_aggregate(car_with_stats_pipeline(car_id)))
+    if car_docs:
+        similar_docs = list(SimilarCars.objects.mongo_aggregate(similar_cars_pipeline(car_id)))
+
+    request._car_detail_docs = (car_docs, similar_docs)
+    return request._car_detail_docs
+
+
+def _car_detail_changed(request, id):
+    if hasattr(request, '_car_detail_changed'):
+        return request._car_detail_changed
+
+    car_docs, similar_docs = car_detail_docs(request, id)
+    return car_detail_changed(
+        request, car_docs[0] if car_docs else None, similar_docs[0] if similar_docs else None,
+    )
+
+
+def car_detail_etag(request, id):
+    if not _is_read(request):
+        return None
+    changed = _car_detail_changed(request, id)
+    if changed is None:
+        return None
+    return _etag(request, 'car_detail', id, changed.isoformat())
+
+
+def car_detail_last_modified(request, id):
+    if not _is_read(request):
+        return None
+    return _car_detail_changed(request, id)
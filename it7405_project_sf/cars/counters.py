@@ -0,0 +1,85 @@
+"""
+Materialized site counters.
+
+home() used to run three count() queries on every hit. Instead, one
+SiteCounter document per counted model is kept up to date with atomic
+$inc updates from save/delete signals, and all of them are read back in
+a single find().
+
+Signals do not fire for bulk writes done straight through pymongo, so
+`manage.py reconcile_counters` recounts everything and fixes any drift.
+Run it periodically (e.g. from cron) and after bulk imports.
+"""
+from .models import Car, Review, Appointment, SiteCounter
+from .mongo import get_collection
+
+
+# counter name -> model it counts
+COUNTED_MODELS = {
+    'cars': Car,
+    'reviews': Review,
+    'appointments': Appointment,
+}
+
+
+def counter_name(model):
+    for name, counted in COUNTED_MODELS.items():
+        if counted is model:
+            return name
+    return None
+
+
+def increment(name, delta=1):
+    """
+    Atomically add `delta` to a counter (creating it if needed).
+    """
+    SiteCounter.objects.mongo_update_one(
+        {'name': name},
+        {'$inc': {'value': delta}},
+        upsert=True,
+    )
+
+
+COUNTERS_QUERY = {'name': {'$in': list(COUNTED_MODELS)}}
+COUNTERS_PROJECTION = {'_id': 0, 'name': 1, 'value': 1}
+
+
+def counters_from_docs(docs):
+    counters = dict.fromkeys(COUNTED_MODELS, 0)
+    for doc in docs:
+        counters[doc['name']] = doc.get('value', 0)
+    return counters
+
+
+def get_counters():
+    """
+    Return {name: value} for every counter, in one query.
+    Counters that do not exist yet read as 0.
+    """
+    return counters_from_docs(
+        SiteCounter.objects.mongo_find(COUNTERS_QUERY, COUNTERS_PROJECTION)
+    )
+
+
+def reconcile(counter_model=SiteCounter, counted_models=None):
+    """
+    Recount every counted collection and overwrite the stored values.
+    Returns a list of (name, old_value, new_value).
+
+    The model arguments let migrations pass their historical models.
+    """
+    if counted_models is None:
+        counted_models = COUNTED_MODELS
+
+    counters = get_collection(counter_model)
+    results = []
+    for name, model in counted_models.items():
+        actual = get_collection(model).count_documents({})
+        doc = counters.find_one_and_update(
+            {'name': name},
+            {'$set': {'value': actual}},
+            upsert=True,
+        )
+        old = doc.get('value', 0) if doc else None
+        results.append((name, old, actual))
+    return results
@@ -0,0 +1,184 @@
+"""
+Streaming CSV / JSONL exports of orders, offers and appointments.
+
+Rows are read through one server-side cursor in _id order, EXPORT_BATCH_SIZE
+documents at a time. For each batch the car labels and usernames are
+resolved with one $in query per collection (not one per row), then the
+rows are formatted and yielded. Nothing else is kept, so memory use is
+the same for a thousand rows or a million.
+
+Used by the staff export view and by `manage.py export_activity`.
+"""
+import csv
+import datetime
+import json
+
+from bson.decimal128 import Decimal128
+from django.contrib.auth.models import User
+
+from .car_choices import car_label
+from .models import Car, Order, Offer, Appointment
+from .mongo import get_collection
+from .queries import CAR_LABEL_PROJECTION, aware
+
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# kind -> (model, columns). `car` and `username` are resolved per batch.
+EXPORTS = {
+    'orders': (
+        Order,
+        ['id', 'created_at', 'status', 'car_id', 'car', 'username',
+         'full_name', 'email', 'phone', 'message'],
+    ),
+    'offers': (
+        Offer,
+        ['id', 'created_at', 'status', 'car_id', 'car', 'username',
+         'amount', 'message'],
+    ),
+    'appointments': (
+        Appointment,
+        ['id', 'created_at', 'status', 'username', 'full_name', 'email', 'phone',
+         'car_interest', 'preferred_date', 'preferred_time', 'message'],
+    ),
+}
+
+# A spreadsheet runs a cell that starts with one of these as a formula
+# (CSV injection through a name, message or phone typed into a form), so
+# the CSV export prefixes it with a quote, which makes it plain text.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _value(value):
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, datetime.datetime):
+        return aware(value).isoformat()
+    if value is None:
+        return ''
+    return value
+
+
+def _batches(cursor, size):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _resolve(batch, join_car):
+    """
+    {car _id: label} and {user id: username} for one batch, two queries.
+    """
+    cars = {}
+    if join_car:
+        car_ids = list({doc['car_id'] for doc in batch if doc.get('car_id')})
+        if car_ids:
+            for car in Car.objects.mongo_find({'_id': {'$in': car_ids}}, CAR_LABEL_PROJECTION):
+                cars[car['_id']] = car_label(car.get('make'), car.get('model'), car.get('year'))
+
+    users = {}
+    user_ids = list({doc['user_id'] for doc in batch if doc.get('user_id') is not None})
+    if user_ids:
+        for user in get_collection(User).find({'id': {'$in': user_ids}}, {'id': 1, 'username': 1}):
+            users[user['id']] = user.get('username', '')
+    return cars, users
+
+
+def _row(doc, columns, cars, users):
+    row = {}
+    for column in columns:
+        if column == 'id':
+            value = str(doc['_id'])
+        elif column == 'car':
+            value = cars.get(doc.get('car_id'), '')
+        elif column == 'username':
+            value = users.get(doc.get('user_id'), '')
+        elif column == 'car_id':
+            value = str(doc['car_id']) if doc.get('car_id') else ''
+        elif column == 'preferred_date' and isinstance(doc.get(column), datetime.datetime):
+            value = doc[column].date().isoformat()
+        else:
+            value = _value(doc.get(column))
+        row[column] = value
+    return row
+
+
+def export_batches(kind, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield the rows of the given kind one cursor batch at a time: for each
+    batch, an iterator of dicts (columns as in EXPORTS), built as they
+    are consumed.
+    """
+    model, columns = EXPORTS[kind]
+    join_car = 'car' in columns
+    fields = [c for c in columns if c not in ('id', 'car', 'username')] + ['user_id']
+
+    cursor = model.objects.mongo_find({}, {f: 1 for f in fields}).sort('_id', 1).batch_size(batch_size)
+    try:
+        for batch in _batches(cursor, batch_size):
+            cars, users = _resolve(batch, join_car)
+            yield (_row(doc, columns, cars, users) for doc in batch)
+    finally:
+        cursor.close()
+
+
+def export_rows(kind, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield one dict per document of the given kind, columns as in EXPORTS.
+    """
+    for rows in export_batches(kind, batch_size):
+        yield from rows
+
+
+class _Line:
+    """
+    File-like object whose write() just returns the text, so csv.writer
+    can format one row at a time for a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+def export_lines(kind, fmt, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield the export as text, one chunk per cursor batch. The CSV header
+    is yielded before the query runs, and the first row on its own as
+    soon as it is formatted, so the download starts without waiting for
+    a whole batch (JSONL has no header).
+    """
+    columns = EXPORTS[kind][1]
+    writer = csv.writer(_Line())
+
+    def format_row(row):
+        if fmt == 'csv':
+            return writer.writerow([csv_cell(row[c]) for c in columns])
+        return json.dumps(row) + '\n'
+
+    if fmt == 'csv':
+        yield writer.writerow(columns)
+
+    first = True
+    for rows in export_batches(kind, batch_size):
+        lines = (format_row(row) for row in rows)
+        if first:
+            yield next(lines)
+            first = False
+        chunk = ''.join(lines)
+        if chunk:
+            yield chunk
@@ -3,6 +3,9 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Review, Appointment
 from .models import Order, Offer, Review, Appointment, Car
+from django.urls import reverse
+from .car_choices import get_car_choices, is_valid_car_label
+from .slots import SLOT_FULL_MESSAGE, is_available
 
 
 class CustomUserCreationForm(UserCreationForm):
@@ -81,10 +84,16 @@ class ReviewForm(forms.ModelForm):
 
 
 class AppointmentForm(forms.ModelForm):
-    # Dropdown for cars
-    car_interest = forms.ChoiceField(
-        choices=[],
-        widget=forms.Select(attrs={'class': 'form-select'}),
+    # Searchable car picker. The options are loaded on demand from
+    # car_choice_search, so the page no longer embeds the whole inventory.
+    car_interest = forms.CharField(
+        max_length=150,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'list': 'car-interest-options',
+            'autocomplete': 'off',
+            'placeholder': 'Start typing a make or model...',
+        }),
         label="Car you want to test drive",
         required=True,
     )
@@ -102,22 +111,33 @@ class AppointmentForm(forms.ModelForm):
             'message': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, request=None, **kwargs):
         super().__init__(*args, **kwargs)
+        # the car list is keyed on the "car" version memoized on the request
+        self.request = request
+        self.fields['car_interest'].widget.attrs['data-search-url'] = reverse('car_choice_search')
+        self.fields['preferred_date'].widget.attrs['data-availability-url'] = reverse('appointment_availability')
 
-        cars = Car.objects.all().order_by('make', 'model', 'year')
-        self.fields['car_interest'].choices = [
-            (
-                f"{car.make} {car.model} ({car.year})",
-                f"{car.make} {car.model} ({car.year})"
-            )
-            for car in cars
-        ]
-
-        if not self.fields['car_interest'].choices:
-            self.fields['car_interest'].choices = [("", "No cars available")]
+        if not get_car_choices(request)['labels']:
+            self.fields['car_interest'].widget.attrs['placeholder'] = "No cars available"
             self.fields['car_interest'].widget.attrs['disabled'] = True
 
+    def clean_car_interest(self):
+        # Only cars from the inventory (checked against the cached list)
+        value = self.cleaned_data['car_interest'].strip()
+        if not is_valid_car_label(value, self.request):
+            raise forms.ValidationError("Please choose a car from the list.")
+        return value
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Early answer for a slot that is already full; saving the
+        # appointment reserves the place atomically (cars/slots.py)
+        date, slot = cleaned_data.get('preferred_date'), cleaned_data.get('preferred_time')
+        if date and slot and not is_available(date, slot):
+            self.add_error('preferred_time', SLOT_FULL_MESSAGE)
+        return cleaned_data
+
 
 
 
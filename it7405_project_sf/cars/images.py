@@ -0,0 +1,351 @@
+"""
+Resized, locally stored copies of the car images.
+
+Car.image_url usually points at a full-size photo on another site, and
+every card used to download it whole. process_car() fetches the image
+once and writes a WebP and a JPEG copy per width in
+settings.CAR_IMAGE_WIDTHS (never wider than the original) to
+default_storage (MEDIA_ROOT):
+
+    cars/<key>/<width>.webp
+    cars/<key>/<width>.jpg
+
+<key> is a hash of the image bytes, so cars sharing a photo share the
+files and a photo is only encoded once. The key, the original size and
+the widths are stored on the car (image_key, image_width, image_height,
+image_widths), and the {% car_image %} tag turns them into a <picture>
+with srcset, explicit dimensions and lazy loading.
+
+Images are processed when a car gets one through the admin (an upload
+at once, a new URL by the car_image job, see cars/tasks.py), after
+`manage.py import_cars`, and by `manage.py process_images` for
+everything still pending. Until then the tag falls
+back to the original URL.
+"""
+import hashlib
+import io
+import itertools
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import versions
+from .models import Car
+
+
+# format -> (Pillow format, file extension, MIME type)
+FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+
+# width of the plain src for browsers without srcset support
+FALLBACK_WIDTH = 480
+
+# EXIF orientations that swap width and height
+EXIF_ORIENTATION = 0x0112
+ROTATED = (5, 6, 7, 8)
+
+# cars whose image_url changed since their variants were made
+PENDING_QUERY = {
+    'image_url': {'$nin': ['', None]},
+    '$expr': {'$ne': [{'$ifNull': ['$image_source', '']}, '$image_url']},
+}
+
+# fetch + encode run in threads; Pillow releases the GIL while resizing
+PROCESS_WORKERS = 4
+PROCESS_BATCH_SIZE = 1000
+
+
+class ImageError(Exception):
+    pass
+
+
+# one lock per image key, so two threads given the same photo do not
+# both write its files (the storage would keep both under new names)
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def _key_lock(key):
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def image_widths():
+    return tuple(sorted(settings.CAR_IMAGE_WIDTHS))
+
+
+def variant_widths(width):
+    """
+    The configured widths below the original's, plus the original width
+    itself when it is within the largest configured one.
+    """
+    widths = [w for w in image_widths() if w < width]
+    if width <= image_widths()[-1]:
+        widths.append(width)
+    return widths
+
+
+def variant_name(key, width, fmt):
+    return f"cars/{key}/{width}.{FORMATS[fmt][1]}"
+
+
+# ---------- reading ----------
+
+def read_source(source):
+    """
+    Bytes of an image given as an http(s) URL, a MEDIA_URL or STATIC_URL
+    path, or a local file path.
+    """
+    limit = settings.CAR_IMAGE_MAX_BYTES
+
+    if source.startswith(('http://', 'https://')):
+        request = urllib.request.Request(source, headers={'User-Agent': 'car-sales-site images'})
+        try:
+            with urllib.request.urlopen(request, timeout=settings.CAR_IMAGE_FETCH_TIMEOUT) as response:
+                data = response.read(limit + 1)
+        except (OSError, ValueError) as e:
+            raise ImageError(f"cannot fetch {source}: {e}")
+    else:
+        path = source
+        if source.startswith(settings.MEDIA_URL):
+            path = os.path.join(settings.MEDIA_ROOT, source[len(settings.MEDIA_URL):])
+        elif source.startswith(settings.STATIC_URL):
+            from django.contrib.staticfiles import finders
+
+            path = finders.find(source[len(settings.STATIC_URL):]) or source
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(limit + 1)
+        except OSError as e:
+            raise ImageError(f"cannot read {source}: {e}")
+
+    if len(data) > limit:
+        raise ImageError(f"{source} is larger than {limit} bytes")
+    return data
+
+
+# ---------- encoding ----------
+
+def _open(data):
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageError(f"not a usable image: {e}")
+
+    # phone photos are often stored sideways with an EXIF rotation
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def _encode(image, fmt):
+    pil_format = FORMATS[fmt][0]
+    options = {'quality': settings.CAR_IMAGE_QUALITY[fmt]}
+    if fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=4)
+
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def make_variants(data):
+    """
+    Write the resized copies of an image (skipping files that already
+    exist) and return the Car fields describing them.
+    """
+    key = hashlib.sha256(data).hexdigest()[:24]
+
+    # the size is in the header, so a second car with the same photo
+    # costs no decoding at all
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            width, height = probe.size
+            if probe.getexif().get(EXIF_ORIENTATION) in ROTATED:
+                width, height = height, width
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageError(f"not a usable image: {e}")
+
+    widths = variant_widths(width)
+    names = [variant_name(key, w, fmt) for w in widths for fmt in FORMATS]
+
+    with _key_lock(key):
+        if not all(default_storage.exists(name) for name in names):
+            _write_variants(key, _open(data), widths)
+
+    return {
+        'image_key': key,
+        'image_width': width,
+        'image_height': height,
+        'image_widths': ','.join(str(w) for w in widths),
+    }
+
+
+def _write_variants(key, image, widths):
+    # largest first, each one resized from the previous: cheaper than
+    # resizing the full photo every time, and still sharp
+    source = image
+    for w in sorted(widths, reverse=True):
+        h = max(1, round(image.height * w / image.width))
+        resized = source if (w, h) == source.size else source.resize((w, h), Image.LANCZOS)
+        for fmt in FORMATS:
+            name = variant_name(key, w, fmt)
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(_encode(resized, fmt)))
+        source = resized
+
+
+# ---------- cars ----------
+
+def process_car(doc):
+    """
+    Make the variants of one car document ({'_id', 'image_url'}) and
+    store their description on it. Returns the fields written.
+    """
+    fields = make_variants(read_source(doc['image_url']))
+    fields['image_source'] = doc['image_url']
+    Car.objects.mongo_update_one(
+        {'_id': doc['_id'], 'image_url': doc['image_url']},
+        {'$set': dict(fields, updated_at=timezone.now())},
+    )
+    return fields
+
+
+def process_upload(car, uploaded):
+    """
+    Make the variants of an uploaded file for `car` (not saved): the car's
+    image_url becomes the largest JPEG copy.
+    """
+    fields = make_variants(uploaded.read())
+    largest = int(fields['image_widths'].split(',')[-1])
+    car.image_url = default_storage.url(variant_name(fields['image_key'], largest, 'jpeg'))
+    fields['image_source'] = car.image_url
+    for name, value in fields.items():
+        setattr(car, name, value)
+
+
+def process_pending(limit=None, everything=False, workers=PROCESS_WORKERS, on_error=None,
+                    stdout=None):
+    """
+    Process every car whose image_url has no variants yet (or all cars
+    with everything=True). Cars whose image cannot be fetched or decoded
+    keep their original URL and are reported through on_error(doc, error).
+    Returns (processed, failed).
+    """
+    started = time.perf_counter()
+    query = {'image_url': {'$nin': ['', None]}} if everything else PENDING_QUERY
+    cursor = Car.objects.mongo_find(query, {'image_url': 1})
+    if limit:
+        cursor = cursor.limit(limit)
+
+    def run(doc):
+        try:
+            process_car(doc)
+            return None
+        except ImageError as e:
+            return str(e)
+
+    processed = failed = 0
+    with ThreadPoolExecutor(workers) as pool:
+        while True:
+            docs = list(itertools.islice(cursor, PROCESS_BATCH_SIZE))
+            if not docs:
+                break
+            for doc, error in zip(docs, pool.map(run, docs)):
+                if error is None:
+                    processed += 1
+                else:
+                    failed += 1
+                    if on_error is not None:
+                        on_error(doc, error)
+
+    if processed:
+        # cached car cards still point at the original images
+        versions.bump('car')
+    if stdout is not None:
+        stdout.write(
+            f"{processed} car images processed, {failed} failed "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+    return processed, failed
+
+
+# ---------- static images ----------
+
+STATIC_IMAGES_DIR = os.path.join(os.path.dirname(__file__), 'static', 'cars', 'images')
+
+# the home page backgrounds are shown at most this wide
+STATIC_MAX_WIDTH = 1600
+
+
+def optimize_static_images(directory=STATIC_IMAGES_DIR, max_width=STATIC_MAX_WIDTH):
+    """
+    Write a WebP copy (at most max_width wide) next to every JPEG in
+    `directory`, for the image-set() backgrounds in styles.css. Returns
+    [(name, jpeg bytes, webp bytes)].
+    """
+    results = []
+    for name in sorted(os.listdir(directory)):
+        base, ext = os.path.splitext(name)
+        if ext.lower() not in ('.jpg', '.jpeg'):
+            continue
+        path = os.path.join(directory, name)
+        with open(path, 'rb') as f:
+            image = _open(f.read())
+        if image.width > max_width:
+            image = image.resize(
+                (max_width, max(1, round(image.height * max_width / image.width))), Image.LANCZOS
+            )
+        data = _encode(image, 'webp')
+        with open(os.path.join(directory, base + '.webp'), 'wb') as f:
+            f.write(data)
+        results.append((name, os.path.getsize(path), len(data)))
+    return results
+
+
+# ---------- templates ----------
+
+def variants(car):
+    """
+    What {% car_image %} needs for a processed car, or None:
+    {'srcset': {format: "url 240w, url 480w"}, 'src', 'width', 'height'}.
+    """
+    if not getattr(car, 'image_key', '') or not getattr(car, 'image_widths', ''):
+        return None
+    # only valid while image_url is the one the variants were made from
+    if car.image_source and car.image_source != car.image_url:
+        return None
+
+    widths = [int(w) for w in car.image_widths.split(',')]
+    srcset = {
+        fmt: ', '.join(
+            f"{default_storage.url(variant_name(car.image_key, w, fmt))} {w}w" for w in widths
+        )
+        for fmt in FORMATS
+    }
+    fallback = next((w for w in widths if w >= FALLBACK_WIDTH), widths[-1])
+    return {
+        'srcset': srcset,
+        'src': default_storage.url(variant_name(car.image_key, fallback, 'jpeg')),
+        'width': car.image_width,
+        'height': car.image_height,
+    }
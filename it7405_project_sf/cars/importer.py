@@ -0,0 +1,206 @@
+"""
+Streaming bulk import of cars from CSV or JSONL feeds.
+
+Rows are read one at a time, validated against the Car model fields and
+written in batches of upserts (one bulk_write per batch), so memory use
+does not grow with the size of the feed. A row updates the car with the
+same natural key (by default make + model + year + image_url, backed by
+car_natural_key_idx) or inserts a new one.
+
+Bulk writes bypass the model signals, so after an import the caller
+should run finish_import() to fix the derived data (counters, the car
+version used by the fragment cache / ETags, the appointment car list and
+the similar-car recommendations).
+"""
+import csv
+import json
+import time
+from decimal import Decimal
+
+from bson.decimal128 import Decimal128
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from . import counters, images, recommendations, versions
+from .models import Car
+from .queries import to_decimal
+
+
+IMPORT_FIELDS = ('make', 'model', 'year', 'price', 'description', 'image_url')
+
+DEFAULT_KEY_FIELDS = ('make', 'model', 'year', 'image_url')
+
+IMPORT_BATCH_SIZE = 1000
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{self.read} rows in {self.elapsed:.1f}s ({self.rows_per_second:.0f} rows/s): "
+            f"{self.inserted} inserted, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.rejected} rejected"
+        )
+
+
+# ---------- reading ----------
+
+def detect_format(path):
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (line_number, dict) for every record of an open text stream.
+    JSON lines that cannot be parsed are yielded as (line_number, None).
+    """
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+# ---------- validation ----------
+
+def _strip(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def clean_row(row):
+    """
+    Validate one feed row against the Car fields.
+
+    Prices are normalized like the catalog filters do ("$28,900" ->
+    28900.00). Returns (document, None) or (None, error message).
+    """
+    if row is None:
+        return None, "not a JSON object"
+
+    doc = {}
+    errors = []
+    for name in IMPORT_FIELDS:
+        field = Car._meta.get_field(name)
+        value = _strip(row.get(name))
+
+        if name == 'price' and value not in (None, ''):
+            value = to_decimal(value)
+            if value is None:
+                errors.append(f"price: not a number ({row.get(name)!r})")
+                continue
+            value = value.quantize(Decimal('0.01'))
+
+        try:
+            doc[name] = field.clean(value, None)
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+
+    if errors:
+        return None, '; '.join(errors)
+
+    doc['price'] = Decimal128(doc['price'])
+    return doc, None
+
+
+# ---------- writing ----------
+
+def _upsert_pipeline(doc):
+    """
+    Update pipeline that sets the row's fields and only moves updated_at
+    when one of them actually changed, so re-importing an unchanged feed
+    leaves the cars (and their ETags) alone. Values are wrapped in
+    $literal because a string starting with "$" would be read as a field.
+    """
+    same = [{'$eq': [f'${name}', {'$literal': value}]} for name, value in doc.items()]
+    return [
+        {'$set': {'updated_at': {'$cond': [{'$and': same}, '$updated_at', timezone.now()]}}},
+        {'$set': {name: {'$literal': value} for name, value in doc.items()}},
+    ]
+
+
+def _write_batch(batch, stats):
+    if not batch:
+        return
+    result = Car.objects.mongo_bulk_write(list(batch.values()), ordered=False)
+    stats.inserted += result.upserted_count
+    stats.updated += result.modified_count
+    stats.unchanged += result.matched_count - result.modified_count
+
+
+def import_cars(rows, key_fields=DEFAULT_KEY_FIELDS, batch_size=IMPORT_BATCH_SIZE,
+                dry_run=False, on_reject=None, on_batch=None):
+    """
+    Upsert the rows yielded by iter_rows() and return an ImportStats.
+
+    on_reject(line_number, row, error) is called for every invalid row,
+    on_batch(stats) after every written batch. A key that appears more
+    than once in the same batch is written once (the last row wins).
+    """
+    stats = ImportStats()
+    batch = {}
+
+    for line_number, row in rows:
+        stats.read += 1
+        doc, error = clean_row(row)
+        if error:
+            stats.rejected += 1
+            if on_reject is not None:
+                on_reject(line_number, row, error)
+            continue
+
+        key = {name: doc[name] for name in key_fields}
+        batch[tuple(str(v) for v in key.values())] = UpdateOne(key, _upsert_pipeline(doc), upsert=True)
+
+        if len(batch) >= batch_size:
+            if not dry_run:
+                _write_batch(batch, stats)
+            batch = {}
+            if on_batch is not None:
+                on_batch(stats)
+
+    if not dry_run:
+        _write_batch(batch, stats)
+    if on_batch is not None:
+        on_batch(stats)
+    return stats
+
+
+def finish_import(rebuild_recommendations=True, process_images=True, stdout=None):
+    """
+    Bring everything derived from the cars collection up to date after a
+    bulk import (the work the Car signals would have done row by row),
+    and make the resized images of the new or changed cars.
+    """
+    counters.reconcile()
+    # also drops the cached appointment car list
+    versions.bump('car')
+    if rebuild_recommendations:
+        recommendations.build_all(stdout=stdout)
+    if process_images:
+        images.process_pending(stdout=stdout)
@@ -0,0 +1,113 @@
+"""
+Build and check the MongoDB indexes declared in each model's Meta.indexes
+(and the unique indexes behind Meta.constraints' UniqueConstraints).
+
+djongo's migration support loses the sort direction of index fields, so
+the indexes are created here with pymongo instead. The same code is used
+by migration 0003 and by `manage.py ensure_indexes`.
+"""
+import pymongo
+from django.apps import apps
+from django.db.models import UniqueConstraint
+
+from .mongo import get_collection
+
+
+def index_keys(model, index):
+    """
+    Convert a Django Index into a pymongo key list, e.g.
+    Index(fields=['user', '-created_at']) -> [('user_id', 1), ('created_at', -1)]
+    """
+    keys = []
+    for field_name, order in index.fields_orders:
+        column = model._meta.get_field(field_name).column
+        direction = pymongo.DESCENDING if order == 'DESC' else pymongo.ASCENDING
+        keys.append((column, direction))
+    return keys
+
+
+def declared_indexes(app_models=None):
+    """
+    Yield (model, index_name, keys, unique) for every index declared on
+    the cars models. A UniqueConstraint becomes a unique ascending index.
+    """
+    if app_models is None:
+        app_models = apps.get_app_config('cars').get_models()
+
+    for model in app_models:
+        for index in model._meta.indexes:
+            yield model, index.name, index_keys(model, index), False
+        for constraint in model._meta.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.condition is None:
+                keys = [(model._meta.get_field(f).column, pymongo.ASCENDING) for f in constraint.fields]
+                yield model, constraint.name, keys, True
+
+
+def ensure_indexes(app_models=None, using='default'):
+    """
+    Create every declared index that does not exist yet, and rebuild the
+    ones whose keys (or uniqueness) no longer match their declaration.
+
+    create_index() is a no-op when an identical index already exists, so
+    this is safe to run on every deploy. Returns a list of
+    (collection, index_name, created) tuples.
+    """
+    results = []
+    for model, name, keys, unique in declared_indexes(app_models):
+        collection = get_collection(model, using)
+        existing = collection.index_information()
+        info = existing.get(name)
+        if info is not None and (
+            [(k, int(d)) for k, d in info['key']] != keys or bool(info.get('unique')) != unique
+        ):
+            collection.drop_index(name)
+            del existing[name]
+        # unique only when set: an explicit unique=False would not match the
+        # options of indexes created before
+        options = {'unique': True} if unique else {}
+        collection.create_index(keys, name=name, background=True, **options)
+        results.append((collection.name, name, name not in existing))
+    return results
+
+
+def index_report(app_models=None, using='default'):
+    """
+    Compare the declared indexes with what MongoDB actually has.
+
+    Returns a dict with:
+      missing    - declared but not present (or present with other keys)
+      unused     - present but never used since the server started
+                   (from the $indexStats aggregation stage)
+      undeclared - present on the collection but not declared in Meta
+    Each entry is a (collection, index_name) tuple, except `unused`,
+    which also carries the "since" timestamp of the usage counter.
+    """
+    report = {'missing': [], 'unused': [], 'undeclared': []}
+
+    by_collection = {}
+    for model, name, keys, _ in declared_indexes(app_models):
+        by_collection.setdefault(model._meta.db_table, {})[name] = keys
+
+    for collection_name, declared in by_collection.items():
+        collection = get_collection(collection_name, using)
+        existing = collection.index_information()
+
+        for name, keys in declared.items():
+            info = existing.get(name)
+            if info is None or [(k, int(d)) for k, d in info['key']] != keys:
+                report['missing'].append((collection_name, name))
+
+        for name in existing:
+            if name != '_id_' and name not in declared:
+                report['undeclared'].append((collection_name, name))
+
+        for stats in collection.aggregate([{'$indexStats': {}}]):
+            if stats['name'] == '_id_':
+                continue
+            accesses = stats.get('accesses', {})
+            if accesses.get('ops', 0) == 0:
+                report['unused'].append(
+                    (collection_name, stats['name'], accesses.get('since'))
+                )
+
+    return report
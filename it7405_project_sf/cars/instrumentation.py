@@ -0,0 +1,165 @@
+"""
+Per-request database and template instrumentation.
+
+DatabaseInstrumentationMiddleware (cars/middleware.py) starts a
+RequestStats for every request and keeps it in a context variable. While
+the request runs:
+
+  - every MongoDB command sent by pymongo (djongo's ORM queries and the
+    raw mongo_find / mongo_aggregate calls alike) is reported by
+    CommandTimer, a pymongo CommandListener registered in
+    CarsConfig.ready();
+  - the async views time their motor calls with record_operation(),
+    because motor runs commands on its own threads, outside the
+    request's context;
+  - InstrumentedDjangoTemplates (the TEMPLATES backend) times the render
+    of each top-level template.
+
+DB time is the sum of the operation times, so with concurrent queries
+(async views) it can be larger than the wall-clock time they took.
+"""
+import contextvars
+import threading
+import time
+
+from bson import json_util
+from django.template.backends.django import DjangoTemplates, Template
+from pymongo import monitoring
+
+
+# Longest statement kept for the slow-request log.
+MAX_STATEMENT_LENGTH = 300
+
+# Driver housekeeping, not queries.
+IGNORED_COMMANDS = {'endSessions', 'isMaster', 'ismaster', 'hello', 'saslStart', 'saslContinue'}
+
+_current = contextvars.ContextVar('request_db_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ops = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.slowest_ms = 0.0
+        self.slowest = ''
+        # pymongo request_id -> statement, between "started" and "succeeded"
+        self.pending = {}
+
+    def record(self, statement, ms):
+        with self._lock:
+            self.ops += 1
+            self.db_ms += ms
+            if ms >= self.slowest_ms:
+                self.slowest_ms = ms
+                self.slowest = statement
+
+
+def start():
+    """
+    Begin collecting for the current request; returns (stats, token).
+    """
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_operation(statement, ms):
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, ms)
+
+
+def describe_command(command_name, command):
+    """
+    Short, readable form of a MongoDB command for logs, e.g.
+    'aggregate cars_car [{"$match": ...}, ...]'.
+    """
+    collection = command.get(command_name, '')
+    body = {
+        key: value for key, value in command.items()
+        if key != command_name and key not in ('lsid', '$db', '$clusterTime', 'cursor')
+    }
+    text = f"{command_name} {collection} {json_util.dumps(body)}"
+    if len(text) > MAX_STATEMENT_LENGTH:
+        text = text[:MAX_STATEMENT_LENGTH - 1] + '…'
+    return text
+
+
+# ---------- pymongo commands ----------
+
+class CommandTimer(monitoring.CommandListener):
+    def started(self, event):
+        stats = _current.get()
+        if stats is not None and event.command_name not in IGNORED_COMMANDS:
+            stats.pending[event.request_id] = describe_command(event.command_name, event.command)
+
+    def _finished(self, event):
+        stats = _current.get()
+        if stats is None:
+            return
+        statement = stats.pending.pop(event.request_id, None)
+        if statement is not None:
+            stats.record(statement, event.duration_micros / 1000)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+_registered = False
+
+
+def register():
+    """
+    Register the command listener with pymongo (once). Only clients
+    created after this call report to it.
+    """
+    global _registered
+    if not _registered:
+        monitoring.register(CommandTimer())
+        _registered = True
+
+
+# ---------- templates ----------
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+
+        # only the outermost render is counted (includes are part of it)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                stats.template_ms += (time.perf_counter() - started) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    The normal Django template backend, with render times recorded in the
+    current RequestStats.
+    """
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,274 @@
+"""
+A job queue in MongoDB, for work that does not have to happen before a
+form POST returns (confirmation emails, image processing; see
+cars/tasks.py for the tasks).
+
+    enqueue('order_confirmation', order_id=str(order._id))
+
+stores one Job document (one insert) and returns. The work is done by
+`manage.py run_jobs`, or, with settings.JOBS_IN_PROCESS, by a thread in
+the web process itself, so no broker or extra service is needed.
+
+A worker takes up to JOBS_BATCH_SIZE due jobs at a time. Claiming them
+is one update_many that only matches jobs still due, and pushes their
+run_at to the end of the claim (JOBS_LEASE_SECONDS), so two workers
+never run the same job and the jobs of a worker that died become due
+again once its claim runs out. Tasks registered with batch=True get the
+arguments of all their jobs in the batch in one call (one query for the
+documents, one SMTP connection for the emails).
+
+A job that raises is retried after JOBS_RETRY_DELAY seconds, doubled
+after every attempt, until it has had its max_attempts; it then stays in
+the collection as 'failed' (see the Job admin). Jobs may run more than
+once, so tasks must not mind being repeated.
+"""
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from .models import Job
+from .mongo import get_collection
+
+
+logger = logging.getLogger('cars.jobs')
+
+QUEUED, RUNNING, FAILED = 'queued', 'running', 'failed'
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 60 * 60
+LEASE_SECONDS = 5 * 60
+IDLE_SLEEP = 2.0
+
+Task = namedtuple('Task', 'func batch max_attempts')
+
+TASKS = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def task(name, batch=False, max_attempts=None):
+    """
+    Register a function as the task `name`. It is called with the job's
+    arguments as keywords, or, with batch=True, with the list of the
+    argument dicts of every job of the batch.
+    """
+    def register(func):
+        TASKS[name] = Task(func, batch, max_attempts)
+        return func
+    return register
+
+
+# ---------- queueing ----------
+
+def enqueue(name, delay=0, **kwargs):
+    """
+    Queue the task `name` with JSON-serializable keyword arguments, to run
+    `delay` seconds from now at the earliest.
+    """
+    if name not in TASKS:
+        raise ValueError(f"Unknown task {name!r}")
+    now = timezone.now()
+    get_collection(Job).insert_one({
+        'task': name,
+        'args': kwargs,
+        'status': QUEUED,
+        'attempts': 0,
+        'max_attempts': TASKS[name].max_attempts or _setting('JOBS_MAX_ATTEMPTS', MAX_ATTEMPTS),
+        'run_at': now + datetime.timedelta(seconds=delay),
+        'claimed_by': '',
+        'last_error': '',
+        'created_at': now,
+    })
+    if _setting('JOBS_IN_PROCESS', False):
+        start_in_process_worker()._wake.set()
+
+
+def retry_failed(ids=None):
+    """
+    Queue failed jobs (all, or the ones in `ids`) again with fresh
+    attempts. Returns how many.
+    """
+    query = {'status': FAILED}
+    if ids is not None:
+        query['_id'] = {'$in': list(ids)}
+    return get_collection(Job).update_many(query, {'$set': {
+        'status': QUEUED, 'attempts': 0, 'run_at': timezone.now(), 'claimed_by': '',
+    }}).modified_count
+
+
+# ---------- running ----------
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim(limit, worker):
+    """
+    Take up to `limit` due jobs, oldest first, and return their documents.
+    """
+    collection = get_collection(Job)
+    now = timezone.now()
+    due = {'status': {'$in': [QUEUED, RUNNING]}, 'run_at': {'$lte': now}}
+    ids = [doc['_id'] for doc in collection.find(due, {'_id': 1}).sort('run_at', 1).limit(limit)]
+    if not ids:
+        return []
+
+    token = f"{worker}:{uuid.uuid4().hex}"
+    lease = datetime.timedelta(seconds=_setting('JOBS_LEASE_SECONDS', LEASE_SECONDS))
+    # only what is still due: jobs another worker claimed meanwhile have
+    # their run_at in the future
+    collection.update_many(dict(due, _id={'$in': ids}), {
+        '$set': {'status': RUNNING, 'run_at': now + lease, 'claimed_by': token},
+        '$inc': {'attempts': 1},
+    })
+    return list(collection.find({'_id': {'$in': ids}, 'claimed_by': token}).sort('run_at', 1))
+
+
+def _call(task_, args_list):
+    if task_.batch:
+        task_.func(args_list)
+    else:
+        for args in args_list:
+            task_.func(**args)
+
+
+def _retry_delay(attempts):
+    delay = _setting('JOBS_RETRY_DELAY', RETRY_DELAY) * 2 ** max(attempts - 1, 0)
+    return datetime.timedelta(seconds=min(delay, MAX_RETRY_DELAY))
+
+
+def run_batch(limit=None, worker=None):
+    """
+    Claim and run one batch of due jobs. Returns (done, retried, failed).
+    """
+    jobs = claim(limit or _setting('JOBS_BATCH_SIZE', BATCH_SIZE), worker or worker_name())
+    if not jobs:
+        return 0, 0, 0
+
+    by_task = {}
+    for job in jobs:
+        by_task.setdefault(job['task'], []).append(job)
+
+    done, errors = [], []
+    for name, group in list(by_task.items()):
+        # claimed again after their worker's claim ran out, one time too many
+        for job in [job for job in group if job['attempts'] > job['max_attempts']]:
+            group.remove(job)
+            errors.append((job, "Gave up: the job's worker kept stopping before it finished"))
+        if not group:
+            continue
+        task_ = TASKS.get(name)
+        if task_ is None:
+            errors += [(job, f"Unknown task {name!r}") for job in group]
+            continue
+        if task_.batch and len(group) > 1:
+            try:
+                _call(task_, [job['args'] for job in group])
+                done += group
+                continue
+            except Exception:
+                # run them one by one, so only the failing ones are retried
+                logger.exception("Batch of %d %s jobs failed", len(group), name)
+        for job in group:
+            try:
+                _call(task_, [job['args']])
+                done.append(job)
+            except Exception as e:
+                logger.exception("Job %s (%s) failed", job['_id'], name)
+                errors.append((job, f"{type(e).__name__}: {e}"))
+
+    collection = get_collection(Job)
+    if done:
+        collection.delete_many({'_id': {'$in': [job['_id'] for job in done]}})
+
+    retried = failed = 0
+    now = timezone.now()
+    writes = []
+    for job, error in errors:
+        if job['attempts'] < job['max_attempts']:
+            update = {'status': QUEUED, 'run_at': now + _retry_delay(job['attempts'])}
+            retried += 1
+        else:
+            update = {'status': FAILED, 'run_at': now}
+            failed += 1
+        update.update(claimed_by='', last_error=error[:2000])
+        writes.append(UpdateOne({'_id': job['_id'], 'claimed_by': job['claimed_by']}, {'$set': update}))
+    if writes:
+        collection.bulk_write(writes, ordered=False)
+
+    return len(done), retried, failed
+
+
+def work(batch_size=None, idle_sleep=IDLE_SLEEP, once=False, stop=None, wake=None, stdout=None):
+    """
+    Run batches until `stop` (a threading.Event) is set, or, with
+    once=True, until no job is due. Waits `idle_sleep` seconds (or until
+    `wake` is set) when there is nothing to do.
+    """
+    worker = worker_name()
+    stop = stop or threading.Event()
+    totals = [0, 0, 0]
+    while not stop.is_set():
+        close_old_connections()
+        counts = run_batch(batch_size, worker)
+        totals = [t + n for t, n in zip(totals, counts)]
+        if stdout is not None and any(counts):
+            stdout.write("{} done, {} to retry, {} failed".format(*counts))
+        if sum(counts):
+            continue
+        if once:
+            break
+        if wake is not None:
+            wake.wait(idle_sleep)
+            wake.clear()
+        else:
+            stop.wait(idle_sleep)
+    return tuple(totals)
+
+
+# ---------- in-process worker ----------
+
+class _InProcessWorker(threading.Thread):
+    def __init__(self):
+        super().__init__(name='cars-jobs', daemon=True)
+        self._wake = threading.Event()
+
+    def run(self):
+        idle_sleep = _setting('JOBS_IDLE_SLEEP', IDLE_SLEEP)
+        while True:
+            try:
+                work(idle_sleep=idle_sleep, wake=self._wake)
+            except Exception:
+                # e.g. the database is unreachable; try again later
+                logger.exception("Job worker failed")
+                time.sleep(idle_sleep)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_in_process_worker():
+    """
+    The worker thread of this process (JOBS_IN_PROCESS), started on first use.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = _InProcessWorker()
+            _worker.start()
+        return _worker
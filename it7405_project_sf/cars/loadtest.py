@@ -0,0 +1,508 @@
+"""
+Load-test harness for every URL of the site (`manage.py loadtest`).
+
+A run:
+  1. points the default database at a scratch database (a local MongoDB
+     database of its own, or an in-process mongomock stand-in), migrates
+     it and seeds it with cars/synthetic.py;
+  2. replays a weighted traffic mix with Django's test Client from
+     several threads: anonymous browsing, logged-in users (my_activity,
+     orders, offers, appointments, reviews, account changes) and staff
+     pages. Every route in cars/urls.py and car_sales_site/urls.py is in
+     the mix;
+  3. reports requests/second and p50/p95/p99 latency per endpoint, and
+     compares them with a saved baseline.
+
+The client runs in the same process as the site, so the numbers measure
+the application (views, queries, templates) rather than a web server.
+The in-process stand-in (cars/standin.py) serves every endpoint, so it
+catches errors and broken pages without a server; use a local MongoDB
+for real numbers.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+
+from . import standin, synthetic
+from .car_choices import car_label
+from .models import Car, Review, Order, Offer, Appointment
+from .queries import CAR_SORTS, REVIEW_RATING_FILTERS, REVIEW_SORTS
+
+
+# ---------- scratch database ----------
+
+def use_scratch_database(name, in_process=False):
+    """
+    Point the default connection at database `name` (dropped and
+    migrated first). With in_process=True the database is a mongomock
+    client registered with djongo instead of the configured server.
+    """
+    if name == settings.DATABASES['default']['NAME'] and not in_process:
+        raise ValueError("refusing to load-test the site's own database")
+
+    connection = connections['default']
+    connection.close()
+    settings.DATABASES['default']['NAME'] = name
+    connection.settings_dict['NAME'] = name
+
+    if in_process:
+        standin.register(name)
+    else:
+        connection.cursor().db_conn.client.drop_database(name)
+        connection.close()
+
+    call_command('migrate', verbosity=0, interactive=False)
+
+    # keep rendered fragments in this process, away from the site's cache
+    settings.FRAGMENT_CACHE_ALIAS = 'default'
+    caches['default'].clear()
+
+
+def drop_scratch_database(name):
+    connection = connections['default']
+    connection.cursor().db_conn.client.drop_database(name)
+    connection.close()
+
+
+# ---------- traffic mix ----------
+
+class Targets:
+    """
+    Ids the request builders pick from: a sample of cars plus the
+    synthetic users. Looked up once before the run.
+    """
+    def __init__(self, sample_size=500):
+        self.car_ids = [
+            str(doc['_id']) for doc in Car.objects.mongo_find({}, {'_id': 1}).limit(sample_size)
+        ]
+        self.car_labels = [
+            car_label(d['make'], d['model'], d['year'])
+            for d in Car.objects.mongo_find({}, {'make': 1, 'model': 1, 'year': 1}).limit(50)
+        ]
+        self.users = list(User.objects.filter(username__startswith=synthetic.USERNAME_PREFIX))
+        self.staff, _ = User.objects.get_or_create(
+            username='bench_staff', defaults={'is_staff': True, 'is_superuser': True},
+        )
+        # a real second-page cursor for car_list_more
+        response = _client().get('/cars/more/')
+        self.more_cursor = response.get('X-Next-Cursor') if response.status_code == 200 else None
+
+
+def _client(user=None):
+    client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def _own(model, user):
+    doc = model.objects.mongo_find_one({'user_id': user.pk}, {'_id': 1})
+    return str(doc['_id']) if doc else None
+
+
+def _person(user, rnd):
+    return {
+        'full_name': f"{user.first_name} {user.last_name}".strip() or user.username,
+        'email': f"{user.username}@example.com",
+        'phone': f"555-{rnd.randint(1000, 9999)}",
+        'message': 'Load test',
+    }
+
+
+# Each builder gets (targets, user, rnd) and returns (url, data) or None
+# when there is nothing to request (e.g. no review to edit).
+
+def b_home(t, u, rnd):
+    return '/', None
+
+
+def b_car_list(t, u, rnd):
+    return '/cars/', None
+
+
+def b_car_list_filtered(t, u, rnd):
+    make = rnd.choice(list(synthetic.MAKES))
+    sort = rnd.choice([key for key in CAR_SORTS if key])
+    return f'/cars/?search={make}&min_price=10000&max_price=60000&sort={sort}', None
+
+
+def b_car_list_more(t, u, rnd):
+    if t.more_cursor:
+        return f'/cars/more/?after={t.more_cursor}', None
+    return '/cars/more/', None
+
+
+def b_car_detail(t, u, rnd):
+    return (f'/cars/{rnd.choice(t.car_ids)}/', None) if t.car_ids else None
+
+
+def b_reviews(t, u, rnd):
+    rating = rnd.choice(list(REVIEW_RATING_FILTERS))
+    sort = rnd.choice(list(REVIEW_SORTS))
+    return f'/reviews/?rating={rating}&sort={sort}', None
+
+
+def b_car_search(t, u, rnd):
+    return f'/appointments/cars/?q={rnd.choice(list(synthetic.MAKES))[:3]}', None
+
+
+def b_signup_form(t, u, rnd):
+    return '/signup/', None
+
+
+def b_signup(t, u, rnd):
+    name = f"bench_signup_{uuid.uuid4().hex[:12]}"
+    return '/signup/', {
+        'username': name, 'first_name': 'Load', 'last_name': 'Test',
+        'email': f"{name}@example.com",
+        'password1': synthetic.SYNTHETIC_PASSWORD, 'password2': synthetic.SYNTHETIC_PASSWORD,
+    }
+
+
+def b_login_form(t, u, rnd):
+    return '/login/', None
+
+
+def b_login(t, u, rnd):
+    return '/login/', {'username': u.username, 'password': synthetic.SYNTHETIC_PASSWORD}
+
+
+def b_logout(t, u, rnd):
+    return '/logout/', None
+
+
+def b_my_activity(t, u, rnd):
+    return '/my-activity/', None
+
+
+def b_buy_form(t, u, rnd):
+    return (f'/cars/{rnd.choice(t.car_ids)}/buy/', None) if t.car_ids else None
+
+
+def b_buy(t, u, rnd):
+    return (f'/cars/{rnd.choice(t.car_ids)}/buy/', _person(u, rnd)) if t.car_ids else None
+
+
+def b_offer_form(t, u, rnd):
+    return (f'/cars/{rnd.choice(t.car_ids)}/offer/', None) if t.car_ids else None
+
+
+def b_offer(t, u, rnd):
+    if not t.car_ids:
+        return None
+    return f'/cars/{rnd.choice(t.car_ids)}/offer/', {
+        'amount': f"{rnd.randint(5000, 60000)}.00", 'message': 'Load test',
+    }
+
+
+def b_availability(t, u, rnd):
+    return f'/appointments/availability/?month=2030-{rnd.randint(1, 12):02d}', None
+
+
+def b_appointment_form(t, u, rnd):
+    return '/appointments/', None
+
+
+def b_appointment(t, u, rnd):
+    if not t.car_labels:
+        return None
+    data = _person(u, rnd)
+    data.update({
+        'car_interest': rnd.choice(t.car_labels),
+        'preferred_date': f"2030-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+        'preferred_time': rnd.choice(['morning', 'afternoon', 'evening']),
+    })
+    return '/appointments/', data
+
+
+def b_review(t, u, rnd):
+    data = _person(u, rnd)
+    data.update({'rating': rnd.randint(1, 5), 'comment': 'Load test review'})
+    return '/reviews/', data
+
+
+def b_edit_review_form(t, u, rnd):
+    review_id = _own(Review, u)
+    return (f'/my-activity/review/{review_id}/edit/', None) if review_id else None
+
+
+def b_edit_review(t, u, rnd):
+    review_id = _own(Review, u)
+    if not review_id:
+        return None
+    data = _person(u, rnd)
+    data.update({'rating': rnd.randint(1, 5), 'comment': 'Edited by the load test'})
+    return f'/my-activity/review/{review_id}/edit/', data
+
+
+def _delete(model, path):
+    def build(t, u, rnd):
+        obj_id = _own(model, u)
+        return (path.format(obj_id), {}) if obj_id else None
+    return build
+
+
+def _confirm(model, path):
+    def build(t, u, rnd):
+        obj_id = _own(model, u)
+        return (path.format(obj_id), None) if obj_id else None
+    return build
+
+
+def b_account_form(t, u, rnd):
+    return '/account/', None
+
+
+def b_account(t, u, rnd):
+    return '/account/', {
+        'username': u.username, 'first_name': u.first_name,
+        'last_name': u.last_name, 'email': f"{u.username}@example.com",
+    }
+
+
+def b_cache_stats(t, u, rnd):
+    return '/cache-stats/', None
+
+
+def b_pool_stats(t, u, rnd):
+    return '/pool-stats/', None
+
+
+def b_export(t, u, rnd):
+    kind = rnd.choice(['orders', 'offers', 'appointments'])
+    return f'/staff/export/{kind}/?format={rnd.choice(["csv", "jsonl"])}', None
+
+
+def b_admin(t, u, rnd):
+    return '/admin/', None
+
+
+# (name, weight, who, builder, expected status codes)
+# who: 'anon', 'user' (the worker's logged-in synthetic user), 'staff',
+# or 'new' / 'new user' for a client of its own (login and logout change
+# the session, so they must not touch the worker's shared clients)
+ENDPOINTS = [
+    # anonymous browsing
+    ('home', 10, 'anon', b_home, {200}),
+    ('car_list', 12, 'anon', b_car_list, {200}),
+    ('car_list filtered', 6, 'anon', b_car_list_filtered, {200}),
+    ('car_list_more', 4, 'anon', b_car_list_more, {200}),
+    ('car_detail', 14, 'anon', b_car_detail, {200}),
+    ('reviews', 8, 'anon', b_reviews, {200}),
+    ('car_choice_search', 3, 'anon', b_car_search, {200}),
+    ('appointment_availability', 2, 'anon', b_availability, {200}),
+    ('signup form', 1, 'anon', b_signup_form, {200}),
+    ('signup', 0.5, 'anon', b_signup, {302}),
+    ('login form', 1, 'anon', b_login_form, {200}),
+    ('login', 0.5, 'new', b_login, {302}),
+    # logged-in users
+    ('my_activity', 6, 'user', b_my_activity, {200}),
+    ('buy_car form', 1.5, 'user', b_buy_form, {200}),
+    ('buy_car', 1.5, 'user', b_buy, {302}),
+    ('make_offer form', 1.5, 'user', b_offer_form, {200}),
+    ('make_offer', 1.5, 'user', b_offer, {302}),
+    ('appointments form', 1.5, 'user', b_appointment_form, {200}),
+    ('appointments', 1.5, 'user', b_appointment, {200}),
+    ('review', 1, 'user', b_review, {302}),
+    ('edit_review form', 0.5, 'user', b_edit_review_form, {200}),
+    ('edit_review', 0.5, 'user', b_edit_review, {302}),
+    ('delete_order confirm', 0.5, 'user', _confirm(Order, '/my-activity/order/{}/delete/'), {200}),
+    ('delete_order', 0.5, 'user', _delete(Order, '/my-activity/order/{}/delete/'), {302}),
+    ('delete_offer', 0.5, 'user', _delete(Offer, '/my-activity/offer/{}/delete/'), {302}),
+    ('delete_appointment', 0.5, 'user',
+     _delete(Appointment, '/my-activity/appointment/{}/delete/'), {302}),
+    ('delete_review', 0.3, 'user', _delete(Review, '/my-activity/review/{}/delete/'), {302}),
+    ('account_settings form', 0.5, 'user', b_account_form, {200}),
+    ('account_settings', 0.5, 'user', b_account, {302}),
+    ('logout', 0.3, 'new user', b_logout, {200, 302}),
+    # staff
+    ('cache_stats', 0.3, 'staff', b_cache_stats, {200}),
+    ('pool_stats', 0.3, 'staff', b_pool_stats, {200}),
+    ('export_data', 0.2, 'staff', b_export, {200}),
+    ('admin', 0.3, 'staff', b_admin, {200}),
+]
+
+
+# ---------- running ----------
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.first_error = {}
+
+    def add(self, name, seconds, error=None):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if error is not None:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                self.first_error.setdefault(name, error)
+
+
+def _request(client, url, data):
+    if data is None:
+        return client.get(url)
+    return client.post(url, data)
+
+
+def _consume(response):
+    # streaming responses (exports) are only finished once read
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def _worker(index, endpoints, targets, seed, recorder, counter):
+    rnd = random.Random(seed * 1000 + index)
+    weights = [e[1] for e in endpoints]
+
+    user = targets.users[index % len(targets.users)] if targets.users else None
+    clients = {
+        'anon': _client(),
+        'user': _client(user) if user is not None else None,
+        'staff': _client(targets.staff),
+    }
+
+    while True:
+        with counter['lock']:
+            if counter['left'] <= 0:
+                return
+            counter['left'] -= 1
+
+        name, _, who, build, expected = rnd.choices(endpoints, weights)[0]
+        if who in ('user', 'new user') and user is None:
+            continue
+        if who == 'new':
+            client = _client()
+        elif who == 'new user':
+            client = _client(user)
+        else:
+            client = clients[who]
+
+        built = build(targets, user, rnd)
+        if built is None:
+            continue
+        url, data = built
+
+        started = time.perf_counter()
+        response = _request(client, url, data)
+        error = None
+        try:
+            _consume(response)
+        except Exception as e:
+            # a streamed page failing halfway, after its 200 went out
+            error = f"{url} -> failed while streaming: {e!r}"
+        elapsed = time.perf_counter() - started
+
+        if error is None and response.status_code not in expected:
+            error = f"{url} -> {response.status_code}"
+            if getattr(response, 'exc_info', None):
+                error += f": {response.exc_info[1]!r}"
+        recorder.add(name, elapsed, error)
+
+
+def run(requests=2000, concurrency=4, seed=0, only=None):
+    """
+    Replay `requests` requests of the traffic mix from `concurrency`
+    threads. Returns the report dict (see report()).
+    """
+    endpoints = [e for e in ENDPOINTS if not only or e[0] in only]
+    targets = Targets()
+    recorder = Recorder()
+    counter = {'left': requests, 'lock': threading.Lock()}
+
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(i, endpoints, targets, seed, recorder, counter),
+        )
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return report(recorder, elapsed, requests, concurrency, seed)
+
+
+def report(recorder, elapsed, requests, concurrency, seed):
+    endpoints = {}
+    for name, latencies in recorder.latencies.items():
+        endpoints[name] = {
+            'count': len(latencies),
+            'errors': recorder.errors.get(name, 0),
+            'first_error': recorder.first_error.get(name),
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+    total = sum(e['count'] for e in endpoints.values())
+    return {
+        'meta': {
+            'requests': requests,
+            'concurrency': concurrency,
+            'seed': seed,
+            'elapsed_s': round(elapsed, 2),
+            'rps': round(total / elapsed, 2) if elapsed else 0.0,
+        },
+        'endpoints': endpoints,
+    }
+
+
+# ---------- baseline ----------
+
+def save_baseline(result, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(result, baseline, tolerance=0.25, min_delta_ms=5.0):
+    """
+    Regressions of `result` against `baseline`, as messages:
+      - p95 more than `tolerance` slower (and by more than min_delta_ms,
+        so 1 ms endpoints do not flap),
+      - requests/second more than `tolerance` lower,
+      - errors on an endpoint that had none.
+    """
+    problems = []
+    for name, current in sorted(result['endpoints'].items()):
+        base = baseline.get('endpoints', {}).get(name)
+        if base is None:
+            continue
+        if (current['p95_ms'] > base['p95_ms'] * (1 + tolerance)
+                and current['p95_ms'] - base['p95_ms'] > min_delta_ms):
+            problems.append(f"{name}: p95 {base['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current['errors'] and not base.get('errors'):
+            problems.append(f"{name}: {current['errors']} errors (baseline had none)")
+
+    base_rps = baseline.get('meta', {}).get('rps')
+    if base_rps and result['meta']['rps'] < base_rps * (1 - tolerance):
+        problems.append(f"overall: {base_rps} req/s -> {result['meta']['rps']} req/s")
+    return problems
@@ -0,0 +1,158 @@
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.models import Car
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/second and latency of the WSGI views and the async "
+        "ASGI views for home, car_list, car_detail and reviews_page. Both apps "
+        "are driven in-process against the configured MongoDB, so the numbers "
+        "are for comparing the two paths, not absolute capacity."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', '-n',
+            type=int,
+            default=500,
+            help="Requests per page and app (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--concurrency', '-c',
+            type=int,
+            default=16,
+            help="Requests in flight: WSGI worker threads / ASGI tasks (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help="Path to request (repeatable). Default: /, /cars/, one /cars/<id>/ and /reviews/.",
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive")
+
+        paths = options['paths'] or self.default_paths()
+
+        from car_sales_site.asgi import application as asgi_app
+        from car_sales_site.wsgi import application as wsgi_app
+
+        self.stdout.write(
+            f"{'path':<40} {'app':<5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}"
+        )
+        for path in paths:
+            for name, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                app = wsgi_app if name == 'wsgi' else asgi_app
+                elapsed, latencies, errors = run(app, path, options['requests'], options['concurrency'])
+                self.stdout.write(
+                    f"{path:<40} {name:<5} {len(latencies) / elapsed:>8.1f} "
+                    f"{percentile(latencies, 50) * 1000:>8.1f} "
+                    f"{percentile(latencies, 99) * 1000:>8.1f} {errors:>6}"
+                )
+
+    def default_paths(self):
+        paths = ['/', '/cars/', '/reviews/']
+        car = Car.objects.mongo_find_one({}, {'_id': 1})
+        if car is not None:
+            paths.insert(2, f"/cars/{car['_id']}/")
+        return paths
+
+    # ---------- WSGI: a pool of threads, like a threaded WSGI server ----------
+
+    def run_wsgi(self, app, path, count, concurrency):
+        path, _, query = path.partition('?')
+
+        def one(_):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'localhost',
+                'wsgi.input': io.BytesIO(),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0),
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            started = time.perf_counter()
+            body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            return time.perf_counter() - started, not status[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(count)))
+        elapsed = time.perf_counter() - started
+        return elapsed, [r[0] for r in results], sum(r[1] for r in results)
+
+    # ---------- ASGI: concurrent tasks on one event loop ----------
+
+    def run_asgi(self, app, path, count, concurrency):
+        path, _, query = path.partition('?')
+
+        async def one(semaphore):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query.encode(),
+                'root_path': '',
+                'headers': [(b'host', b'localhost')],
+                'server': ('localhost', 80),
+                'client': ('127.0.0.1', 0),
+            }
+            status = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await app(scope, receive, send)
+                return time.perf_counter() - started, status[0] != 200
+
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(one(semaphore) for _ in range(count)))
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        elapsed = time.perf_counter() - started
+        return elapsed, [r[0] for r in results], sum(r[1] for r in results)
@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.recommendations import build_all, nearest_neighbours
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute the similar cars shown on each car detail page. "
+        "With --benchmark, time the neighbour computation on synthetic "
+        "catalogs instead (nothing is read from or written to the database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--benchmark',
+            metavar='SIZES',
+            help="Comma-separated catalog sizes to time, e.g. 10000,100000,1000000.",
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Random seed for the synthetic benchmark catalog.",
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            try:
+                sizes = [int(s) for s in options['benchmark'].split(',') if s.strip()]
+            except ValueError:
+                raise CommandError("--benchmark expects numbers, e.g. 10000,100000")
+            self.benchmark(sizes, options['seed'])
+            return
+
+        count = build_all(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Similar cars built for {count} cars."))
+
+    def benchmark(self, sizes, seed):
+        rng = np.random.default_rng(seed)
+        make_names = [f"Make{i}" for i in range(40)]
+
+        self.stdout.write(f"{'cars':>10} {'seconds':>10} {'cars/s':>12} {'us/car':>8}")
+        for n in sizes:
+            makes = rng.choice(make_names, size=n)
+            models = np.char.add(makes, rng.integers(0, 12, size=n).astype(str))
+            prices = rng.lognormal(mean=10.2, sigma=0.5, size=n).round(2)
+            years = rng.integers(2005, 2026, size=n)
+
+            started = time.perf_counter()
+            nearest_neighbours(makes, models, prices, years)
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(
+                f"{n:>10} {elapsed:>10.2f} {n / elapsed:>12.0f} {elapsed / n * 1e6:>8.1f}"
+            )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.indexes import ensure_indexes, index_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the MongoDB indexes declared in the cars models (safe to run "
+        "on every deploy) and report missing, unused or undeclared indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report; exit with an error if a declared index is missing.",
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help="Database alias to use (default: 'default').",
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+
+        # ---------- CREATE ----------
+        if not options['check']:
+            for collection, name, created in ensure_indexes(using=using):
+                status = 'created' if created else 'ok'
+                self.stdout.write(f"{collection}.{name}: {status}")
+
+        # ---------- REPORT ----------
+        report = index_report(using=using)
+
+        for collection, name in report['undeclared']:
+            self.stdout.write(self.style.WARNING(
+                f"undeclared index {collection}.{name} (not in Meta.indexes)"
+            ))
+
+        for collection, name, since in report['unused']:
+            self.stdout.write(self.style.WARNING(
+                f"unused index {collection}.{name} (no operations since {since})"
+            ))
+
+        if report['missing']:
+            names = ', '.join(f"{c}.{n}" for c, n in report['missing'])
+            raise CommandError(f"Missing indexes: {names}")
+
+        self.stdout.write(self.style.SUCCESS("All declared indexes are present."))
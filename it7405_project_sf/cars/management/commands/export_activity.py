@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from cars.exports import EXPORT_BATCH_SIZE, EXPORT_FORMATS, EXPORTS, export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream all orders, offers or appointments as CSV or JSONL, with the "
+        "car label and username resolved. Memory use does not grow with the "
+        "number of rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument(
+            '--format',
+            choices=list(EXPORT_FORMATS),
+            default='csv',
+            help="Output format (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--output', '-o',
+            help="File to write to (default: stdout).",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EXPORT_BATCH_SIZE,
+            help="Documents per cursor batch (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        lines = export_lines(options['kind'], options['format'], options['batch_size'])
+
+        if not options['output']:
+            for chunk in lines:
+                sys.stdout.write(chunk)
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+            for chunk in lines:
+                out.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['kind']} to {options['output']}."))
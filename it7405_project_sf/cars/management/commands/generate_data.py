@@ -0,0 +1,90 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic dataset (users, cars, reviews, "
+        "orders, offers, appointments) from a seed, with batched bulk writes "
+        "spread over several processes. Re-running with the same seed only "
+        "adds what is missing. See cars/synthetic.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--cars', type=int, default=100000)
+        parser.add_argument('--reviews', type=int, default=100000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--offers', type=int, default=100000)
+        parser.add_argument('--appointments', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Same seed, same documents (default: %(default)s).")
+        parser.add_argument(
+            '--distributions',
+            metavar='FILE',
+            help="JSON file overriding keys of cars.synthetic.DISTRIBUTIONS "
+                 "(makes, price, years, ratings, user_skew, car_skew, ...).",
+        )
+        parser.add_argument(
+            '--processes', '-p',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=synthetic.WRITE_BATCH_SIZE,
+            help="Documents per insert_many (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=synthetic.CHUNK_SIZE,
+            help="Documents per unit of work (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help="Do not rebuild counters, review stats and similar cars afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        for name in ('users', 'cars', 'reviews', 'orders', 'offers', 'appointments'):
+            if options[name] < 0:
+                raise CommandError(f"--{name} cannot be negative")
+        for name in ('processes', 'batch_size', 'chunk_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive")
+
+        try:
+            if options['distributions']:
+                dist = synthetic.load_distributions(options['distributions'])
+            else:
+                dist = synthetic.distributions()
+        except (OSError, ValueError) as e:
+            raise CommandError(f"--distributions: {e}")
+
+        verbosity = options['verbosity']
+
+        def on_progress(stats):
+            if verbosity >= 2:
+                self.stdout.write(
+                    f"  {stats.documents} documents ({stats.docs_per_second:.0f}/s)"
+                )
+
+        stats = synthetic.seed(
+            cars=options['cars'], users=options['users'], reviews=options['reviews'],
+            orders=options['orders'], offers=options['offers'],
+            appointments=options['appointments'], seed=options['seed'], dist=dist,
+            processes=options['processes'], batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'], finish=False, on_progress=on_progress,
+        )
+        self.stdout.write(self.style.SUCCESS(stats.summary()))
+
+        if not options['skip_derived']:
+            self.stdout.write("Rebuilding counters, review stats and similar cars...")
+            synthetic.finish_seed(stdout=self.stdout)
@@ -0,0 +1,120 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.importer import (
+    DEFAULT_KEY_FIELDS,
+    IMPORT_BATCH_SIZE,
+    IMPORT_FIELDS,
+    detect_format,
+    finish_import,
+    import_cars,
+    iter_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV or JSONL inventory feed into the cars collection. "
+        "Rows are validated, prices like \"$28,900\" are normalized, and each "
+        "row updates the car with the same natural key or inserts a new one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Feed file, or - for stdin.")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help="Feed format (default: from the file extension, else csv).",
+        )
+        parser.add_argument(
+            '--key',
+            default=','.join(DEFAULT_KEY_FIELDS),
+            help="Comma-separated natural key fields (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Rows per bulk write (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--rejects',
+            metavar='FILE',
+            help="Write rejected rows with their errors to FILE as JSONL.",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Validate only; nothing is written.",
+        )
+        parser.add_argument(
+            '--skip-recommendations',
+            action='store_true',
+            help="Do not rebuild the similar cars afterwards (run build_recommendations later).",
+        )
+        parser.add_argument(
+            '--skip-images',
+            action='store_true',
+            help="Do not make the resized images afterwards (run process_images later).",
+        )
+
+    def handle(self, *args, **options):
+        key_fields = tuple(k.strip() for k in options['key'].split(',') if k.strip())
+        unknown = [k for k in key_fields if k not in IMPORT_FIELDS]
+        if not key_fields or unknown:
+            raise CommandError(f"--key must be made of {', '.join(IMPORT_FIELDS)}")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        verbosity = options['verbosity']
+
+        rejects_file = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else None
+        shown = 0
+
+        def on_reject(line_number, row, error):
+            nonlocal shown
+            if rejects_file is not None:
+                rejects_file.write(json.dumps({'line': line_number, 'error': error, 'row': row}) + '\n')
+            if verbosity >= 1 and shown < 20:
+                self.stderr.write(f"line {line_number}: {error}")
+                shown += 1
+
+        def on_batch(stats):
+            if verbosity >= 2:
+                self.stdout.write(stats.summary())
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            stats = import_cars(
+                iter_rows(stream, fmt),
+                key_fields=key_fields,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                on_reject=on_reject,
+                on_batch=on_batch,
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects_file is not None:
+                rejects_file.close()
+
+        if stats.rejected > shown and verbosity >= 1:
+            self.stderr.write(f"... {stats.rejected - shown} more rejected rows")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Dry run: {stats.summary()}"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(stats.summary()))
+        if stats.inserted or stats.updated:
+            finish_import(
+                rebuild_recommendations=not options['skip_recommendations'],
+                process_images=not options['skip_images'],
+                stdout=self.stdout,
+            )
+            self.stdout.write("Counters and caches updated.")
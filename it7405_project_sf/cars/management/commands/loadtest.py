@@ -0,0 +1,140 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from cars import loadtest, synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database, replay a weighted mix of requests against "
+        "every URL of the site and report req/s and p50/p95/p99 per endpoint. "
+        "With --baseline the run fails when an endpoint got slower or started "
+        "returning errors. See cars/loadtest.py."
+    )
+
+    # the checks would connect to the configured database before the
+    # scratch one is set up
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--in-process',
+            action='store_true',
+            help="Use an in-memory mongomock database instead of MongoDB.",
+        )
+        parser.add_argument(
+            '--database-name',
+            default='car_sales_loadtest',
+            help="Scratch database, dropped and re-seeded (default: %(default)s).",
+        )
+        parser.add_argument('--keep', action='store_true',
+                            help="Do not drop the scratch database afterwards.")
+        parser.add_argument('--cars', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--reviews', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--offers', type=int, default=1000)
+        parser.add_argument('--appointments', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Seed for the dataset and the request mix (default: %(default)s).")
+        parser.add_argument(
+            '--requests', '-n',
+            type=int,
+            default=2000,
+            help="Requests in total (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--concurrency', '-c',
+            type=int,
+            default=4,
+            help="Worker threads (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            help="Endpoint name to include (repeatable). Default: the whole mix.",
+        )
+        parser.add_argument('--baseline', help="JSON report to compare with.")
+        parser.add_argument('--save-baseline', help="Write this run's report as JSON.")
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help="Allowed slowdown before a regression is reported (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive")
+        if options['only']:
+            unknown = set(options['only']) - {e[0] for e in loadtest.ENDPOINTS}
+            if unknown:
+                raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+        baseline = loadtest.load_baseline(options['baseline']) if options['baseline'] else None
+        name = options['database_name']
+
+        try:
+            loadtest.use_scratch_database(name, in_process=options['in_process'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        where = 'mongomock' if options['in_process'] else settings.DATABASES['default']['CLIENT'].get('host')
+        self.stdout.write(f"Seeding {name} ({where})...")
+
+        stats = synthetic.seed(
+            cars=options['cars'], users=options['users'], reviews=options['reviews'],
+            orders=options['orders'], offers=options['offers'],
+            appointments=options['appointments'], seed=options['seed'],
+        )
+        self.stdout.write(stats.summary())
+
+        # slow-request warnings would drown the report
+        logging.getLogger('cars.instrumentation').setLevel(logging.ERROR)
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        try:
+            result = loadtest.run(
+                requests=options['requests'], concurrency=options['concurrency'],
+                seed=options['seed'], only=options['only'],
+            )
+        finally:
+            if not options['keep'] and not options['in_process']:
+                loadtest.drop_scratch_database(name)
+
+        self.print_report(result)
+
+        if options['save_baseline']:
+            loadtest.save_baseline(result, options['save_baseline'])
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+
+        errors = {n: e for n, e in result['endpoints'].items() if e['errors']}
+        if baseline is not None:
+            problems = loadtest.compare(result, baseline, tolerance=options['tolerance'])
+            if problems:
+                for problem in problems:
+                    self.stderr.write(problem)
+                raise CommandError(f"{len(problems)} regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+        elif errors:
+            raise CommandError(f"{len(errors)} endpoint(s) returned errors")
+
+    def print_report(self, result):
+        self.stdout.write(
+            f"{'endpoint':<24} {'count':>6} {'req/s':>8} {'p50 ms':>8} "
+            f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>6}"
+        )
+        for name, e in sorted(result['endpoints'].items()):
+            self.stdout.write(
+                f"{name:<24} {e['count']:>6} {e['rps']:>8.1f} {e['p50_ms']:>8.1f} "
+                f"{e['p95_ms']:>8.1f} {e['p99_ms']:>8.1f} {e['errors']:>6}"
+            )
+        meta = result['meta']
+        self.stdout.write(
+            f"{meta['requests']} requests, {meta['concurrency']} threads, "
+            f"{meta['elapsed_s']}s, {meta['rps']} req/s overall"
+        )
+        for name, e in sorted(result['endpoints'].items()):
+            if e['first_error']:
+                self.stderr.write(f"{name}: {e['first_error']}")
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.images import PROCESS_WORKERS, optimize_static_images, process_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the resized WebP/JPEG copies of car images that do not have "
+        "them yet (see cars/images.py). With --static, write WebP copies of "
+        "the site's own background images instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help="Process at most this many cars.")
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='everything',
+            help="Redo every car, e.g. after changing CAR_IMAGE_WIDTHS.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=PROCESS_WORKERS,
+            help="Images fetched and encoded at once (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--static',
+            action='store_true',
+            help="Optimize cars/static/cars/images instead of the car images.",
+        )
+
+    def handle(self, *args, **options):
+        if options['static']:
+            for name, before, after in optimize_static_images():
+                self.stdout.write(f"{name}: {before // 1024} KB -> {after // 1024} KB WebP")
+            return
+
+        if options['workers'] < 1:
+            raise CommandError("--workers must be positive")
+
+        shown = 0
+
+        def on_error(doc, error):
+            nonlocal shown
+            if shown < 20:
+                self.stderr.write(f"{doc['_id']}: {error}")
+                shown += 1
+
+        processed, failed = process_pending(
+            limit=options['limit'], everything=options['everything'],
+            workers=options['workers'], on_error=on_error, stdout=self.stdout,
+        )
+        if failed > shown:
+            self.stderr.write(f"... {failed - shown} more failed")
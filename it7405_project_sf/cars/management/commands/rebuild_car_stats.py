@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from cars.car_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-car offer and order figures (counts per status, "
+        "highest and average offer) from the Offer and Order collections "
+        "in one aggregation."
+    )
+
+    def handle(self, *args, **options):
+        rebuild(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Car offer and order figures rebuilt."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from cars.review_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the review statistics (rating histogram, average and "
+        "latest reviews feed) from the Review collection."
+    )
+
+    def handle(self, *args, **options):
+        doc = rebuild()
+        histogram = ', '.join(f"{r}*: {n}" for r, n in doc['histogram'].items())
+        self.stdout.write(f"{doc['count']} reviews ({histogram})")
+        self.stdout.write(self.style.SUCCESS("Review stats rebuilt."))
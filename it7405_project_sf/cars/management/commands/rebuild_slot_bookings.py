@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from cars.slots import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the booked places of every test-drive slot from the "
+        "pending and confirmed appointments."
+    )
+
+    def handle(self, *args, **options):
+        rebuild(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Slot bookings rebuilt."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from cars.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount cars, reviews and appointments and correct the materialized "
+        "home page counters. Run periodically (e.g. from cron) and after bulk imports."
+    )
+
+    def handle(self, *args, **options):
+        for name, old, new in reconcile():
+            if old == new:
+                self.stdout.write(f"{name}: {new} (ok)")
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"{name}: {old} -> {new} (corrected drift)"
+                ))
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
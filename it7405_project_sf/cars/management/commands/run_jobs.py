@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.jobs import BATCH_SIZE, IDLE_SLEEP, retry_failed, work
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the background jobs queued by the site (confirmation emails, "
+        "car images; see cars/jobs.py) until interrupted. Start as many "
+        "as needed: a job is only ever taken by one of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Stop when no job is due instead of waiting for more.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help=f"Jobs taken at a time (default: JOBS_BATCH_SIZE or {BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=IDLE_SLEEP,
+            help="Seconds to wait when the queue is empty (default: %(default)s).",
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help="Queue the failed jobs again first.",
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        if options['retry_failed']:
+            self.stdout.write(f"{retry_failed()} failed jobs queued again")
+
+        try:
+            done, retried, failed = work(
+                batch_size=options['batch_size'], idle_sleep=options['sleep'],
+                once=options['once'],
+                stdout=self.stdout if options['verbosity'] > 1 else None,
+            )
+        except KeyboardInterrupt:
+            # the jobs of an interrupted batch run again once their claim runs out
+            self.stdout.write("Interrupted.")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{done} jobs done, {retried} to retry, {failed} failed."
+        ))
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from gzip import GzipFile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+from django.utils.text import StreamingBuffer
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import instrumentation
+
+
+logger = logging.getLogger('cars.instrumentation')
+
+DEFAULTS = {
+    # add a Server-Timing header to every response
+    'SERVER_TIMING': True,
+    # log requests slower than this in total ...
+    'SLOW_REQUEST_MS': 500,
+    # ... or spending more than this in MongoDB ...
+    'SLOW_DB_MS': 200,
+    # ... or running more operations than this
+    'MAX_OPS': 20,
+}
+
+
+def instrumentation_settings():
+    return {**DEFAULTS, **getattr(settings, 'DB_INSTRUMENTATION', {})}
+
+
+class DatabaseInstrumentationMiddleware:
+    """
+    Count the MongoDB operations, DB time and template time of each request
+    (see cars/instrumentation.py), report them in a Server-Timing header
+    and log requests over the DB_INSTRUMENTATION thresholds.
+
+    Works for both the WSGI and the ASGI app without a thread switch.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.options = instrumentation_settings()
+        if asyncio.iscoroutinefunction(get_response):
+            # tell Django this middleware is a coroutine function
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        stats, token = instrumentation.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, token = instrumentation.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        return self.finish(request, response, stats, started)
+
+    def finish(self, request, response, stats, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        options = self.options
+
+        if options['SERVER_TIMING']:
+            response['Server-Timing'] = server_timing(stats, total_ms)
+
+        if (total_ms > options['SLOW_REQUEST_MS']
+                or stats.db_ms > options['SLOW_DB_MS']
+                or stats.ops > options['MAX_OPS']):
+            logger.warning(
+                "Slow request %s %s: %.1f ms total, %d DB ops in %.1f ms, "
+                "templates %.1f ms; slowest op %.1f ms: %s",
+                request.method, request.get_full_path(), total_ms, stats.ops,
+                stats.db_ms, stats.template_ms, stats.slowest_ms, stats.slowest,
+            )
+        return response
+
+
+def server_timing(stats, total_ms):
+    """
+    e.g. db;dur=12.5;desc="4 ops", db-slowest;dur=8.1;desc="aggregate cars_car",
+         tpl;dur=3.2, total;dur=20.4
+    """
+    parts = [f'db;dur={stats.db_ms:.1f};desc="{stats.ops} ops"']
+    if stats.ops:
+        # only the command and collection: the header is visible to clients
+        name = ' '.join(stats.slowest.split(' ', 2)[:2]).replace('"', '')
+        parts.append(f'db-slowest;dur={stats.slowest_ms:.1f};desc="{name}"')
+    parts.append(f'tpl;dur={stats.template_ms:.1f}')
+    parts.append(f'total;dur={total_ms:.1f}')
+    return ', '.join(parts)
+
+
+def compress_sequence_flushing(sequence):
+    """
+    django.utils.text.compress_sequence, but flushing the compressor after
+    every chunk, so each chunk reaches the browser when it is produced
+    instead of when zlib's buffer happens to fill up.
+    """
+    buf = StreamingBuffer()
+    with GzipFile(mode='wb', compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        yield buf.read()
+        for item in sequence:
+            zfile.write(item)
+            zfile.flush()
+            yield buf.read()
+    yield buf.read()
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """
+    Django's GZipMiddleware, except that streamed responses (the catalog,
+    see cars/streaming.py, and the staff exports) are flushed chunk by
+    chunk. The stock version holds the page head back until about 16 KB
+    of compressed output has piled up.
+    """
+    def process_response(self, request, response):
+        original = response.streaming_content if response.streaming else None
+        response = super().process_response(request, response)
+        if original is not None and response.get('Content-Encoding') == 'gzip':
+            # the stock compressor has not started yet; replace it
+            response.streaming_content = compress_sequence_flushing(original)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise (static files from STATIC_ROOT, precompressed, far-future
+    caching) for both the WSGI and the ASGI app. WhiteNoiseMiddleware is
+    sync-only, so under ASGI Django would wrap the chain in
+    sync_to_async and every request would queue for the one sync
+    thread. Here the lookup is a dict read in the event loop and only
+    opening a matched file goes to a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if asyncio.iscoroutinefunction(get_response):
+            # tell Django this middleware is a coroutine function
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # development only: looks on disk
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
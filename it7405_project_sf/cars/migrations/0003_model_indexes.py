@@ -0,0 +1,82 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+def create_indexes(apps, schema_editor):
+    """
+    djongo drops the "-" (descending) part of index fields, so the indexes
+    are built with pymongo from the same declarations instead.
+    """
+    from cars.indexes import ensure_indexes
+
+    app_models = [
+        apps.get_model('cars', name)
+        for name in ('Car', 'Order', 'Offer', 'Review', 'Appointment')
+    ]
+    ensure_indexes(app_models, using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0002_appointment_review'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='appointment',
+                    index=models.Index(fields=['user', '-preferred_date'], name='appt_user_date_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='appointment',
+                    index=models.Index(fields=['preferred_date', 'preferred_time'], name='appt_date_slot_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='car',
+                    index=models.Index(fields=['-year', 'price', '_id'], name='car_year_price_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='car',
+                    index=models.Index(fields=['price', '_id'], name='car_price_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='car',
+                    index=models.Index(fields=['make'], name='car_make_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='car',
+                    index=models.Index(fields=['model'], name='car_model_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='offer',
+                    index=models.Index(fields=['user', '-created_at'], name='offer_user_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='order',
+                    index=models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='review',
+                    index=models.Index(fields=['-created_at'], name='review_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='review',
+                    index=models.Index(fields=['rating', '-created_at'], name='review_rating_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='review',
+                    index=models.Index(fields=['-rating', '-created_at'], name='review_rating_desc_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='review',
+                    index=models.Index(fields=['user', '-created_at'], name='review_user_created_idx'),
+                ),
+            ],
+        ),
+        # after the state change: RunPython gets the models as of the end of
+        # this migration, with the indexes just added
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+    ]
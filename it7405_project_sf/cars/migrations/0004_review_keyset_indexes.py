@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:02
+
+from django.db import migrations, models
+
+
+REBUILT_INDEXES = (
+    'review_created_idx',
+    'review_rating_created_idx',
+    'review_rating_desc_idx',
+)
+
+
+def rebuild_review_indexes(apps, schema_editor):
+    """
+    The review indexes keep their names but gain an `_id` tie-breaker for
+    keyset pagination, so the old versions have to be dropped first.
+    """
+    from cars.indexes import ensure_indexes
+    from cars.mongo import get_collection
+
+    Review = apps.get_model('cars', 'Review')
+    using = schema_editor.connection.alias
+
+    collection = get_collection(Review, using)
+    existing = collection.index_information()
+    for name in REBUILT_INDEXES:
+        if name in existing:
+            collection.drop_index(name)
+
+    ensure_indexes([Review], using=using)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0003_model_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='review',
+                    name='review_created_idx',
+                ),
+                migrations.RemoveIndex(
+                    model_name='review',
+                    name='review_rating_created_idx',
+                ),
+                migrations.RemoveIndex(
+                    model_name='review',
+                    name='review_rating_desc_idx',
+                ),
+                migrations.AddIndex(
+                    model_name='review',
+                    index=models.Index(fields=['-created_at', '-_id'], name='review_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='review',
+                    index=models.Index(fields=['rating', '-created_at', '-_id'], name='review_rating_created_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='review',
+                    index=models.Index(fields=['-rating', '-created_at', '-_id'], name='review_rating_desc_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(rebuild_review_indexes, migrations.RunPython.noop),
+    ]
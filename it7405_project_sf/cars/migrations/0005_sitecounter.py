@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:03
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+def seed_counters(apps, schema_editor):
+    """
+    Fill the counters with the current totals so home() is right from
+    the first request.
+    """
+    from cars.counters import reconcile
+
+    reconcile(
+        counter_model=apps.get_model('cars', 'SiteCounter'),
+        counted_models={
+            'cars': apps.get_model('cars', 'Car'),
+            'reviews': apps.get_model('cars', 'Review'),
+            'appointments': apps.get_model('cars', 'Appointment'),
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_review_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounter',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:04
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+def seed_review_stats(apps, schema_editor):
+    from cars.review_stats import rebuild
+
+    rebuild(
+        stats_model=apps.get_model('cars', 'ReviewStats'),
+        review_model=apps.get_model('cars', 'Review'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0005_sitecounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewStats',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('histogram', djongo.models.fields.JSONField(default=dict)),
+                ('latest', djongo.models.fields.JSONField(default=list)),
+            ],
+        ),
+        migrations.RunPython(seed_review_stats, migrations.RunPython.noop),
+    ]
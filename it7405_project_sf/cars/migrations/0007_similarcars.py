@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import djongo.models.fields
+
+
+def create_indexes(apps, schema_editor):
+    from cars.indexes import ensure_indexes
+
+    ensure_indexes(
+        [apps.get_model('cars', 'Car'), apps.get_model('cars', 'SimilarCars')],
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0006_reviewstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarCars',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('similar', djongo.models.fields.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='similarcars',
+            name='car',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='cars.car'),
+        ),
+        # see 0003: indexes are built with pymongo, not djongo
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='car',
+                    index=models.Index(fields=['make', 'price'], name='car_make_price_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='similarcars',
+                    index=models.Index(fields=['similar'], name='similar_cars_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+    ]
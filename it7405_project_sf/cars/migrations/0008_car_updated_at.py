@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:12
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def stamp_existing(apps, schema_editor):
+    """
+    Give every existing car (and similar-cars list) a modification time,
+    so their detail pages get validators right away.
+    """
+    from cars.mongo import get_collection
+
+    now = timezone.now()
+    for model_name in ('Car', 'SimilarCars'):
+        get_collection(apps.get_model('cars', model_name), schema_editor.connection.alias).update_many(
+            {'updated_at': None},
+            {'$set': {'updated_at': now}},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0007_similarcars'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='similarcars',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(stamp_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+
+def create_indexes(apps, schema_editor):
+    from cars.indexes import ensure_indexes
+
+    ensure_indexes(
+        [apps.get_model('cars', 'Car')],
+        using=schema_editor.connection.alias,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0008_car_updated_at'),
+    ]
+
+    operations = [
+        # see 0003: indexes are built with pymongo, not djongo
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='car',
+                    index=models.Index(fields=['make', 'model', 'year', 'image_url'], name='car_natural_key_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_car_natural_key_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='image_height',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_source',
+            field=models.CharField(blank=True, default='', editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_width',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='image_widths',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import djongo.models.fields
+
+
+def create_indexes(apps, schema_editor):
+    from cars.indexes import ensure_indexes
+
+    ensure_indexes([apps.get_model('cars', 'Offer')], using=schema_editor.connection.alias)
+
+
+def seed_car_stats(apps, schema_editor):
+    from cars.car_stats import rebuild
+    from cars.mongo import get_collection
+
+    using = schema_editor.connection.alias
+    offer_model = apps.get_model('cars', 'Offer')
+    order_model = apps.get_model('cars', 'Order')
+    # nothing to count on a new database
+    if (get_collection(offer_model, using).find_one() is None
+            and get_collection(order_model, using).find_one() is None):
+        return
+
+    rebuild(
+        stats_model=apps.get_model('cars', 'CarStats'),
+        offer_model=offer_model,
+        order_model=order_model,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0010_car_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarStats',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('offer_count', models.IntegerField(default=0)),
+                ('offer_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('offer_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('offers', djongo.models.fields.JSONField(default=dict)),
+                ('order_count', models.IntegerField(default=0)),
+                ('orders', djongo.models.fields.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        # see 0003: indexes are built with pymongo, not djongo. The build
+        # runs after the state change, so the historical model has the index.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='offer',
+                    index=models.Index(fields=['car', '-amount'], name='offer_car_amount_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='carstats',
+            name='car',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='cars.car'),
+        ),
+        migrations.RunPython(seed_car_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:43
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+def create_indexes(apps, schema_editor):
+    from cars.indexes import ensure_indexes
+
+    ensure_indexes([apps.get_model('cars', 'SlotBooking')], using=schema_editor.connection.alias)
+
+
+def seed_slot_bookings(apps, schema_editor):
+    from cars.slots import rebuild
+
+    rebuild(
+        booking_model=apps.get_model('cars', 'SlotBooking'),
+        appointment_model=apps.get_model('cars', 'Appointment'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0011_carstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotBooking',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('slot', models.CharField(max_length=20)),
+                ('booked', models.IntegerField(default=0)),
+            ],
+        ),
+        # see 0003 and 0011: built with pymongo after the state change
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='slotbooking',
+                    constraint=models.UniqueConstraint(fields=('date', 'slot'), name='slot_booking_date_slot_uniq'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+        migrations.RunPython(seed_slot_bookings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:49
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+def create_indexes(apps, schema_editor):
+    from cars.indexes import ensure_indexes
+
+    ensure_indexes([apps.get_model('cars', 'Job')], using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0012_slotbooking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('task', models.CharField(max_length=100)),
+                ('args', djongo.models.fields.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=5)),
+                ('run_at', models.DateTimeField()),
+                ('claimed_by', models.CharField(blank=True, max_length=100)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        # see 0003 and 0011: built with pymongo after the state change
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='job',
+                    index=models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_indexes, migrations.RunPython.noop),
+    ]
@@ -10,22 +10,32 @@ class Car(models.Model):
     description = models.TextField()
     image_url = models.CharField(max_length=300)
 
-    def __str__(self):
-        return f"{self.make} {self.model} ({self.year})"
-
-    @property
-    def mongo_id(self):
-        return str(self._id)
+    # Resized WebP/JPEG copies of the image, made by cars/images.py:
+    # MEDIA_ROOT/cars/<image_key>/<width>.webp|.jpg for each width in
+    # image_widths. image_source is the image_url they were made from.
+    image_source = models.CharField(max_length=300, blank=True, default='', editable=False)
+    image_key = models.CharField(max_length=40, blank=True, default='', editable=False)
+    image_width = models.IntegerField(null=True, blank=True, editable=False)
+    image_height = models.IntegerField(null=True, blank=True, editable=False)
+    image_widths = models.CharField(max_length=100, blank=True, default='', editable=False)
+    # validator for conditional GETs of the detail page (cars/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
 
+    # Gives access to the raw pymongo collection (Car.objects.mongo_aggregate etc.)
+    objects = models.DjongoManager()
 
-class Car(models.Model):
-    _id = models.ObjectIdField()
-    make = models.CharField(max_length=100)
-    model = models.CharField(max_length=100)
-    year = models.IntegerField()
-    price = models.DecimalField(max_digits=10, decimal_places=2)
-    description = models.TextField()
-    image_url = models.CharField(max_length=300)
+    class Meta:
+        indexes = [
+            # default catalog order: newest year first, then cheaper price
+            models.Index(fields=['-year', 'price', '_id'], name='car_year_price_idx'),
+            models.Index(fields=['price', '_id'], name='car_price_idx'),
+            models.Index(fields=['make'], name='car_make_idx'),
+            # similar-car candidates: same make, nearby price
+            models.Index(fields=['make', 'price'], name='car_make_price_idx'),
+            models.Index(fields=['model'], name='car_model_idx'),
+            # natural key of `manage.py import_cars` upserts
+            models.Index(fields=['make', 'model', 'year', 'image_url'], name='car_natural_key_idx'),
+        ]
 
     def __str__(self):
         return f"{self.make} {self.model} ({self.year})"
@@ -56,6 +66,22 @@ class Order(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = models.DjongoManager()
+
+    class Meta:
+        indexes = [
+            # my_activity: a user's orders, newest first
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status for the per-car figures
+        # (see cars/car_stats.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         return f"Order for {self.car} by {self.full_name}"
 
@@ -79,6 +105,25 @@ class Offer(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = models.DjongoManager()
+
+    class Meta:
+        indexes = [
+            # my_activity: a user's offers, newest first
+            models.Index(fields=['user', '-created_at'], name='offer_user_created_idx'),
+            # a car's highest offer (cars/car_stats.py)
+            models.Index(fields=['car', '-amount'], name='offer_car_amount_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status and amount for the per-car figures
+        # (see cars/car_stats.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        instance._loaded_amount = instance.__dict__.get('amount')
+        return instance
+
     def __str__(self):
         return f"Offer {self.amount} on {self.car}"
 
@@ -100,6 +145,28 @@ class Review(models.Model):
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = models.DjongoManager()
+
+    class Meta:
+        indexes = [
+            # reviews_page: "newest" / "oldest" and the latest reviews list
+            models.Index(fields=['-created_at', '-_id'], name='review_created_idx'),
+            # reviews_page: rating filters + "rating_low" sort
+            models.Index(fields=['rating', '-created_at', '-_id'], name='review_rating_created_idx'),
+            # reviews_page: "rating_high" sort
+            models.Index(fields=['-rating', '-created_at', '-_id'], name='review_rating_desc_idx'),
+            # my_activity: a user's reviews, newest first
+            models.Index(fields=['user', '-created_at'], name='review_user_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so the review stats can be adjusted
+        # when the review is edited (see cars/review_stats.py)
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
     def __str__(self):
         return f"Review by {self.full_name} ({self.rating}/5)"
 
@@ -134,5 +201,169 @@ class Appointment(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = models.DjongoManager()
+
+    class Meta:
+        indexes = [
+            # my_activity: a user's appointments, latest date first
+            models.Index(fields=['user', '-preferred_date'], name='appt_user_date_idx'),
+            # appointments by day / time slot
+            models.Index(fields=['preferred_date', 'preferred_time'], name='appt_date_slot_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which slot the stored appointment holds, so a change of
+        # date, time or status moves its booking (see cars/slots.py)
+        from .slots import held_slot
+
+        instance._loaded_slot = held_slot(instance)
+        return instance
+
     def __str__(self):
         return f"Appointment for {self.full_name} on {self.preferred_date}"
+
+
+class SlotBooking(models.Model):
+    """
+    Number of active test-drive appointments holding one (date, time of
+    day) slot, kept by cars/slots.py. The unique (date, slot) index is
+    what makes taking the last place of a slot race-free.
+    """
+    _id = models.ObjectIdField()
+    date = models.DateField()
+    slot = models.CharField(max_length=20)
+    booked = models.IntegerField(default=0)
+
+    objects = models.DjongoManager()
+
+    class Meta:
+        constraints = [
+            # one document per slot; also serves the calendar's month range
+            models.UniqueConstraint(fields=['date', 'slot'], name='slot_booking_date_slot_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.slot}: {self.booked} booked"
+
+
+class SiteCounter(models.Model):
+    """
+    Materialized document counts (cars, reviews, appointments) for the
+    home page. Kept up to date by the signals in cars/signals.py and
+    corrected by `manage.py reconcile_counters`. Also holds the per-model
+    change versions ("version:car", ...) used by cars/versions.py.
+    """
+    _id = models.ObjectIdField()
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+
+    objects = models.DjongoManager()
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class ReviewStats(models.Model):
+    """
+    Precomputed review statistics: rating histogram, average and the
+    latest reviews feed. Maintained by cars/review_stats.py.
+    """
+    _id = models.ObjectIdField()
+    name = models.CharField(max_length=50, unique=True)
+    count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    histogram = models.JSONField(default=dict)
+    latest = models.JSONField(default=list)
+
+    objects = models.DjongoManager()
+
+    def __str__(self):
+        return f"Review stats ({self.count} reviews)"
+
+
+class SimilarCars(models.Model):
+    """
+    Precomputed nearest neighbours of a car for the detail page
+    (see cars/recommendations.py). `similar` is a list of Car ids,
+    closest first. `updated_at` changes whenever the list is recomputed,
+    which also happens when one of the listed cars changes.
+    """
+    _id = models.ObjectIdField()
+    car = models.OneToOneField(Car, on_delete=models.CASCADE)
+    similar = models.JSONField(default=list)
+    updated_at = models.DateTimeField(null=True)
+
+    objects = models.DjongoManager()
+
+    class Meta:
+        indexes = [
+            # "which cars list this car?" (incremental refresh)
+            models.Index(fields=['similar'], name='similar_cars_idx'),
+        ]
+
+    def __str__(self):
+        return f"Similar cars for {self.car_id}"
+
+
+class CarStats(models.Model):
+    """
+    Running offer and order figures of one car, maintained by
+    cars/car_stats.py: offer count, total and highest amount, and the
+    offers and orders per status ({"pending": n, ...}).
+    """
+    _id = models.ObjectIdField()
+    car = models.OneToOneField(Car, on_delete=models.CASCADE)
+    offer_count = models.IntegerField(default=0)
+    offer_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    offer_max = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    offers = models.JSONField(default=dict)
+    order_count = models.IntegerField(default=0)
+    orders = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(null=True)
+
+    objects = models.DjongoManager()
+
+    def __str__(self):
+        return f"Offer and order figures for {self.car_id}"
+
+
+class Job(models.Model):
+    """
+    A piece of background work (cars/jobs.py): the name of a registered
+    task and its arguments. Queued by the views after a form is saved and
+    run by `manage.py run_jobs`. Jobs that succeed are deleted; the ones
+    out of attempts stay as 'failed' for the admin to look at.
+    """
+    _id = models.ObjectIdField()
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('running', 'Running'),
+            ('failed', 'Failed'),
+        ],
+        default='queued',
+    )
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    # when a queued job may run next; for a running job, when its worker's
+    # claim runs out
+    run_at = models.DateTimeField()
+    claimed_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = models.DjongoManager()
+
+    class Meta:
+        indexes = [
+            # the next jobs to run, and the failed ones
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
@@ -0,0 +1,26 @@
+"""
+Small helpers to reach the raw pymongo database behind djongo.
+
+Models that declare `objects = models.DjongoManager()` can already use
+Car.objects.mongo_find(...) etc. These helpers cover the other cases:
+historical models inside migrations, and collections that have no model.
+"""
+from django.db import connections
+
+
+def get_db(using='default'):
+    """
+    Return the pymongo Database used by the given Django connection.
+    """
+    return connections[using].cursor().db_conn
+
+
+def get_collection(model_or_name, using='default'):
+    """
+    Return the pymongo Collection for a model class or a collection name.
+    """
+    if isinstance(model_or_name, str):
+        name = model_or_name
+    else:
+        name = model_or_name._meta.db_table
+    return get_db(using)[name]
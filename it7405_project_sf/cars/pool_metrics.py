@@ -0,0 +1,137 @@
+"""
+MongoDB connection pool metrics.
+
+A pymongo ConnectionPoolListener, registered once per process in
+CarsConfig.ready() (before djongo or motor create their clients), counts
+what the driver's pools do:
+
+  connections_created / connections_closed
+  checkouts       - connections handed to a request
+  checkout_failed - no connection within waitQueueTimeoutMS (or pool errors)
+  in_use          - checked out right now
+  waiting         - threads/tasks waiting for a connection right now
+  wait_ms_total / wait_ms_max - time spent waiting for a checkout
+
+in_use close to maxPoolSize together with a growing wait time means the
+pool (or the database) is the bottleneck; size the worker count down or
+maxPoolSize up. The numbers are per process; staff can read them at
+/pool-stats/.
+"""
+import threading
+import time
+
+from django.conf import settings
+from pymongo import monitoring
+
+
+# pymongo's default when CLIENT does not set maxPoolSize
+DEFAULT_MAX_POOL_SIZE = 100
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # checkout start times of the waiting threads / tasks
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {
+                'pools_created': 0,
+                'pools_cleared': 0,
+                'connections_created': 0,
+                'connections_closed': 0,
+                'checkouts_started': 0,
+                'checkouts': 0,
+                'checkout_failed': 0,
+                'checked_in': 0,
+                'wait_ms_total': 0.0,
+                'wait_ms_max': 0.0,
+            }
+
+    def _add(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def _wait_done(self):
+        started = getattr(self._local, 'checkout_started', None)
+        self._local.checkout_started = None
+        if started is None:
+            return
+        waited = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.counters['wait_ms_total'] += waited
+            self.counters['wait_ms_max'] = max(self.counters['wait_ms_max'], waited)
+
+    # ---------- pool events ----------
+
+    def pool_created(self, event):
+        self._add('pools_created')
+
+    def pool_cleared(self, event):
+        self._add('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    # ---------- connection events ----------
+
+    def connection_created(self, event):
+        self._add('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add('connections_closed')
+
+    def connection_check_out_started(self, event):
+        self._local.checkout_started = time.perf_counter()
+        self._add('checkouts_started')
+
+    def connection_checked_out(self, event):
+        self._wait_done()
+        self._add('checkouts')
+
+    def connection_check_out_failed(self, event):
+        self._wait_done()
+        self._add('checkout_failed')
+
+    def connection_checked_in(self, event):
+        self._add('checked_in')
+
+    # ---------- reading ----------
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.counters)
+
+        max_pool_size = settings.DATABASES['default'].get('CLIENT', {}).get(
+            'maxPoolSize', DEFAULT_MAX_POOL_SIZE
+        )
+        data['in_use'] = data['checkouts'] - data['checked_in']
+        data['waiting'] = data['checkouts_started'] - data['checkouts'] - data['checkout_failed']
+        data['max_pool_size'] = max_pool_size
+        data['wait_ms_avg'] = (
+            round(data['wait_ms_total'] / data['checkouts'], 3) if data['checkouts'] else 0.0
+        )
+        data['wait_ms_total'] = round(data['wait_ms_total'], 3)
+        data['wait_ms_max'] = round(data['wait_ms_max'], 3)
+        return data
+
+
+pool_metrics = PoolMetrics()
+
+_registered = False
+
+
+def register():
+    """
+    Register the listener with pymongo (once). Only clients created after
+    this call report to it.
+    """
+    global _registered
+    if not _registered:
+        monitoring.register(pool_metrics)
+        _registered = True
@@ -0,0 +1,691 @@
+"""
+MongoDB query helpers used by the catalog, reviews and my_activity views.
+
+The views used to load every Car document and filter / sort in Python.
+These helpers turn the request parameters into a single aggregation
+pipeline so that MongoDB does the filtering, sorting, limiting and
+projection, and only the rows the page renders come back over the wire.
+"""
+import base64
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from bson import ObjectId, json_util
+from bson.decimal128 import Decimal128
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Car, Order, Offer, Review, Appointment
+
+
+# How many cars one catalog page renders.
+CAR_LIST_PAGE_SIZE = 24
+
+# car_list.html only shows `description|truncatechars:110`, so there is no
+# point in shipping the whole text. One extra character keeps the "…" logic
+# of truncatechars working exactly as before.
+CARD_DESCRIPTION_LENGTH = 111
+
+# ?sort=... -> MongoDB sort spec. `_id` is always the last key so that cars
+# with the same price / year come back in a stable order. Every spec is
+# car_price_idx or car_year_price_idx walked forwards or backwards, so
+# MongoDB never has to sort in memory.
+CAR_SORTS = {
+    'price_asc': [('price', 1), ('_id', 1)],
+    'price_desc': [('price', -1), ('_id', -1)],
+    'year_new': [('year', -1), ('price', 1), ('_id', 1)],
+    'year_old': [('year', 1), ('price', -1), ('_id', -1)],
+    # default: newest year first, then cheaper price
+    '': [('year', -1), ('price', 1), ('_id', 1)],
+}
+
+
+def to_float(value):
+    """
+    Convert price to float safely.
+    Handles Decimal, Decimal128, int, '28900', '28,900', '$28900.00', etc.
+    Returns None if it cannot be parsed.
+    """
+    if value is None:
+        return None
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    try:
+        s = str(value)
+        s = s.replace(',', '').replace('$', '').strip()
+        if s == '':
+            return None
+        return float(s)
+    except (ValueError, TypeError):
+        return None
+
+
+def to_decimal(value):
+    """
+    Same idea as to_float(), but returns a Decimal (or None) so the value
+    can be compared against the Decimal128 prices stored by djongo.
+    """
+    f = to_float(value)
+    if f is None:
+        return None
+    try:
+        return Decimal(str(f))
+    except InvalidOperation:
+        return None
+
+
+def parse_car_filters(params):
+    """
+    Read the catalog filters from request.GET.
+
+    Invalid numbers are ignored (treated as "no filter"), the same way the
+    old Python implementation ignored them.
+    """
+    search = (params.get('search') or '').strip()
+
+    min_price = to_decimal((params.get('min_price') or '').strip())
+    max_price = to_decimal((params.get('max_price') or '').strip())
+
+    year = None
+    year_raw = (params.get('year') or '').strip()
+    if year_raw:
+        try:
+            year = int(year_raw)
+        except ValueError:
+            # ignore invalid year input
+            pass
+
+    sort = (params.get('sort') or '').strip()
+    if sort not in CAR_SORTS:
+        sort = ''
+
+    return {
+        'search': search,
+        'min_price': min_price,
+        'max_price': max_price,
+        'year': year,
+        'sort': sort,
+    }
+
+
+def car_match(filters):
+    """
+    Build the $match stage for the given filters.
+    """
+    match = {}
+
+    # ---------- SEARCH (make or model, case-insensitive substring) ----------
+    if filters['search']:
+        pattern = re.escape(filters['search'])
+        match['$or'] = [
+            {'make': {'$regex': pattern, '$options': 'i'}},
+            {'model': {'$regex': pattern, '$options': 'i'}},
+        ]
+
+    # ---------- PRICE RANGE ----------
+    price = {}
+    if filters['min_price'] is not None:
+        price['$gte'] = Decimal128(filters['min_price'])
+    if filters['max_price'] is not None:
+        price['$lte'] = Decimal128(filters['max_price'])
+    if price:
+        match['price'] = price
+
+    # ---------- YEAR ----------
+    if filters['year'] is not None:
+        match['year'] = filters['year']
+
+    return match
+
+
+# Car fields describing the resized copies of the image (cars/images.py)
+IMAGE_FIELDS = ('image_source', 'image_key', 'image_width', 'image_height', 'image_widths')
+
+
+def car_card_projection():
+    """
+    Only the fields a car card renders.
+    """
+    return {
+        '_id': 1,
+        'make': 1,
+        'model': 1,
+        'year': 1,
+        'price': 1,
+        'image_url': 1,
+        **{field: 1 for field in IMAGE_FIELDS},
+        'description': {
+            '$substrCP': [
+                {'$ifNull': ['$description', '']},
+                0,
+                CARD_DESCRIPTION_LENGTH,
+            ]
+        },
+    }
+
+
+# ---------- keyset (cursor) pagination ----------
+#
+# A cursor holds the sort values of the last row of the previous page.
+# The next page is "everything that sorts after that row", which MongoDB
+# answers with an index seek instead of skipping N documents, so page 500
+# costs the same as page 1.
+
+def encode_cursor(doc, fields):
+    """
+    Build an opaque, URL-safe cursor from the given fields of a raw document.
+    json_util keeps the BSON types (ObjectId, Decimal128, datetime).
+    """
+    raw = json_util.dumps([doc.get(f) for f in fields]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+# The types a cursor value may have, per sort field. Cursors come from
+# the query string and their values go straight into $match, so anything
+# else (an operator document like {"$ne": null}, a list, a regex) is
+# refused.
+CURSOR_TYPES = {
+    'price': (Decimal128, int, float),
+    'year': (int,),
+    'rating': (int,),
+    'created_at': (datetime,),
+    '_id': (ObjectId,),
+}
+
+# fields without an entry above still only take plain values
+CURSOR_SCALAR_TYPES = (str, int, float, Decimal128, datetime, ObjectId)
+
+
+def valid_cursor_value(field, value):
+    if value is None:
+        # the row had no such field; it sorts (and matches) as null
+        return True
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, CURSOR_TYPES.get(field, CURSOR_SCALAR_TYPES))
+
+
+def decode_cursor(value, fields):
+    """
+    Read a cursor made by encode_cursor().
+    Returns a dict of sort values, or None if the cursor is missing/invalid
+    (which simply means "first page").
+    """
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        values = json_util.loads(raw)
+    except Exception:
+        # json_util raises whatever the crafted value trips over
+        # (InvalidId, IndexError, decimal.InvalidOperation, ...)
+        return None
+    if not isinstance(values, list) or len(values) != len(fields):
+        return None
+    if not all(valid_cursor_value(f, v) for f, v in zip(fields, values)):
+        return None
+    return dict(zip(fields, values))
+
+
+def reverse_sort(sort_spec):
+    return [(field, -direction) for field, direction in sort_spec]
+
+
+def _sorts_after(field, direction, value):
+    """
+    The condition "`field` sorts strictly after `value`", or None when
+    nothing can. A missing or null field sorts before every value, as in
+    MongoDB's own sort, but $gt / $lt never match it (nor anything when
+    `value` is null), so those cases are spelled out.
+    """
+    if direction == 1:
+        if value is None:
+            return {field: {'$ne': None}}
+        return {field: {'$gt': value}}
+    if value is None:
+        return None
+    return {'$or': [{field: {'$lt': value}}, {field: None}]}
+
+
+def keyset_match(sort_spec, after):
+    """
+    Match every document that sorts strictly after `after` for the given
+    sort spec. For [(a, 1), (b, -1)] this is:
+        a > A  or  (a == A and b < B)
+    Rows with a missing or null sort field (a car without a price, say)
+    are kept in their place in the sort; see _sorts_after().
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort_spec):
+        condition = _sorts_after(field, direction, after[field])
+        if condition is None:
+            continue
+        branch = {f: after[f] for f, _ in sort_spec[:i]}
+        branch.update(condition)
+        branches.append(branch)
+    return {'$or': branches}
+
+
+def keyset_pipeline(match, sort_spec, projection, page_size, after=None, before=None):
+    """
+    The aggregation pipeline behind fetch_keyset_page(). Split out so the
+    async views (cars/async_views.py) can run the same query.
+    """
+    backwards = before is not None
+    spec = reverse_sort(sort_spec) if backwards else sort_spec
+    anchor = before if backwards else after
+
+    conditions = []
+    if match:
+        conditions.append(match)
+    if anchor is not None:
+        conditions.append(keyset_match(spec, anchor))
+
+    pipeline = []
+    if len(conditions) == 1:
+        pipeline.append({'$match': conditions[0]})
+    elif conditions:
+        pipeline.append({'$match': {'$and': conditions}})
+    pipeline.append({'$sort': dict(spec)})
+    pipeline.append({'$limit': page_size + 1})
+    pipeline.append({'$project': projection})
+    return pipeline
+
+
+def keyset_result(docs, cursor_fields, page_size, after=None, before=None):
+    """
+    Turn the rows of keyset_pipeline() into (docs, next_cursor, prev_cursor).
+    """
+    backwards = before is not None
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+
+    if backwards:
+        docs.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, after is not None
+
+    next_cursor = prev_cursor = None
+    if docs and has_next:
+        next_cursor = encode_cursor(docs[-1], cursor_fields)
+    if docs and has_previous:
+        prev_cursor = encode_cursor(docs[0], cursor_fields)
+    return docs, next_cursor, prev_cursor
+
+
+def fetch_keyset_page(manager, match, sort_spec, projection, cursor_fields,
+                      page_size, after=None, before=None):
+    """
+    Run one keyset-paginated aggregation.
+
+    `after` / `before` are decoded cursors. Going backwards runs the same
+    query with the sort reversed and flips the rows afterwards.
+    Returns (docs, next_cursor, prev_cursor); a cursor is None when there
+    is no page in that direction. One extra row is fetched to know whether
+    another page exists, so no count() is needed.
+    """
+    pipeline = keyset_pipeline(match, sort_spec, projection, page_size, after, before)
+    docs = list(manager.mongo_aggregate(pipeline))
+    return keyset_result(docs, cursor_fields, page_size, after, before)
+
+
+CAR_CURSOR_FIELDS = ('price', 'year', '_id')
+
+
+def decode_car_cursor(value):
+    return decode_cursor(value, CAR_CURSOR_FIELDS)
+
+
+def aware(value):
+    """
+    djongo stores datetimes as naive UTC; the ORM makes them aware again
+    when USE_TZ is on. Do the same for raw documents.
+    """
+    if value is not None and settings.USE_TZ and timezone.is_naive(value):
+        return timezone.make_aware(value, timezone.utc)
+    return value
+
+
+def car_from_doc(doc):
+    """
+    Turn a raw (projected) document back into an unsaved Car instance so
+    templates can keep using car.mongo_id, car.make, etc.
+    """
+    price = doc.get('price')
+    if isinstance(price, Decimal128):
+        price = price.to_decimal()
+
+    return Car(
+        _id=doc.get('_id'),
+        make=doc.get('make', ''),
+        model=doc.get('model', ''),
+        year=doc.get('year'),
+        price=price,
+        description=doc.get('description', ''),
+        image_url=doc.get('image_url', ''),
+        image_source=doc.get('image_source', ''),
+        image_key=doc.get('image_key', ''),
+        image_width=doc.get('image_width'),
+        image_height=doc.get('image_height'),
+        image_widths=doc.get('image_widths', ''),
+    )
+
+
+def car_page_pipeline(filters, after=None, page_size=CAR_LIST_PAGE_SIZE):
+    """
+    Aggregation pipeline for one catalog page (see fetch_car_page).
+    """
+    return keyset_pipeline(
+        car_match(filters),
+        CAR_SORTS[filters['sort']],
+        car_card_projection(),
+        page_size,
+        after=after,
+    )
+
+
+def car_page_from_docs(docs, after=None, page_size=CAR_LIST_PAGE_SIZE):
+    """
+    (cars, next_cursor) from the rows of car_page_pipeline().
+    """
+    docs, next_cursor, _ = keyset_result(docs, CAR_CURSOR_FIELDS, page_size, after=after)
+    return [car_from_doc(doc) for doc in docs], next_cursor
+
+
+class CarPageStream:
+    """
+    One catalog page read lazily: iterating yields lists of up to
+    chunk_size Car instances as they come off the aggregation cursor, so
+    only one chunk is in memory at a time. Once iteration is finished,
+    `count` and `next_cursor` describe the page, as fetch_car_page() would.
+    """
+    def __init__(self, filters, after=None, page_size=CAR_LIST_PAGE_SIZE,
+                 chunk_size=CAR_LIST_PAGE_SIZE):
+        self.filters = filters
+        self.after = after
+        self.page_size = page_size
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.next_cursor = None
+
+    def __iter__(self):
+        cursor = Car.objects.mongo_aggregate(
+            car_page_pipeline(self.filters, self.after, self.page_size),
+            batchSize=self.chunk_size,
+        )
+        chunk = []
+        last = None
+        try:
+            for doc in cursor:
+                if self.count == self.page_size:
+                    # the extra row of the pipeline: there is a next page
+                    self.next_cursor = encode_cursor(last, CAR_CURSOR_FIELDS)
+                    break
+                self.count += 1
+                last = doc
+                chunk.append(car_from_doc(doc))
+                if len(chunk) == self.chunk_size:
+                    yield chunk
+                    chunk = []
+        finally:
+            cursor.close()
+        if chunk:
+            yield chunk
+
+
+def fetch_car_page(filters, after=None, page_size=CAR_LIST_PAGE_SIZE):
+    """
+    Run the catalog query (filter + keyset page + sort + projection) for
+    one page, starting after the given cursor.
+
+    Returns (cars, next_cursor); next_cursor is None on the last page.
+    """
+    docs = list(Car.objects.mongo_aggregate(car_page_pipeline(filters, after, page_size)))
+    return car_page_from_docs(docs, after, page_size)
+
+
+# ---------- reviews ----------
+
+REVIEW_PAGE_SIZE = 6
+
+# ?rating=... -> $match
+REVIEW_RATING_FILTERS = {
+    'all': {},
+    '5': {'rating': 5},
+    '4plus': {'rating': {'$gte': 4}},
+    '3plus': {'rating': {'$gte': 3}},
+}
+
+# ?sort=... -> MongoDB sort spec, each one backed by a Review index.
+REVIEW_SORTS = {
+    'newest': [('created_at', -1), ('_id', -1)],
+    'oldest': [('created_at', 1), ('_id', 1)],
+    'rating_high': [('rating', -1), ('created_at', -1), ('_id', -1)],
+    'rating_low': [('rating', 1), ('created_at', -1), ('_id', -1)],
+}
+
+REVIEW_CURSOR_FIELDS = ('rating', 'created_at', '_id')
+
+REVIEW_PROJECTION = {
+    '_id': 1,
+    'full_name': 1,
+    'rating': 1,
+    'comment': 1,
+    'created_at': 1,
+}
+
+
+def decode_review_cursor(value):
+    return decode_cursor(value, REVIEW_CURSOR_FIELDS)
+
+
+def review_from_doc(doc):
+    """
+    Turn a raw (projected) review document into an unsaved Review instance.
+    """
+    return Review(
+        _id=doc.get('_id'),
+        full_name=doc.get('full_name', ''),
+        rating=doc.get('rating'),
+        comment=doc.get('comment', ''),
+        created_at=aware(doc.get('created_at')),
+    )
+
+
+def review_page_pipeline(rating_filter, sort, after=None, before=None,
+                         page_size=REVIEW_PAGE_SIZE):
+    """
+    Aggregation pipeline for one page of reviews (see fetch_review_page).
+    """
+    return keyset_pipeline(
+        REVIEW_RATING_FILTERS[rating_filter],
+        REVIEW_SORTS[sort],
+        REVIEW_PROJECTION,
+        page_size,
+        after=after,
+        before=before,
+    )
+
+
+def review_page_from_docs(docs, after=None, before=None, page_size=REVIEW_PAGE_SIZE):
+    """
+    (reviews, next_cursor, prev_cursor) from the rows of review_page_pipeline().
+    """
+    docs, next_cursor, prev_cursor = keyset_result(
+        docs, REVIEW_CURSOR_FIELDS, page_size, after, before
+    )
+    return [review_from_doc(doc) for doc in docs], next_cursor, prev_cursor
+
+
+def fetch_review_page(rating_filter, sort, after=None, before=None,
+                      page_size=REVIEW_PAGE_SIZE):
+    """
+    One page of reviews for reviews_page.
+    Returns (reviews, next_cursor, prev_cursor).
+    """
+    pipeline = review_page_pipeline(rating_filter, sort, after, before, page_size)
+    docs = list(Review.objects.mongo_aggregate(pipeline))
+    return review_page_from_docs(docs, after, before, page_size)
+
+
+# ---------- my_activity ----------
+
+# How many rows each my_activity section shows at first, and the most it
+# will ever show ("show more" adds ACTIVITY_SECTION_SIZE each time).
+ACTIVITY_SECTION_SIZE = 10
+ACTIVITY_MAX_SECTION_SIZE = 200
+
+CAR_LABEL_PROJECTION = {'make': 1, 'model': 1, 'year': 1}
+
+# section -> (model, sort spec, fields to return, join the car?)
+ACTIVITY_SECTIONS = {
+    'orders': (
+        Order,
+        [('created_at', -1), ('_id', -1)],
+        ['car_id', 'status', 'created_at'],
+        True,
+    ),
+    'offers': (
+        Offer,
+        [('created_at', -1), ('_id', -1)],
+        ['car_id', 'amount', 'status', 'created_at'],
+        True,
+    ),
+    'appointments': (
+        Appointment,
+        [('preferred_date', -1), ('_id', -1)],
+        ['car_interest', 'preferred_date', 'preferred_time', 'status'],
+        False,
+    ),
+    'reviews': (
+        Review,
+        [('created_at', -1), ('_id', -1)],
+        ['full_name', 'rating', 'comment', 'created_at'],
+        False,
+    ),
+}
+
+
+def activity_section_pipeline(section, user_id, limit):
+    """
+    Pipeline for one section: the user's newest rows (index-backed), one
+    extra row to detect "show more", and the car label joined in with
+    $lookup for orders and offers.
+    """
+    model, sort_spec, fields, join_car = ACTIVITY_SECTIONS[section]
+
+    projection = {'_id': 1, 'section': {'$literal': section}}
+    projection.update({f: 1 for f in fields})
+
+    pipeline = [
+        {'$match': {'user_id': user_id}},
+        {'$sort': dict(sort_spec)},
+        {'$limit': limit + 1},
+    ]
+    if join_car:
+        pipeline += [
+            {'$lookup': {
+                'from': Car._meta.db_table,
+                'localField': 'car_id',
+                'foreignField': '_id',
+                'as': 'car',
+            }},
+            {'$addFields': {'car': {'$arrayElemAt': ['$car', 0]}}},
+        ]
+        projection.update({f'car.{f}': 1 for f in CAR_LABEL_PROJECTION})
+        projection['car._id'] = 1
+    pipeline.append({'$project': projection})
+    return pipeline
+
+
+def activity_row_from_doc(section, doc):
+    """
+    Turn one raw row into the model instance the template expects.
+    """
+    if section in ('orders', 'offers'):
+        car_doc = doc.get('car') or {}
+        car = Car(
+            _id=car_doc.get('_id'),
+            make=car_doc.get('make', ''),
+            model=car_doc.get('model', ''),
+            year=car_doc.get('year'),
+        )
+        if section == 'orders':
+            row = Order(_id=doc['_id'], status=doc.get('status'),
+                        created_at=aware(doc.get('created_at')))
+        else:
+            amount = doc.get('amount')
+            if isinstance(amount, Decimal128):
+                amount = amount.to_decimal()
+            row = Offer(_id=doc['_id'], amount=amount, status=doc.get('status'),
+                        created_at=aware(doc.get('created_at')))
+        # fills the FK cache, so row.car does not trigger a query
+        row.car = car
+        return row
+
+    if section == 'appointments':
+        preferred_date = doc.get('preferred_date')
+        if hasattr(preferred_date, 'date'):
+            preferred_date = preferred_date.date()
+        return Appointment(
+            _id=doc['_id'],
+            car_interest=doc.get('car_interest', ''),
+            preferred_date=preferred_date,
+            preferred_time=doc.get('preferred_time'),
+            status=doc.get('status'),
+        )
+
+    return review_from_doc(doc)
+
+
+def fetch_user_activity(user, limits):
+    """
+    Everything my_activity shows, in ONE aggregation: the orders pipeline
+    with the offers, appointments and reviews pipelines appended through
+    $unionWith (MongoDB 4.4+).
+
+    `limits` maps section -> max rows. Returns
+    {section: {'rows': [...], 'has_more': bool, 'limit': int}}.
+    """
+    sections = list(ACTIVITY_SECTIONS)
+    first, rest = sections[0], sections[1:]
+
+    pipeline = activity_section_pipeline(first, user.pk, limits[first])
+    for section in rest:
+        model = ACTIVITY_SECTIONS[section][0]
+        pipeline.append({'$unionWith': {
+            'coll': model._meta.db_table,
+            'pipeline': activity_section_pipeline(section, user.pk, limits[section]),
+        }})
+
+    first_model = ACTIVITY_SECTIONS[first][0]
+    grouped = {section: [] for section in sections}
+    for doc in first_model.objects.mongo_aggregate(pipeline):
+        grouped[doc['section']].append(doc)
+
+    activity = {}
+    for section, docs in grouped.items():
+        limit = limits[section]
+        activity[section] = {
+            'rows': [activity_row_from_doc(section, doc) for doc in docs[:limit]],
+            'has_more': len(docs) > limit,
+            'limit': limit,
+        }
+    return activity
+
+
+def parse_activity_limits(params):
+    """
+    Per-section row limits from ?orders=20&reviews=30..., clamped to
+    [ACTIVITY_SECTION_SIZE, ACTIVITY_MAX_SECTION_SIZE].
+    """
+    limits = {}
+    for section in ACTIVITY_SECTIONS:
+        try:
+            limit = int(params.get(section) or ACTIVITY_SECTION_SIZE)
+        except ValueError:
+            limit = ACTIVITY_SECTION_SIZE
+        limits[section] = min(max(limit, ACTIVITY_SECTION_SIZE), ACTIVITY_MAX_SECTION_SIZE)
+    return limits
@@ -0,0 +1,333 @@
+"""
+Precomputed "similar cars" for car_detail.
+
+For every car we store the ids of its RECOMMENDATION_COUNT nearest
+neighbours in a SimilarCars document, so the detail page can show
+relevant cars with one indexed lookup instead of six arbitrary ones.
+
+Distance between two cars (smaller = more similar):
+
+    MAKE_WEIGHT   if the makes differ
+  + MODEL_WEIGHT  if the models differ
+  + |ln(price_a) - ln(price_b)| / PRICE_SCALE
+  + |year_a - year_b| / YEAR_SCALE
+
+Comparing every car with every other car is O(n^2), which does not work
+for a large catalog. Instead each car is only compared with the
+CANDIDATE_WINDOW cars on either side of it in two sorted orders:
+(make, price) and price alone. Near neighbours by this distance are
+almost always in one of those windows, and the work is O(n * window),
+done with vectorized numpy array math in chunks of rows.
+
+build_all()  recomputes every car (manage.py build_recommendations).
+refresh_car() recomputes one car and the cars around it; the Car
+save/delete signals queue it as the refresh_similar job (cars/tasks.py),
+so a save does not wait for it.
+"""
+import time
+
+import numpy as np
+from bson.decimal128 import Decimal128
+from django.utils import timezone
+from pymongo import ReplaceOne
+
+from .models import Car, SimilarCars
+from .queries import IMAGE_FIELDS, car_from_doc
+
+
+RECOMMENDATION_COUNT = 6
+
+MAKE_WEIGHT = 2.0
+MODEL_WEIGHT = 1.0
+# a 25% price difference costs 1
+PRICE_SCALE = 0.25
+# a 2 year difference costs 1
+YEAR_SCALE = 2.0
+
+CANDIDATE_WINDOW = 32
+
+# Rows per vectorized chunk (bounds memory to ~CHUNK_SIZE * 4 * window).
+CHUNK_SIZE = 20000
+
+WRITE_BATCH_SIZE = 1000
+
+
+def _price(value):
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _features(makes, models, prices, years):
+    """
+    Turn raw columns into the numeric arrays the distance works on.
+    Model codes are per (make, model) so that two makes' "Model S" differ.
+    """
+    makes = np.asarray(makes, dtype=object)
+    make_models = np.array(
+        [f"{make}\x00{model}" for make, model in zip(makes, models)], dtype=object
+    )
+    _, make_codes = np.unique(makes, return_inverse=True)
+    _, model_codes = np.unique(make_models, return_inverse=True)
+    log_price = np.log1p(np.maximum(np.asarray(prices, dtype=np.float64), 0.0))
+    years = np.asarray(years, dtype=np.float64)
+    return make_codes, model_codes, log_price, years
+
+
+def _distances(rows, cand, make_codes, model_codes, log_price, years):
+    """
+    Distance from each car in `rows` (shape n) to each of its candidates
+    (shape n x c). Candidates < 0 are padding and get an infinite distance.
+    """
+    valid = cand >= 0
+    c = np.where(valid, cand, 0)
+    r = rows[:, None]
+
+    d = MAKE_WEIGHT * (make_codes[c] != make_codes[r])
+    d = d + MODEL_WEIGHT * (model_codes[c] != model_codes[r])
+    d = d + np.abs(log_price[c] - log_price[r]) / PRICE_SCALE
+    d = d + np.abs(years[c] - years[r]) / YEAR_SCALE
+    d[~valid | (c == r)] = np.inf
+    return d
+
+
+def nearest_neighbours(makes, models, prices, years, k=RECOMMENDATION_COUNT,
+                       window=CANDIDATE_WINDOW):
+    """
+    Approximate k nearest neighbours for every car.
+
+    Takes plain columns (same length n) and returns an (n, k) int array
+    of row indexes, closest first; -1 where a car has fewer than k
+    candidates (tiny catalogs).
+    """
+    n = len(makes)
+    result = np.full((n, k), -1, dtype=np.int64)
+    if n < 2:
+        return result
+
+    make_codes, model_codes, log_price, years = _features(makes, models, prices, years)
+
+    # The two sorted orders and each row's position in them
+    orders = [
+        np.lexsort((log_price, make_codes)),
+        np.argsort(log_price, kind='stable'),
+    ]
+    positions = []
+    for order in orders:
+        pos = np.empty(n, dtype=np.int64)
+        pos[order] = np.arange(n)
+        positions.append(pos)
+
+    offsets = np.concatenate([np.arange(-window, 0), np.arange(1, window + 1)])
+
+    for start in range(0, n, CHUNK_SIZE):
+        rows = np.arange(start, min(start + CHUNK_SIZE, n))
+
+        # ---------- candidates from both windows ----------
+        parts = []
+        for order, pos in zip(orders, positions):
+            idx = pos[rows][:, None] + offsets[None, :]
+            inside = (idx >= 0) & (idx < n)
+            parts.append(np.where(inside, order[np.clip(idx, 0, n - 1)], -1))
+        cand = np.sort(np.concatenate(parts, axis=1), axis=1)
+
+        # a car can be in both windows: keep it once
+        duplicate = np.zeros_like(cand, dtype=bool)
+        duplicate[:, 1:] = cand[:, 1:] == cand[:, :-1]
+        cand[duplicate] = -1
+
+        # ---------- distances + top k ----------
+        d = _distances(rows, cand, make_codes, model_codes, log_price, years)
+        kk = min(k, d.shape[1])
+        top = np.argpartition(d, kk - 1, axis=1)[:, :kk]
+        top_d = np.take_along_axis(d, top, axis=1)
+        order_in_top = np.argsort(top_d, axis=1, kind='stable')
+        top = np.take_along_axis(top, order_in_top, axis=1)
+        top_d = np.take_along_axis(top_d, order_in_top, axis=1)
+
+        picked = np.take_along_axis(cand, top, axis=1)
+        picked[np.isinf(top_d)] = -1
+        result[rows, :kk] = picked
+
+    return result
+
+
+# ---------- storage ----------
+
+def _similar_doc(car_id, similar_ids):
+    return {'car_id': car_id, 'similar': list(similar_ids), 'updated_at': timezone.now()}
+
+
+def build_all(stdout=None):
+    """
+    Recompute the neighbours of every car and replace all SimilarCars
+    documents. Returns the number of cars processed.
+    """
+    started = time.perf_counter()
+    ids, makes, models, prices, years = [], [], [], [], []
+    for doc in Car.objects.mongo_find({}, {'make': 1, 'model': 1, 'price': 1, 'year': 1}):
+        ids.append(doc['_id'])
+        makes.append(doc.get('make') or '')
+        models.append(doc.get('model') or '')
+        prices.append(_price(doc.get('price')))
+        years.append(doc.get('year') or 0)
+    loaded = time.perf_counter()
+
+    neighbours = nearest_neighbours(makes, models, prices, years)
+    computed = time.perf_counter()
+
+    batch = []
+    for i, row in enumerate(neighbours):
+        similar = [ids[j] for j in row if j >= 0]
+        batch.append(ReplaceOne({'car_id': ids[i]}, _similar_doc(ids[i], similar), upsert=True))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            SimilarCars.objects.mongo_bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        SimilarCars.objects.mongo_bulk_write(batch, ordered=False)
+
+    # documents of cars that no longer exist (deleted outside the ORM)
+    current = set(ids)
+    stale = [
+        doc['_id']
+        for doc in SimilarCars.objects.mongo_find({}, {'car_id': 1})
+        if doc.get('car_id') not in current
+    ]
+    for start in range(0, len(stale), WRITE_BATCH_SIZE):
+        SimilarCars.objects.mongo_delete_many({'_id': {'$in': stale[start:start + WRITE_BATCH_SIZE]}})
+    written = time.perf_counter()
+
+    if stdout is not None:
+        stdout.write(
+            f"{len(ids)} cars: load {loaded - started:.2f}s, "
+            f"compute {computed - loaded:.2f}s, write {written - computed:.2f}s"
+        )
+    return len(ids)
+
+
+def _candidate_docs(make, price, window=CANDIDATE_WINDOW):
+    """
+    Live version of the two sorted windows around one car, read with
+    four small index-backed queries (car_make_price_idx, car_price_idx).
+    """
+    fields = {'make': 1, 'model': 1, 'price': 1, 'year': 1}
+    price = Decimal128(str(price))
+    queries = [
+        ({'make': make, 'price': {'$gte': price}}, 1),
+        ({'make': make, 'price': {'$lt': price}}, -1),
+        ({'price': {'$gte': price}}, 1),
+        ({'price': {'$lt': price}}, -1),
+    ]
+    docs = {}
+    for query, direction in queries:
+        for doc in Car.objects.mongo_find(query, fields).sort('price', direction).limit(window + 1):
+            docs[doc['_id']] = doc
+    return list(docs.values())
+
+
+def _refresh_one(car_doc):
+    candidates = [d for d in _candidate_docs(car_doc.get('make') or '', _price(car_doc.get('price')))
+                  if d['_id'] != car_doc['_id']]
+    docs = [car_doc] + candidates
+
+    make_codes, model_codes, log_price, years = _features(
+        [d.get('make') or '' for d in docs],
+        [d.get('model') or '' for d in docs],
+        [_price(d.get('price')) for d in docs],
+        [d.get('year') or 0 for d in docs],
+    )
+    cand = np.arange(1, len(docs))[None, :]
+    d = _distances(np.array([0]), cand, make_codes, model_codes, log_price, years)[0]
+    best = np.argsort(d, kind='stable')[:RECOMMENDATION_COUNT]
+    similar = [docs[cand[0, i]]['_id'] for i in best if np.isfinite(d[i])]
+
+    SimilarCars.objects.mongo_replace_one(
+        {'car_id': car_doc['_id']}, _similar_doc(car_doc['_id'], similar), upsert=True
+    )
+    return similar
+
+
+def refresh_car(car_id, deleted=False):
+    """
+    Incremental update after a car was saved or deleted:
+      - recompute the car itself (unless deleted),
+      - recompute the cars that listed it before (its price/make may have
+        moved it out of their neighbourhood, or it is gone),
+      - recompute its new neighbours, which may now want to list it.
+    """
+    affected = {
+        doc['car_id']
+        for doc in SimilarCars.objects.mongo_find({'similar': car_id}, {'car_id': 1})
+    }
+
+    if deleted:
+        SimilarCars.objects.mongo_delete_one({'car_id': car_id})
+    else:
+        car_doc = Car.objects.mongo_find_one(
+            {'_id': car_id}, {'make': 1, 'model': 1, 'price': 1, 'year': 1}
+        )
+        if car_doc is not None:
+            affected.update(_refresh_one(car_doc))
+
+    affected.discard(car_id)
+    if affected:
+        for doc in Car.objects.mongo_find(
+            {'_id': {'$in': list(affected)}},
+            {'make': 1, 'model': 1, 'price': 1, 'year': 1},
+        ):
+            _refresh_one(doc)
+
+
+def similar_cars_pipeline(car_id):
+    return [
+        {'$match': {'car_id': car_id}},
+        {'$limit': 1},
+        {'$lookup': {
+            'from': Car._meta.db_table,
+            'localField': 'similar',
+            'foreignField': '_id',
+            'as': 'cars',
+        }},
+        {'$project': {
+            'similar': 1,
+            'updated_at': 1,
+            'cars': {
+                '_id': 1, 'make': 1, 'model': 1, 'year': 1, 'price': 1, 'image_url': 1,
+                **{field: 1 for field in IMAGE_FIELDS},
+            },
+        }},
+    ]
+
+
+def similar_cars_from_docs(docs):
+    """
+    Car instances, closest first, from the rows of similar_cars_pipeline().
+    """
+    if not docs:
+        return None
+
+    # $lookup does not keep the order of `similar`
+    by_id = {car['_id']: car for car in docs[0]['cars']}
+    return [car_from_doc(by_id[i]) for i in docs[0]['similar'] if i in by_id]
+
+
+def similar_cars_changed(docs):
+    """
+    When the rows of similar_cars_pipeline() were computed, or None. Part
+    of the similar_cars fragment key on car_detail: build_all() and
+    refresh_car() rewrite the lists without bumping the "car" version.
+    """
+    return docs[0].get('updated_at') if docs else None
+
+
+def similar_cars(car_id):
+    """
+    The stored neighbours of a car as unsaved Car instances, closest first,
+    in one aggregation (SimilarCars by car_id + $lookup of the cards).
+    Returns None when nothing has been computed for this car yet.
+    """
+    docs = list(SimilarCars.objects.mongo_aggregate(similar_cars_pipeline(car_id)))
+    return similar_cars_from_docs(docs)
@@ -0,0 +1,185 @@
+"""
+Precomputed review statistics (a small read model for the reviews).
+
+One ReviewStats document holds:
+  count       - number of reviews
+  rating_sum  - sum of all ratings (average = rating_sum / count)
+  histogram   - {"1": n, ..., "5": n}
+  latest      - the LATEST_REVIEWS_SIZE newest reviews, newest first
+
+It is updated incrementally by the Review signals in cars/signals.py
+(create, edit through edit_review, delete through delete_review), so the
+reviews and home pages never have to scan the Review collection.
+`manage.py rebuild_review_stats` recomputes it from scratch.
+"""
+from .models import Review, ReviewStats
+from .mongo import get_collection
+from .queries import review_from_doc
+
+
+STATS_NAME = 'reviews'
+
+# How many reviews the "latest" feed keeps.
+LATEST_REVIEWS_SIZE = 8
+
+# The feed is shown with `comment|truncatechars:120`.
+LATEST_COMMENT_LENGTH = 121
+
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def _summary(review):
+    """
+    The part of a review stored in the latest feed.
+    """
+    return {
+        '_id': review._id,
+        'full_name': review.full_name,
+        'rating': review.rating,
+        'comment': (review.comment or '')[:LATEST_COMMENT_LENGTH],
+        'created_at': review.created_at,
+    }
+
+
+def _update(update):
+    ReviewStats.objects.mongo_update_one({'name': STATS_NAME}, update, upsert=True)
+
+
+def review_created(review):
+    _update({
+        '$inc': {
+            'count': 1,
+            'rating_sum': review.rating,
+            f'histogram.{review.rating}': 1,
+        },
+        '$push': {
+            'latest': {
+                '$each': [_summary(review)],
+                '$sort': {'created_at': -1, '_id': -1},
+                '$slice': LATEST_REVIEWS_SIZE,
+            }
+        },
+    })
+
+
+def review_changed(review, old_rating):
+    """
+    An existing review was edited (rating and/or text).
+    """
+    if old_rating is not None and old_rating != review.rating:
+        _update({
+            '$inc': {
+                'rating_sum': review.rating - old_rating,
+                f'histogram.{old_rating}': -1,
+                f'histogram.{review.rating}': 1,
+            },
+        })
+
+    # Refresh the copy in the latest feed; matches nothing if it is not there
+    ReviewStats.objects.mongo_update_one(
+        {'name': STATS_NAME, 'latest._id': review._id},
+        {'$set': {
+            'latest.$.full_name': review.full_name,
+            'latest.$.rating': review.rating,
+            'latest.$.comment': (review.comment or '')[:LATEST_COMMENT_LENGTH],
+        }},
+    )
+
+
+def review_deleted(review):
+    stats = get_collection(ReviewStats).find_one_and_update(
+        {'name': STATS_NAME},
+        {
+            '$inc': {
+                'count': -1,
+                'rating_sum': -review.rating,
+                f'histogram.{review.rating}': -1,
+            },
+            '$pull': {'latest': {'_id': review._id}},
+        },
+        projection={'latest._id': 1},
+    )
+
+    # If the deleted review was in the feed, refill it with one indexed query
+    if stats and any(e.get('_id') == review._id for e in stats.get('latest', [])):
+        _update({'$set': {'latest': _latest_from_collection()}})
+
+
+def _latest_from_collection(review_model=Review):
+    docs = get_collection(review_model).find(
+        {},
+        {'full_name': 1, 'rating': 1, 'comment': 1, 'created_at': 1},
+    ).sort([('created_at', -1), ('_id', -1)]).limit(LATEST_REVIEWS_SIZE)
+    return [
+        {
+            '_id': doc['_id'],
+            'full_name': doc.get('full_name', ''),
+            'rating': doc.get('rating'),
+            'comment': (doc.get('comment') or '')[:LATEST_COMMENT_LENGTH],
+            'created_at': doc.get('created_at'),
+        }
+        for doc in docs
+    ]
+
+
+def rebuild(stats_model=ReviewStats, review_model=Review):
+    """
+    Recompute the whole document with one aggregation plus one indexed
+    query for the feed. Returns the new document.
+
+    The model arguments let migrations pass their historical models.
+    """
+    histogram = {str(r): 0 for r in RATINGS}
+    count = rating_sum = 0
+    for row in get_collection(review_model).aggregate([
+        {'$group': {'_id': '$rating', 'n': {'$sum': 1}}},
+    ]):
+        if row['_id'] is None:
+            continue
+        histogram[str(row['_id'])] = row['n']
+        count += row['n']
+        rating_sum += row['_id'] * row['n']
+
+    doc = {
+        'name': STATS_NAME,
+        'count': count,
+        'rating_sum': rating_sum,
+        'histogram': histogram,
+        'latest': _latest_from_collection(review_model),
+    }
+    get_collection(stats_model).replace_one({'name': STATS_NAME}, doc, upsert=True)
+    return doc
+
+
+def get_review_stats():
+    """
+    Read the stats document (one indexed lookup) in a template-friendly form:
+      count, average, histogram {1: n, ...},
+      filter_counts {'all', '5', '4plus', '3plus'} matching reviews_page,
+      latest [Review, ...]
+    """
+    return stats_from_doc(ReviewStats.objects.mongo_find_one({'name': STATS_NAME}))
+
+
+def stats_from_doc(doc):
+    """
+    The get_review_stats() dict for a raw stats document (or None).
+    """
+    doc = doc or {}
+    stored = doc.get('histogram') or {}
+    histogram = {r: max(stored.get(str(r), 0), 0) for r in RATINGS}
+    count = max(doc.get('count', 0), 0)
+    rating_sum = doc.get('rating_sum', 0)
+
+    return {
+        'count': count,
+        'average': round(rating_sum / count, 1) if count else None,
+        'histogram': histogram,
+        'filter_counts': {
+            'all': count,
+            '5': histogram[5],
+            '4plus': histogram[4] + histogram[5],
+            '3plus': histogram[3] + histogram[4] + histogram[5],
+        },
+        'latest': [review_from_doc(e) for e in doc.get('latest', [])],
+    }
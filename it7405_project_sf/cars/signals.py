@@ -0,0 +1,140 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from . import auth, car_stats, counters, review_stats, slots, versions
+from .jobs import enqueue
+from .models import Car, Review, Appointment, Offer, Order
+
+
+# ---------- site counters (home page) ----------
+
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Appointment)
+def count_created(sender, instance, created, raw=False, **kwargs):
+    # fixtures (raw) are followed by reconcile_counters instead
+    if created and not raw:
+        counters.increment(counters.counter_name(sender), 1)
+
+
+@receiver(post_delete, sender=Car)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Appointment)
+def count_deleted(sender, instance, **kwargs):
+    counters.increment(counters.counter_name(sender), -1)
+
+
+# ---------- review statistics ----------
+
+@receiver(post_save, sender=Review)
+def update_review_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        review_stats.review_created(instance)
+    else:
+        review_stats.review_changed(instance, getattr(instance, '_loaded_rating', None))
+    instance._loaded_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_stats(sender, instance, **kwargs):
+    review_stats.review_deleted(instance)
+
+
+# ---------- per-car offer and order figures ----------
+
+@receiver(post_save, sender=Offer)
+def update_offer_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        car_stats.offer_created(instance)
+    else:
+        car_stats.offer_changed(
+            instance,
+            getattr(instance, '_loaded_status', None),
+            getattr(instance, '_loaded_amount', None),
+        )
+    instance._loaded_status = instance.status
+    instance._loaded_amount = instance.amount
+
+
+@receiver(post_delete, sender=Offer)
+def remove_offer_stats(sender, instance, **kwargs):
+    car_stats.offer_deleted(instance)
+
+
+@receiver(post_save, sender=Order)
+def update_order_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        car_stats.order_created(instance)
+    else:
+        car_stats.order_changed(instance, getattr(instance, '_loaded_status', None))
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_stats(sender, instance, **kwargs):
+    car_stats.order_deleted(instance)
+
+
+# ---------- test-drive slot capacity ----------
+
+@receiver(pre_save, sender=Appointment)
+def reserve_appointment_slot(sender, instance, raw=False, **kwargs):
+    # raises slots.SlotFull when the slot is taken; nothing is saved then
+    if not raw:
+        slots.appointment_saving(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def release_appointment_slot(sender, instance, raw=False, **kwargs):
+    if not raw:
+        slots.appointment_saved(instance)
+
+
+@receiver(post_delete, sender=Appointment)
+def cancel_appointment_slot(sender, instance, **kwargs):
+    slots.appointment_deleted(instance)
+
+
+# ---------- similar cars (car_detail) ----------
+
+# recomputing the neighbourhood of a car takes several queries: it runs
+# on the job queue, not in the request that saved the car
+
+@receiver(post_save, sender=Car)
+def refresh_similar_cars(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enqueue('refresh_similar', car_id=str(instance._id))
+
+
+@receiver(post_delete, sender=Car)
+def remove_similar_cars(sender, instance, **kwargs):
+    enqueue('refresh_similar', car_id=str(instance._id), deleted=True)
+
+
+# ---------- model versions (template fragment cache) ----------
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def bump_car_version(sender, **kwargs):
+    versions.bump('car')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_review_version(sender, **kwargs):
+    versions.bump('review')
+
+
+# ---------- cached users (authentication) ----------
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    auth.invalidate_user(instance.pk)
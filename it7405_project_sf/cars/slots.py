@@ -0,0 +1,221 @@
+"""
+Test-drive capacity per (date, time of day).
+
+One SlotBooking document per slot that has bookings:
+  date    - the day (stored as midnight, like Appointment.preferred_date)
+  slot    - 'morning', 'afternoon' or 'evening'
+  booked  - active (pending or confirmed) appointments holding it
+
+settings.TEST_DRIVE_SLOT_CAPACITY says how many each slot takes.
+
+reserve() takes a place with ONE conditional upsert: increment `booked`
+where it is still below the capacity, or create the document. When the
+slot is full the filter matches nothing, the upsert tries to create a
+second document for the slot and the unique (date, slot) index rejects
+it, so two requests can never both take the last place.
+
+The Appointment signals in cars/signals.py call reserve() before an
+appointment is saved into a slot (SlotFull when it is full) and release()
+after it leaves one: cancelled by delete_appointment, moved or cancelled
+in the admin. month_availability() serves the appointment calendar from
+one range read on the same index. `manage.py rebuild_slot_bookings`
+recomputes every count from the appointments.
+"""
+import calendar
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .models import Appointment, SlotBooking
+from .mongo import get_collection
+
+
+SLOT_CHOICES = Appointment._meta.get_field('preferred_time').choices
+SLOTS = [value for value, _ in SLOT_CHOICES]
+
+# appointments in these states hold their slot
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+DEFAULT_CAPACITY = 4
+
+WRITE_BATCH_SIZE = 1000
+
+SLOT_FULL_MESSAGE = "This time slot is fully booked. Please choose another time or date."
+
+
+class SlotFull(Exception):
+    pass
+
+
+def slot_capacity(slot):
+    return getattr(settings, 'TEST_DRIVE_SLOT_CAPACITY', {}).get(slot, DEFAULT_CAPACITY)
+
+
+def _day(value):
+    return datetime.datetime(value.year, value.month, value.day)
+
+
+def held_slot(appointment):
+    """
+    (day, slot) the appointment holds, or None (cancelled, incomplete).
+    """
+    date = appointment.__dict__.get('preferred_date')
+    slot = appointment.__dict__.get('preferred_time')
+    if appointment.__dict__.get('status') not in ACTIVE_STATUSES or not date or slot not in SLOTS:
+        return None
+    return _day(date), slot
+
+
+# ---------- booking ----------
+
+def reserve(date, slot, force=False):
+    """
+    Take one place in (date, slot). Returns False when the slot is full;
+    force=True (staff in the admin) books it anyway.
+    """
+    capacity = slot_capacity(slot)
+    if capacity <= 0 and not force:
+        return False
+
+    key = {'date': _day(date), 'slot': slot}
+    query = key if force else dict(key, booked={'$lt': capacity})
+    # a second attempt covers two requests creating the document together
+    for _ in range(2):
+        try:
+            SlotBooking.objects.mongo_update_one(query, {'$inc': {'booked': 1}}, upsert=True)
+            return True
+        except DuplicateKeyError:
+            continue
+    return False
+
+
+def release(date, slot):
+    SlotBooking.objects.mongo_update_one(
+        {'date': _day(date), 'slot': slot, 'booked': {'$gt': 0}},
+        {'$inc': {'booked': -1}},
+    )
+
+
+def is_available(date, slot):
+    """
+    Whether (date, slot) has a free place right now (one indexed lookup).
+    Only a hint for the form; reserve() is what decides.
+    """
+    doc = SlotBooking.objects.mongo_find_one({'date': _day(date), 'slot': slot}, {'booked': 1})
+    return (doc or {}).get('booked', 0) < slot_capacity(slot)
+
+
+# ---------- appointments ----------
+
+def appointment_saving(appointment):
+    """
+    Before save: reserve the slot the appointment is moving into.
+    """
+    held = held_slot(appointment)
+    if held is None or held == getattr(appointment, '_loaded_slot', None):
+        return
+    if not reserve(*held, force=getattr(appointment, 'ignore_slot_capacity', False)):
+        raise SlotFull(SLOT_FULL_MESSAGE)
+
+
+def appointment_saved(appointment):
+    """
+    After save: release the slot it left (moved or cancelled).
+    """
+    held = held_slot(appointment)
+    old = getattr(appointment, '_loaded_slot', None)
+    if old is not None and old != held:
+        release(*old)
+    appointment._loaded_slot = held
+
+
+def appointment_deleted(appointment):
+    held = held_slot(appointment)
+    if held is not None:
+        release(*held)
+
+
+# ---------- calendar ----------
+
+def month_availability(year, month, today=None):
+    """
+    Availability of every slot of a month, from one read of the month's
+    SlotBooking documents (a range on the (date, slot) index):
+
+        {'month': 'YYYY-MM',
+         'slots': [{'value', 'label', 'capacity'}, ...],
+         'days': [{'date': 'YYYY-MM-DD', 'past': bool,
+                   'slots': {slot: {'booked', 'available'}}}, ...]}
+    """
+    if today is None:
+        today = timezone.localdate()
+    first = datetime.datetime(year, month, 1)
+    days_in_month = calendar.monthrange(year, month)[1]
+
+    booked = {}
+    for doc in SlotBooking.objects.mongo_find(
+        {'date': {'$gte': first, '$lt': first + datetime.timedelta(days=days_in_month)}},
+        {'_id': 0, 'date': 1, 'slot': 1, 'booked': 1},
+    ):
+        booked[(doc['date'].day, doc['slot'])] = max(doc.get('booked', 0), 0)
+
+    capacity = {slot: slot_capacity(slot) for slot in SLOTS}
+    days = []
+    for day in range(1, days_in_month + 1):
+        past = datetime.date(year, month, day) < today
+        slots = {}
+        for slot in SLOTS:
+            n = booked.get((day, slot), 0)
+            slots[slot] = {'booked': n, 'available': 0 if past else max(capacity[slot] - n, 0)}
+        days.append({'date': f"{year:04d}-{month:02d}-{day:02d}", 'past': past, 'slots': slots})
+
+    return {
+        'month': f"{year:04d}-{month:02d}",
+        'slots': [{'value': v, 'label': str(label), 'capacity': capacity[v]} for v, label in SLOT_CHOICES],
+        'days': days,
+    }
+
+
+# ---------- rebuild ----------
+
+def rebuild(booking_model=SlotBooking, appointment_model=Appointment, stdout=None):
+    """
+    Recompute every slot's count from the active appointments (one
+    aggregation) and drop the documents of slots nobody holds. Returns
+    the number of booked slots.
+
+    The model arguments let migrations pass their historical models.
+    """
+    collection = get_collection(booking_model)
+    counts = {}
+    for row in get_collection(appointment_model).aggregate([
+        {'$match': {'status': {'$in': list(ACTIVE_STATUSES)}, 'preferred_time': {'$in': SLOTS}}},
+        {'$group': {
+            '_id': {'date': '$preferred_date', 'slot': '$preferred_time'},
+            'booked': {'$sum': 1},
+        }},
+    ]):
+        if row['_id'].get('date') is not None:
+            counts[(row['_id']['date'], row['_id']['slot'])] = row['booked']
+
+    writes = [
+        UpdateOne({'date': date, 'slot': slot}, {'$set': {'booked': n}}, upsert=True)
+        for (date, slot), n in counts.items()
+    ]
+    for start in range(0, len(writes), WRITE_BATCH_SIZE):
+        collection.bulk_write(writes[start:start + WRITE_BATCH_SIZE], ordered=False)
+
+    stale = [
+        doc['_id']
+        for doc in collection.find({}, {'date': 1, 'slot': 1})
+        if (doc.get('date'), doc.get('slot')) not in counts
+    ]
+    if stale:
+        collection.delete_many({'_id': {'$in': stale}})
+
+    if stdout is not None:
+        stdout.write(f"{len(counts)} booked slots, {len(stale)} empty slots removed")
+    return len(counts)
@@ -0,0 +1,191 @@
+"""
+An in-process stand-in for MongoDB: a mongomock client registered with
+djongo under the database's name, so `manage.py loadtest --in-process`
+and the test suite (cars/test_runner.py) run without a MongoDB server.
+
+mongomock leaves out a few things the site's queries rely on. install()
+adds them, in this process only:
+  - Decimal128 values (what djongo stores for DecimalField: prices, offer
+    amounts) compare, sort and add up like numbers, for $sort, $max,
+    range filters, $inc and equality (12.5 == 12.50);
+  - the $unionWith stage (car_stats.rebuild_pipeline) and $substrCP
+    (the car cards' short description);
+  - $push of an object that refers to a missing field: MongoDB leaves
+    the field out, mongomock dropped the whole entry (car_stats'
+    order rows, which have no amounts);
+  - nested inclusion projections ({'cars': {'make': 1}}), which
+    mongomock reads as a literal document (car_detail's similar cars).
+
+It is a functional stand-in: the queries give MongoDB's results, but
+indexes only enforce uniqueness and the timings say nothing about a
+real server.
+"""
+import decimal
+import numbers
+import operator
+
+from bson.decimal128 import Decimal128
+
+
+_installed = False
+
+
+def register(name):
+    """
+    Make djongo connect database `name` to a new, empty mongomock client.
+    """
+    import mongomock
+    from djongo import database as djongo_database
+
+    install()
+    djongo_database.clients[name] = mongomock.MongoClient()
+
+
+def install():
+    global _installed
+    if _installed:
+        return
+    _numeric_decimal128()
+    _add_union_with()
+    _add_substr_cp()
+    _add_push_with_missing_fields()
+    _add_nested_projection()
+    _installed = True
+
+
+# ---------- Decimal128 ----------
+
+def _as_decimal(value):
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, float):
+        return decimal.Decimal(repr(value))
+    return value
+
+
+def _numeric_decimal128():
+    def compare(op):
+        def method(self, other):
+            if other is None:
+                # null sorts before every number ($max over a missing value)
+                return op(1, 0)
+            other = _as_decimal(other)
+            if isinstance(other, bool) or not isinstance(other, (int, decimal.Decimal)):
+                return NotImplemented
+            return op(self.to_decimal(), other)
+        return method
+
+    def arithmetic(op, reflected=False):
+        def method(self, other):
+            other = _as_decimal(other)
+            if isinstance(other, bool) or not isinstance(other, (int, decimal.Decimal)):
+                return NotImplemented
+            a, b = (other, self.to_decimal()) if reflected else (self.to_decimal(), other)
+            return Decimal128(op(a, b))
+        return method
+
+    def equal(negate):
+        def method(self, other):
+            if isinstance(other, Decimal128):
+                other = other.to_decimal()
+            elif isinstance(other, bool) or not isinstance(other, (int, float, decimal.Decimal)):
+                return NotImplemented
+            return (self.to_decimal() == other) != negate
+        return method
+
+    for name, op in (('__lt__', operator.lt), ('__le__', operator.le),
+                     ('__gt__', operator.gt), ('__ge__', operator.ge)):
+        setattr(Decimal128, name, compare(op))
+    Decimal128.__eq__ = equal(False)
+    Decimal128.__ne__ = equal(True)
+    Decimal128.__hash__ = lambda self: hash(self.to_decimal())
+    Decimal128.__add__ = arithmetic(operator.add)
+    Decimal128.__radd__ = arithmetic(operator.add, reflected=True)
+    Decimal128.__sub__ = arithmetic(operator.sub)
+    Decimal128.__rsub__ = arithmetic(operator.sub, reflected=True)
+    # mongomock orders values by type first; this puts Decimal128 with
+    # the other numbers, as MongoDB does
+    numbers.Number.register(Decimal128)
+
+
+# ---------- aggregation ----------
+
+def _add_union_with():
+    from mongomock import aggregate
+
+    def union_with_stage(in_collection, database, options):
+        if isinstance(options, str):
+            options = {'coll': options}
+        docs = list(database.get_collection(options['coll']).find())
+        if options.get('pipeline'):
+            docs = list(aggregate.process_pipeline(docs, database, options['pipeline'], None))
+        return list(in_collection) + docs
+
+    aggregate._PIPELINE_HANDLERS['$unionWith'] = union_with_stage
+
+
+def _add_substr_cp():
+    from mongomock import aggregate
+
+    handle_string_operator = aggregate._Parser._handle_string_operator
+
+    def _handle_string_operator(self, operator, values):
+        # on Python strings code points and $substr's bytes look alike
+        if operator == '$substrCP':
+            operator = '$substr'
+        return handle_string_operator(self, operator, values)
+
+    aggregate._Parser._handle_string_operator = _handle_string_operator
+
+
+def _add_push_with_missing_fields():
+    from mongomock import aggregate
+
+    accumulate_group = aggregate._accumulate_group
+
+    def pushed(spec, doc):
+        item = {}
+        for key, expression in spec.items():
+            try:
+                item[key] = aggregate._parse_expression(expression, doc)
+            except KeyError:
+                pass
+        return item
+
+    def _accumulate_group(output_fields, group_list):
+        pushes = {
+            field: value['$push'] for field, value in output_fields.items()
+            if isinstance(value, dict) and isinstance(value.get('$push'), dict)
+        }
+        others = {field: value for field, value in output_fields.items() if field not in pushes}
+        doc_dict = accumulate_group(others, group_list)
+        for field, spec in pushes.items():
+            doc_dict[field] = [pushed(spec, doc) for doc in group_list]
+        return doc_dict
+
+    aggregate._accumulate_group = _accumulate_group
+
+
+def _flatten_projection(spec, prefix=''):
+    # {'cars': {'_id': 1, 'make': 1}} -> {'cars._id': 1, 'cars.make': 1}
+    flat = {}
+    for key, value in spec.items():
+        path = prefix + key
+        if (isinstance(value, dict) and value
+                and not any(k.startswith('$') for k in value)
+                and all(isinstance(v, (bool, int, dict)) for v in value.values())):
+            flat.update(_flatten_projection(value, path + '.'))
+        else:
+            flat[path] = value
+    return flat
+
+
+def _add_nested_projection():
+    from mongomock import aggregate
+
+    handle_project_stage = aggregate._handle_project_stage
+
+    def project_stage(in_collection, database, options):
+        return handle_project_stage(in_collection, database, _flatten_projection(options))
+
+    aggregate._PIPELINE_HANDLERS['$project'] = project_stage
@@ -0,0 +1,65 @@
+"""
+Streamed rendering of pages whose middle part is long (the catalog).
+
+A normal render() builds the whole page in memory before the first byte
+goes out. stream_template() renders the page once with a marker in place
+of each "slot" variable, sends the text up to the first marker right
+away (head, navbar, filter form), then the slot's chunks as they are
+produced, then the text up to the next marker, and so on:
+
+    response = stream_template(request, 'cars/car_list.html', context, {
+        'car_stream': card_chunks,          # callables returning
+        'car_stream_footer': footer,        # iterables of str
+    })
+
+Slots are produced in order and only when the stream reaches them, so a
+later slot can use what an earlier one found out (e.g. the cursor of the
+next page, known once the cards are done).
+
+What a stream cannot do: change the status code or headers once it has
+started, and add the database time spent after the view returned to the
+Server-Timing header (see cars/middleware.py).
+"""
+import uuid
+
+from django.http import StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+
+def render_chunks(request, template_name, chunks, name='cars'):
+    """
+    Render `template_name` once per chunk, with the chunk as `name`.
+    """
+    template = get_template(template_name)
+    for chunk in chunks:
+        yield template.render({name: chunk}, request)
+
+
+def stream_template(request, template_name, context, slots,
+                    content_type='text/html; charset=utf-8'):
+    """
+    StreamingHttpResponse of `template_name`, with each variable named in
+    `slots` ({name: callable returning an iterable of str}) replaced by
+    what its callable produces, in template order.
+    """
+    token = uuid.uuid4().hex
+    markers = {name: f"<!--stream:{name}:{token}-->" for name in slots}
+    shell = render_to_string(
+        template_name,
+        dict(context, **{name: mark_safe(marker) for name, marker in markers.items()}),
+        request,
+    )
+
+    def generate():
+        rest = shell
+        for name, produce in slots.items():
+            before, rest = rest.split(markers[name], 1)
+            yield before
+            yield from produce()
+        yield rest
+
+    response = StreamingHttpResponse(generate(), content_type=content_type)
+    # let a proxy pass chunks through instead of buffering the page
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,514 @@
+"""
+Deterministic synthetic data for benchmarks, load tests and scale tests
+(`manage.py generate_data`, `manage.py loadtest`).
+
+Every document is built from its own random generator, seeded with
+(seed, kind, index), and gets an _id derived from the same triple. So:
+  - the same seed always produces the same documents, whatever the
+    number of processes or the order the chunks are written in;
+  - an order or offer can refer to car number i without reading it
+    (car_id(i) and the car's price are recomputed from the seed);
+  - running the same generation twice, or resuming an interrupted one,
+    only adds what is missing (duplicate _ids are skipped).
+
+The shape of the data comes from DISTRIBUTIONS (makes, prices, years,
+ratings, statuses, and how skewed activity is across users and cars),
+which a JSON file can override per key.
+
+Cars, reviews, orders, offers and appointments are written straight to
+MongoDB in batched insert_many calls, in chunks that can be spread over
+several processes. Users go through the ORM in bulk_create batches
+(djongo assigns their integer ids). Bulk writes skip the model signals,
+so finish_seed() rebuilds the derived data the signals would have
+maintained.
+"""
+import calendar
+import datetime
+import hashlib
+import json
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from multiprocessing import get_context
+
+import django
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from pymongo.errors import BulkWriteError
+
+from . import car_stats, counters, recommendations, review_stats, slots, versions
+from .car_choices import car_label
+from .models import Car, Review, Order, Offer, Appointment
+
+
+WRITE_BATCH_SIZE = 1000
+
+# Documents per unit of work handed to a process.
+CHUNK_SIZE = 20000
+
+# Password of every synthetic user.
+SYNTHETIC_PASSWORD = 'bench-password-1'
+
+USERNAME_PREFIX = 'bench_user_'
+
+MAKES = {
+    'Toyota': ['Camry', 'Corolla', 'RAV4', 'Highlander', 'Prius'],
+    'Honda': ['Civic', 'Accord', 'CR-V', 'Pilot', 'Fit'],
+    'Ford': ['F-150', 'Focus', 'Escape', 'Explorer', 'Mustang'],
+    'BMW': ['3 Series', '5 Series', 'X3', 'X5', 'i4'],
+    'Tesla': ['Model 3', 'Model S', 'Model X', 'Model Y'],
+    'Kia': ['Rio', 'Sportage', 'Sorento', 'Telluride'],
+    'Subaru': ['Outback', 'Forester', 'Impreza', 'Crosstrek'],
+    'Audi': ['A3', 'A4', 'Q5', 'Q7'],
+}
+
+WORDS = (
+    'clean title one owner low mileage leather seats sunroof navigation '
+    'backup camera heated seats new tires full service history warranty '
+    'bluetooth alloy wheels fuel efficient spacious reliable sporty'
+).split()
+
+DISTRIBUTIONS = {
+    # relative weight of each make (names from MAKES)
+    'makes': {
+        'Toyota': 18, 'Honda': 15, 'Ford': 16, 'BMW': 8,
+        'Tesla': 6, 'Kia': 10, 'Subaru': 9, 'Audi': 7,
+    },
+    'years': [2005, 2025],
+    # lognormal price around `median`; newer cars cost `per_year` more per year
+    'price': {'median': 22000, 'sigma': 0.45, 'per_year': 0.03, 'min': 1500, 'max': 250000},
+    # weight of ratings 1..5 (real reviews skew towards good ratings)
+    'ratings': [1, 1, 2, 4, 6],
+    'order_status': {'pending': 6, 'confirmed': 3, 'rejected': 1},
+    'offer_status': {'pending': 5, 'accepted': 2, 'rejected': 3},
+    'appointment_status': {'pending': 5, 'confirmed': 4, 'cancelled': 1},
+    # offers as a fraction of the asking price
+    'offer_range': [0.8, 1.0],
+    # Zipf-like exponent of activity per user / interest per car:
+    # 0 = uniform, 1 = a few users (cars) account for most documents
+    'user_skew': 1.0,
+    'car_skew': 0.7,
+    # created_at spread over the last `history_days`
+    'history_days': 365,
+}
+
+KINDS = ('cars', 'reviews', 'orders', 'offers', 'appointments')
+
+MODELS = {
+    'cars': Car,
+    'reviews': Review,
+    'orders': Order,
+    'offers': Offer,
+    'appointments': Appointment,
+}
+
+# Byte 4 of the generated ObjectIds, one per kind.
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS, start=1)}
+
+
+def distributions(overrides=None):
+    """
+    DISTRIBUTIONS with `overrides` applied; dict values are merged one
+    level deep, e.g. {'price': {'median': 30000}} keeps the other price
+    settings. Raises ValueError for unknown keys or makes.
+    """
+    result = json.loads(json.dumps(DISTRIBUTIONS))
+    for key, value in (overrides or {}).items():
+        if key not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution setting: {key}")
+        if isinstance(DISTRIBUTIONS[key], dict) and key != 'makes':
+            result[key].update(value)
+        else:
+            result[key] = value
+
+    unknown = set(result['makes']) - set(MAKES)
+    if unknown:
+        raise ValueError(f"Unknown make(s): {', '.join(sorted(unknown))}")
+    if len(result['ratings']) != 5:
+        raise ValueError("ratings needs 5 weights (for 1..5)")
+    return result
+
+
+def load_distributions(path):
+    with open(path, encoding='utf-8') as f:
+        return distributions(json.load(f))
+
+
+def skewed_index(rnd, n, skew):
+    """
+    Index in [0, n) with P(i) roughly proportional to 1 / (i + 1) ** skew,
+    by inverting the continuous power law; no table, so it costs the
+    same for a million users as for ten.
+    """
+    u = rnd.random()
+    if skew <= 0:
+        x = 1 + u * n
+    elif abs(skew - 1) < 1e-9:
+        x = (n + 1) ** u
+    else:
+        a = 1 - skew
+        x = (u * ((n + 1) ** a - 1) + 1) ** (1 / a)
+    return min(n - 1, int(x) - 1)
+
+
+def _weighted(rnd, weights):
+    return rnd.choices(list(weights), weights=list(weights.values()))[0]
+
+
+class Generator:
+    def __init__(self, seed=0, now=None, dist=None):
+        self.seed = seed
+        self.now = now or datetime.datetime(2025, 1, 1)
+        self.dist = dist or distributions()
+        self._id_prefix = calendar.timegm(self.now.timetuple()).to_bytes(4, 'big')
+        self._seed_bytes = hashlib.md5(str(seed).encode()).digest()[:3]
+
+    def rng(self, kind, index):
+        return random.Random(f"{self.seed}:{kind}:{index}")
+
+    def object_id(self, kind, index):
+        """
+        _id of document `index` of `kind`:
+        now (4 bytes) | kind (1) | seed hash (3) | index (4).
+        """
+        return ObjectId(
+            self._id_prefix + bytes([KIND_CODES[kind]]) + self._seed_bytes
+            + index.to_bytes(4, 'big')
+        )
+
+    def car_id(self, index):
+        return self.object_id('cars', index)
+
+    def text(self, rnd, words):
+        return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    def when(self, rnd, days=None):
+        # naive UTC, as djongo stores datetimes
+        days = days or self.dist['history_days']
+        return self.now - datetime.timedelta(seconds=rnd.randrange(days * 86400))
+
+    def car_basics(self, rnd):
+        """
+        (make, model, year, price) - the first draws of a car's generator,
+        so offers and appointments can recompute them cheaply.
+        """
+        dist = self.dist
+        make = _weighted(rnd, dist['makes'])
+        model = rnd.choice(MAKES[make])
+        first, last = dist['years']
+        year = rnd.randint(first, last)
+        p = dist['price']
+        price = rnd.lognormvariate(math.log(p['median']), p['sigma'])
+        price *= 1 + (year - first) * p['per_year']
+        price = min(max(price, p['min']), p['max'])
+        return make, model, year, Decimal(f"{price:.2f}")
+
+    def car(self, index, n_cars=None, users=None):
+        rnd = self.rng('cars', index)
+        make, model, year, price = self.car_basics(rnd)
+        return {
+            '_id': self.car_id(index),
+            'make': make,
+            'model': model,
+            'year': year,
+            'price': Decimal128(price),
+            'description': self.text(rnd, rnd.randint(15, 40)),
+            'image_url': f"https://example.com/cars/{index}.jpg",
+            'updated_at': self.when(rnd, 30),
+        }
+
+    def pick_user(self, rnd, users):
+        return users[skewed_index(rnd, len(users), self.dist['user_skew'])]
+
+    def pick_car(self, rnd, n_cars):
+        index = skewed_index(rnd, n_cars, self.dist['car_skew'])
+        return index, self.car_basics(self.rng('cars', index))
+
+    def person(self, user):
+        return {
+            'user_id': user['id'],
+            'full_name': user['name'],
+            'email': f"{user['username']}@example.com",
+        }
+
+    def review(self, index, n_cars, users):
+        rnd = self.rng('reviews', index)
+        doc = self.person(self.pick_user(rnd, users))
+        doc.update({
+            '_id': self.object_id('reviews', index),
+            'rating': rnd.choices([1, 2, 3, 4, 5], weights=self.dist['ratings'])[0],
+            'comment': self.text(rnd, rnd.randint(5, 30)),
+            'created_at': self.when(rnd),
+        })
+        return doc
+
+    def order(self, index, n_cars, users):
+        rnd = self.rng('orders', index)
+        doc = self.person(self.pick_user(rnd, users))
+        car_index, _ = self.pick_car(rnd, n_cars)
+        doc.update({
+            '_id': self.object_id('orders', index),
+            'car_id': self.car_id(car_index),
+            'phone': f"555-{rnd.randint(1000, 9999)}",
+            'message': self.text(rnd, 5),
+            'status': _weighted(rnd, self.dist['order_status']),
+            'created_at': self.when(rnd),
+        })
+        return doc
+
+    def offer(self, index, n_cars, users):
+        rnd = self.rng('offers', index)
+        user = self.pick_user(rnd, users)
+        car_index, (_, _, _, price) = self.pick_car(rnd, n_cars)
+        low, high = self.dist['offer_range']
+        return {
+            '_id': self.object_id('offers', index),
+            'user_id': user['id'],
+            'car_id': self.car_id(car_index),
+            'amount': Decimal128(Decimal(f"{float(price) * rnd.uniform(low, high):.2f}")),
+            'message': self.text(rnd, 5),
+            'status': _weighted(rnd, self.dist['offer_status']),
+            'created_at': self.when(rnd),
+        }
+
+    def appointment(self, index, n_cars, users):
+        rnd = self.rng('appointments', index)
+        doc = self.person(self.pick_user(rnd, users))
+        _, (make, model, year, _) = self.pick_car(rnd, n_cars)
+        day = self.now + datetime.timedelta(days=rnd.randint(-60, 60))
+        doc.update({
+            '_id': self.object_id('appointments', index),
+            'phone': f"555-{rnd.randint(1000, 9999)}",
+            'car_interest': car_label(make, model, year),
+            'preferred_date': datetime.datetime(day.year, day.month, day.day),
+            'preferred_time': rnd.choice(['morning', 'afternoon', 'evening']),
+            'message': self.text(rnd, 5),
+            'status': _weighted(rnd, self.dist['appointment_status']),
+            'created_at': self.when(rnd),
+        })
+        return doc
+
+    def document(self, kind, index, n_cars, users):
+        build = {
+            'cars': self.car,
+            'reviews': self.review,
+            'orders': self.order,
+            'offers': self.offer,
+            'appointments': self.appointment,
+        }[kind]
+        return build(index, n_cars, users)
+
+
+class SeedStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.users = 0
+        self.inserted = {kind: 0 for kind in KINDS}
+        self.existing = {kind: 0 for kind in KINDS}
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def documents(self):
+        return sum(self.inserted.values()) + sum(self.existing.values())
+
+    @property
+    def docs_per_second(self):
+        return self.documents / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        parts = [f"{self.users} users"]
+        for kind in KINDS:
+            part = f"{self.inserted[kind]} {kind}"
+            if self.existing[kind]:
+                part += f" (+{self.existing[kind]} already there)"
+            parts.append(part)
+        return (
+            f"{', '.join(parts)} in {self.elapsed:.1f}s "
+            f"({self.docs_per_second:.0f} docs/s)"
+        )
+
+
+# ---------- writing ----------
+
+def _insert(model, docs, batch_size=WRITE_BATCH_SIZE):
+    """
+    insert_many in batches. Documents whose _id already exists are
+    skipped. Returns (inserted, existing).
+    """
+    inserted = existing = 0
+
+    def flush(batch):
+        nonlocal inserted, existing
+        try:
+            inserted += len(model.objects.mongo_insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            inserted += e.details.get('nInserted', 0)
+            existing += len(errors)
+
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return inserted, existing
+
+
+def create_users(count, prefix=USERNAME_PREFIX, batch_size=WRITE_BATCH_SIZE):
+    """
+    Make sure users <prefix>0 .. <prefix><count - 1> exist (bulk_create
+    of the missing ones; all share SYNTHETIC_PASSWORD, hashed once).
+    Returns the number created.
+    """
+    existing = set(
+        User.objects.filter(username__startswith=prefix).values_list('username', flat=True)
+    )
+    password = make_password(SYNTHETIC_PASSWORD)
+    missing = [
+        User(username=f"{prefix}{i}", password=password,
+             first_name='Bench', last_name=f"User {i}")
+        for i in range(count)
+        if f"{prefix}{i}" not in existing
+    ]
+    for start in range(0, len(missing), batch_size):
+        User.objects.bulk_create(missing[start:start + batch_size])
+    return len(missing)
+
+
+def load_users(count, prefix=USERNAME_PREFIX):
+    """
+    The synthetic users as dicts, position i = <prefix>i.
+    """
+    users = [None] * count
+    rows = User.objects.filter(username__startswith=prefix).values_list(
+        'id', 'username', 'first_name', 'last_name'
+    )
+    for pk, username, first_name, last_name in rows:
+        suffix = username[len(prefix):]
+        if suffix.isdigit() and int(suffix) < count:
+            users[int(suffix)] = {
+                'id': pk, 'username': username, 'name': f"{first_name} {last_name}",
+            }
+    if None in users:
+        raise ValueError(f"Synthetic user {prefix}{users.index(None)} is missing")
+    return users
+
+
+def plan(counts, chunk_size=CHUNK_SIZE):
+    """
+    Units of work (kind, start, stop) covering counts {kind: n}.
+    """
+    for kind in KINDS:
+        for start in range(0, counts.get(kind, 0), chunk_size):
+            yield kind, start, min(start + chunk_size, counts[kind])
+
+
+# Per-process state of the generation, set by _setup().
+_job = {}
+
+
+def _setup(config):
+    # a worker process starts with the configured database name; follow
+    # the parent if it was pointed elsewhere (e.g. by loadtest)
+    connection = connections['default']
+    if connection.settings_dict['NAME'] != config['database']:
+        connection.close()
+        connection.settings_dict['NAME'] = config['database']
+    _job.clear()
+    _job.update(config)
+    _job['generator'] = Generator(config['seed'], config['now'], config['dist'])
+    _job['users'] = load_users(config['users']) if config['users'] else []
+
+
+def _run_unit(config, unit):
+    """
+    Write one unit of work; returns (kind, inserted, existing). In worker
+    processes the job is set up on the first unit.
+    """
+    if _job.get('config_id') != config['config_id']:
+        _setup(config)
+    kind, start, stop = unit
+    generator, users = _job['generator'], _job['users']
+    if kind != 'cars' and not (users and config['cars']):
+        return kind, 0, 0
+    docs = (generator.document(kind, i, config['cars'], users) for i in range(start, stop))
+    return (kind,) + _insert(MODELS[kind], docs, config['batch_size'])
+
+
+def seed(cars=1000, users=20, reviews=200, orders=200, offers=200, appointments=200,
+         seed=0, dist=None, processes=1, batch_size=WRITE_BATCH_SIZE,
+         chunk_size=CHUNK_SIZE, finish=True, on_progress=None, stdout=None):
+    """
+    Write a deterministic dataset, `processes` chunks at a time, then
+    (with finish=True) rebuild the derived data. Returns SeedStats.
+    Reviews, orders, offers and appointments need users; orders, offers
+    and appointments also need cars.
+    """
+    stats = SeedStats()
+    stats.users = users
+    create_users(users, batch_size=batch_size)
+
+    counts = {
+        'cars': cars, 'reviews': reviews, 'orders': orders,
+        'offers': offers, 'appointments': appointments,
+    }
+    config = {
+        'config_id': f"{seed}:{time.time()}",
+        'database': connections['default'].settings_dict['NAME'],
+        'seed': seed,
+        'now': None,
+        'dist': dist or distributions(),
+        'users': users,
+        'cars': cars,
+        'batch_size': batch_size,
+    }
+    units = list(plan(counts, chunk_size))
+
+    def record(result):
+        kind, inserted, existing = result
+        stats.inserted[kind] += inserted
+        stats.existing[kind] += existing
+        if on_progress is not None:
+            on_progress(stats)
+
+    if processes > 1:
+        # spawn: every worker sets up Django and opens its own MongoClient
+        with ProcessPoolExecutor(processes, mp_context=get_context('spawn'),
+                                 initializer=django.setup) as pool:
+            futures = [pool.submit(_run_unit, config, unit) for unit in units]
+            for future in as_completed(futures):
+                record(future.result())
+    else:
+        for unit in units:
+            record(_run_unit(config, unit))
+
+    if finish:
+        finish_seed(stdout)
+    return stats
+
+
+def finish_seed(stdout=None):
+    """
+    Rebuild what the model signals would have kept up to date.
+    """
+    counters.reconcile()
+    review_stats.rebuild()
+    slots.rebuild()
+    versions.bump('car')
+    versions.bump('review')
+    recommendations.build_all(stdout=stdout)
+    # last: its $unionWith needs MongoDB 4.4 (mongomock has none)
+    car_stats.rebuild(stdout=stdout)
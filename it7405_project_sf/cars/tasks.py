@@ -0,0 +1,151 @@
+"""
+The background tasks run through cars/jobs.py.
+
+Confirmation emails, queued by the views once the submission is saved:
+  welcome_email             signup                   (user_id)
+  order_confirmation        buy_car                  (order_id)
+  offer_confirmation        make_offer               (offer_id)
+  appointment_confirmation  appointment_page         (appointment_id)
+Each is a batch task: one query loads the documents of every job in the
+batch and the messages go out over one mail connection. A document
+deleted before its job runs is skipped.
+
+car_image, queued by the car admin when a car gets a new image URL,
+fetches the image and makes its resized copies (cars/images.py).
+
+refresh_similar, queued by the Car save/delete signals, recomputes the
+similar-cars lists the car is part of (cars/recommendations.py).
+"""
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+
+from . import images, recommendations, versions
+from .jobs import task
+from .models import Appointment, Car, Offer, Order
+
+
+TIME_LABELS = dict(Appointment._meta.get_field('preferred_time').choices)
+
+
+def _ids(batch, name):
+    return [ObjectId(args[name]) for args in batch]
+
+
+def _car_labels(car_ids):
+    return {
+        doc['_id']: f"{doc.get('make')} {doc.get('model')} ({doc.get('year')})"
+        for doc in Car.objects.mongo_find(
+            {'_id': {'$in': list(set(car_ids))}}, {'make': 1, 'model': 1, 'year': 1},
+        )
+    }
+
+
+def _message(template, subject, to, context):
+    return EmailMessage(
+        subject=subject,
+        body=render_to_string(f'cars/email/{template}.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[to],
+    )
+
+
+def _send(messages):
+    if messages:
+        get_connection().send_messages(messages)
+
+
+# ---------- confirmation emails ----------
+
+@task('welcome_email', batch=True)
+def send_welcome_emails(batch):
+    users = User.objects.filter(pk__in=[args['user_id'] for args in batch]).exclude(email='')
+    _send([
+        _message('welcome', "Welcome to Car Sales", user.email, {'user': user})
+        for user in users
+    ])
+
+
+@task('order_confirmation', batch=True)
+def send_order_confirmations(batch):
+    orders = list(Order.objects.mongo_find(
+        {'_id': {'$in': _ids(batch, 'order_id')}},
+        {'car_id': 1, 'full_name': 1, 'email': 1, 'phone': 1},
+    ))
+    cars = _car_labels(order['car_id'] for order in orders)
+    _send([
+        _message('order_confirmation', "We received your purchase request", order['email'], {
+            'order': order,
+            'car': cars.get(order['car_id'], "the car"),
+        })
+        for order in orders if order.get('email')
+    ])
+
+
+@task('offer_confirmation', batch=True)
+def send_offer_confirmations(batch):
+    # offers have no email address of their own; it is the user's
+    offers = list(Offer.objects.mongo_find(
+        {'_id': {'$in': _ids(batch, 'offer_id')}},
+        {'car_id': 1, 'user_id': 1, 'amount': 1},
+    ))
+    cars = _car_labels(offer['car_id'] for offer in offers)
+    users = User.objects.in_bulk([offer['user_id'] for offer in offers if offer.get('user_id')])
+    messages = []
+    for offer in offers:
+        user = users.get(offer.get('user_id'))
+        if user is None or not user.email:
+            continue
+        amount = offer['amount']
+        messages.append(_message('offer_confirmation', "We received your offer", user.email, {
+            'user': user,
+            'amount': amount.to_decimal() if isinstance(amount, Decimal128) else amount,
+            'car': cars.get(offer['car_id'], "the car"),
+        }))
+    _send(messages)
+
+
+@task('appointment_confirmation', batch=True)
+def send_appointment_confirmations(batch):
+    appointments = Appointment.objects.mongo_find(
+        {'_id': {'$in': _ids(batch, 'appointment_id')}},
+        {'full_name': 1, 'email': 1, 'car_interest': 1, 'preferred_date': 1,
+         'preferred_time': 1, 'status': 1},
+    )
+    _send([
+        _message('appointment_confirmation', "Your test drive request", appointment['email'], {
+            'appointment': appointment,
+            'time': TIME_LABELS.get(appointment.get('preferred_time'), ''),
+        })
+        # cancelled meanwhile: nothing to confirm
+        for appointment in appointments
+        if appointment.get('email') and appointment.get('status') != 'cancelled'
+    ])
+
+
+# ---------- car images ----------
+
+@task('car_image', max_attempts=3)
+def process_car_image(car_id):
+    """
+    Resized copies of a car's image (retried when the fetch fails).
+    """
+    doc = Car.objects.mongo_find_one({'_id': ObjectId(car_id)}, {'image_url': 1, 'image_source': 1})
+    if doc is None or not doc.get('image_url') or doc.get('image_source') == doc['image_url']:
+        return
+    images.process_car(doc)
+    # cached car cards still point at the original image
+    versions.bump('car')
+
+
+# ---------- similar cars ----------
+
+@task('refresh_similar')
+def refresh_similar_cars(car_id, deleted=False):
+    """
+    The car's own list and the lists around it, as the car is now.
+    """
+    recommendations.refresh_car(ObjectId(car_id), deleted=deleted)
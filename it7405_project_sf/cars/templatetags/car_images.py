@@ -0,0 +1,47 @@
+"""
+{% car_image %}: responsive markup for a car's image.
+
+Usage:
+
+    {% load car_images %}
+    {% car_image car sizes='(min-width: 768px) 33vw, 100vw' css_class='card-img-top' %}
+
+For a car with resized copies (see cars/images.py) this renders a
+<picture> with a WebP and a JPEG srcset, so the browser downloads the
+smallest file that fills `sizes`, plus width/height so the layout does not
+jump while it loads. Cars not processed yet get a plain <img> of
+image_url. Images are lazy-loaded unless loading='eager' (for the one
+big image at the top of a page, which also gets fetchpriority=high).
+"""
+from django import template
+from django.utils.html import format_html
+
+from cars.images import FORMATS, variants
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def car_image(car, sizes='100vw', css_class='', alt=None, loading='lazy'):
+    if alt is None:
+        alt = f"{car.make} {car.model}"
+    priority = format_html(' fetchpriority="high"') if loading == 'eager' else ''
+    found = variants(car)
+
+    if found is None:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" loading="{}" decoding="async"{}>',
+            car.image_url, css_class, alt, loading, priority,
+        )
+
+    return format_html(
+        '<picture>'
+        '<source type="{}" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}" '
+        'loading="{}" decoding="async"{}>'
+        '</picture>',
+        FORMATS['webp'][2], found['srcset']['webp'], sizes,
+        found['src'], found['srcset']['jpeg'], sizes, found['width'], found['height'],
+        css_class, alt, loading, priority,
+    )
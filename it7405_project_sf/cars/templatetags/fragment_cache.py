@@ -0,0 +1,113 @@
+"""
+{% cachefragment %}: template fragment caching keyed by model versions.
+
+Usage:
+
+    {% load fragment_cache %}
+    {% cachefragment 'car_card' car.mongo_id versions='car' %}
+        ... expensive markup ...
+    {% endcachefragment %}
+
+The cache key is built from the fragment name, the current version of
+every model listed in `versions` (see cars/versions.py) and the other
+arguments. Saving or deleting a Car bumps the "car" version, so every
+fragment that depends on cars is re-rendered on its next use.
+
+Fragments are stored in the cache named by settings.FRAGMENT_CACHE_ALIAS
+(local memory or file based, see settings.CACHES). Hits and misses are
+counted in process memory, so counting costs no cache round trip; see
+fragment_cache_stats().
+"""
+import hashlib
+import threading
+
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+
+from cars.versions import get_versions
+
+
+register = template.Library()
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def fragment_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def fragment_cache_stats():
+    """
+    Hits and misses of this process since it started.
+    """
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 3) if total else None,
+    }
+
+
+class CacheFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on, versions):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.versions = versions
+
+    def cache_key(self, context):
+        name = self.name.resolve(context)
+
+        models = []
+        if self.versions is not None:
+            models = [m.strip() for m in str(self.versions.resolve(context)).split(',') if m.strip()]
+        current = get_versions(context.get('request'))
+        version_part = ','.join(f"{m}={current.get(m, 0)}" for m in models)
+
+        vary = ':'.join(str(v.resolve(context)) for v in self.vary_on)
+        digest = hashlib.md5(vary.encode()).hexdigest()
+        return f"fragment:{name}:{version_part}:{digest}"
+
+    def render(self, context):
+        cache = fragment_cache()
+        key = self.cache_key(context)
+
+        value = cache.get(key)
+        if value is not None:
+            _count('hits')
+            return value
+
+        _count('misses')
+        value = self.nodelist.render(context)
+        cache.set(key, value, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', None))
+        return value
+
+
+@register.tag('cachefragment')
+def do_cachefragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(
+            "'cachefragment' tag requires at least a fragment name."
+        )
+
+    versions = None
+    vary_on = []
+    for bit in bits[2:]:
+        if bit.startswith('versions='):
+            versions = parser.compile_filter(bit[len('versions='):])
+        else:
+            vary_on.append(parser.compile_filter(bit))
+
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return CacheFragmentNode(nodelist, parser.compile_filter(bits[1]), vary_on, versions)
@@ -0,0 +1,79 @@
+"""
+`manage.py test` against the in-process MongoDB stand-in
+(cars/standin.py), so the suite needs no MongoDB server.
+
+StandInTestRunner migrates a fresh stand-in database per run, swaps
+every cache for local memory and serves static files by their plain
+names, so tests never touch the site's database or its file caches and
+need no collectstatic. djongo has no transactions to roll a test back, so
+MongoTestCase empties the collections before each test instead.
+"""
+from django.apps import apps
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+from django.test.runner import DiscoverRunner
+
+from . import standin
+from .mongo import get_collection
+
+
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ('default', 'fragments', 'users', 'sessions')
+}
+
+# filled by migrate and needed afterwards (admin, permissions)
+KEPT_MODELS = (ContentType, Permission)
+
+
+class StandInTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._settings = override_settings(
+            CACHES=TEST_CACHES,
+            FRAGMENT_CACHE_ALIAS='fragments',
+            # the manifest storage needs collectstatic's staticfiles.json
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        self._settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        connection = connections['default']
+        old_name = connection.settings_dict['NAME']
+        name = connection.settings_dict.get('TEST', {}).get('NAME') or f'test_{old_name}'
+
+        connection.close()
+        connection.settings_dict['NAME'] = name
+        standin.register(name)
+        call_command('migrate', verbosity=max(self.verbosity - 1, 0), interactive=False)
+        return old_name
+
+    def teardown_databases(self, old_config, **kwargs):
+        connection = connections['default']
+        connection.close()
+        connection.settings_dict['NAME'] = old_config
+
+
+class MongoTestCase(SimpleTestCase):
+    """
+    A test that uses the database: starts from empty collections (and
+    empty caches).
+    """
+    databases = {'default'}
+
+    def setUp(self):
+        super().setUp()
+        for model in apps.get_models():
+            if model not in KEPT_MODELS:
+                get_collection(model).delete_many({})
+        for cache in caches.all():
+            cache.clear()
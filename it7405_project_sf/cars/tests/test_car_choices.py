@@ -0,0 +1,76 @@
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+
+from cars import versions
+from cars.car_choices import get_car_choices, search_car_labels
+from cars.models import Appointment, Car, SiteCounter
+from cars.test_runner import MongoTestCase
+
+
+class CarChoicesTest(MongoTestCase):
+
+    def car(self, make, model, year):
+        return Car.objects.create(make=make, model=model, year=year, price=Decimal('9000'),
+                                  description='', image_url='')
+
+    def test_labels(self):
+        self.car('Kia', 'Rio', 2020)
+        ford = self.car('Ford', 'Focus', 2019)
+        self.car('Ford', 'Focus', 2019)
+        choices = get_car_choices()
+        self.assertEqual(choices['labels'], ['Ford Focus (2019)', 'Kia Rio (2020)'])
+        self.assertEqual(choices['by_id'][str(ford._id)], 'Ford Focus (2019)')
+        self.assertEqual(search_car_labels('rio'), ['Kia Rio (2020)'])
+
+    def test_a_change_in_another_process_is_seen(self):
+        self.car('Kia', 'Rio', 2020)
+        self.assertEqual(get_car_choices()['labels'], ['Kia Rio (2020)'])
+
+        # another process adds a car: this process's cache never hears
+        # of it, only the shared "car" version moves
+        Car.objects.mongo_insert_one({'make': 'Ford', 'model': 'Focus', 'year': 2019})
+        versions.bump('car')
+        self.assertEqual(get_car_choices()['labels'], ['Ford Focus (2019)', 'Kia Rio (2020)'])
+
+    def test_the_list_is_cached_per_version(self):
+        self.car('Kia', 'Rio', 2020)
+        get_car_choices()
+        Car.objects.mongo_insert_one({'make': 'Ford', 'model': 'Focus', 'year': 2019})
+        self.assertEqual(get_car_choices()['labels'], ['Kia Rio (2020)'])
+        self.assertEqual(len(cache._cache), 1)
+
+
+class AppointmentPageTest(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Car.objects.create(make='Kia', model='Rio', year=2020, price=Decimal('9000'),
+                           description='', image_url='')
+        self.client.force_login(User.objects.create_user('ann', password='secret'))
+
+    def version_reads(self, method, *args):
+        with mock.patch.object(SiteCounter.objects, 'mongo_find',
+                               wraps=SiteCounter.objects.mongo_find) as finds:
+            response = method(reverse('appointments'), *args)
+        self.assertEqual(response.status_code, 200)
+        reads = [c for c in finds.call_args_list if c.args[0] == versions.VERSIONS_QUERY]
+        return len(reads), response
+
+    def test_the_form_reads_the_versions_once_per_request(self):
+        reads, response = self.version_reads(self.client.get)
+        self.assertEqual(reads, 1)
+
+        reads, response = self.version_reads(self.client.post, {
+            'full_name': 'Ann', 'email': 'ann@example.com', 'phone': '555',
+            'car_interest': 'Kia Rio (2020)',
+            'preferred_date': datetime.date.today() + datetime.timedelta(days=7),
+            'preferred_time': 'morning',
+        })
+        self.assertEqual(reads, 1)
+        self.assertTrue(response.context['submitted'])
+        self.assertEqual(Appointment.objects.count(), 1)
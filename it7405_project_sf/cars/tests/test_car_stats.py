@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from cars import car_stats
+from cars.models import Car, CarStats, Offer, Order
+from cars.test_runner import MongoTestCase
+
+
+class CarStatsTest(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.car = Car.objects.create(
+            make='Ford', model='Focus', year=2019, price=Decimal('12500'),
+            description='', image_url='',
+        )
+
+    def offer(self, amount, status='pending'):
+        return Offer.objects.create(car=self.car, amount=Decimal(amount), status=status)
+
+    def stats(self):
+        return car_stats.get_car_stats(self.car._id)
+
+    def test_offer_created(self):
+        self.offer('900')
+        self.offer('1100.50')
+        stats = self.stats()
+        self.assertEqual(stats['offer_count'], 2)
+        self.assertEqual(stats['offer_max'], Decimal('1100.50'))
+        self.assertEqual(stats['offer_average'], Decimal('1000.25'))
+        self.assertEqual(stats['pending_offers'], 2)
+
+    def test_offer_changed_lowering_the_max_recomputes_it(self):
+        self.offer('900')
+        highest = self.offer('1500')
+        highest = Offer.objects.get(pk=highest.pk)
+        highest.amount = Decimal('700')
+        highest.status = 'rejected'
+        highest.save()
+
+        stats = self.stats()
+        self.assertEqual(stats['offer_max'], Decimal('900'))
+        self.assertEqual(stats['offer_average'], Decimal('800'))
+        self.assertEqual(stats['offers'], {'pending': 1, 'accepted': 0, 'rejected': 1})
+
+    def test_offer_changed_raising_an_amount(self):
+        lower = self.offer('900')
+        self.offer('1500')
+        lower = Offer.objects.get(pk=lower.pk)
+        lower.amount = Decimal('2000')
+        lower.save()
+        self.assertEqual(self.stats()['offer_max'], Decimal('2000'))
+
+    def test_offer_changed_below_the_max_keeps_it(self):
+        lower = self.offer('900')
+        self.offer('1500')
+        lower = Offer.objects.get(pk=lower.pk)
+        lower.amount = Decimal('800')
+        lower.save()
+        self.assertEqual(self.stats()['offer_max'], Decimal('1500'))
+
+    def test_offer_deleted_max_falls_back_to_the_next_highest(self):
+        self.offer('900')
+        self.offer('1200')
+        highest = self.offer('1500')
+        Offer.objects.get(pk=highest.pk).delete()
+
+        stats = self.stats()
+        self.assertEqual(stats['offer_count'], 2)
+        self.assertEqual(stats['offer_max'], Decimal('1200'))
+
+        for offer in Offer.objects.all():
+            offer.delete()
+        stats = self.stats()
+        self.assertEqual(stats['offer_count'], 0)
+        self.assertIsNone(stats['offer_max'])
+
+    def test_rebuild_matches_the_incremental_figures(self):
+        self.offer('900')
+        self.offer('1500', status='accepted')
+        Order.objects.create(car=self.car, full_name='Ann', email='ann@example.com', phone='1')
+        incremental = self.stats()
+
+        CarStats.objects.mongo_delete_many({})
+        self.assertEqual(car_stats.rebuild(), 1)
+        self.assertEqual(self.stats(), incremental)
+        self.assertEqual(incremental['order_count'], 1)
@@ -0,0 +1,51 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.urls import reverse
+
+from cars import conditional, recommendations
+from cars.models import Car, Offer
+from cars.test_runner import MongoTestCase
+
+
+class CarDetailConditionalTest(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cars = [
+            Car.objects.create(make='Ford', model='Focus', year=2015 + i, price=Decimal(9000 + i),
+                               description='', image_url='')
+            for i in range(3)
+        ]
+        recommendations.build_all()
+        self.url = reverse('car_detail', args=[self.cars[0].mongo_id])
+
+    def get(self, **headers):
+        with mock.patch.object(conditional, 'car_with_stats_pipeline',
+                               wraps=conditional.car_with_stats_pipeline) as car_reads, \
+             mock.patch.object(conditional, 'similar_cars_pipeline',
+                               wraps=conditional.similar_cars_pipeline) as similar_reads:
+            response = self.client.get(self.url, **headers)
+        self.assertEqual((car_reads.call_count, similar_reads.call_count), (1, 1))
+        return response
+
+    def test_validators_and_page_share_one_read(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['other_cars']), 2)
+
+        response = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_a_new_offer_changes_the_etag(self):
+        etag = self.get()['ETag']
+        Offer.objects.create(car=self.cars[0], amount=Decimal('8000'))
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['car_stats']['offer_count'], 1)
+
+    def test_unknown_car(self):
+        response = self.client.get(reverse('car_detail', args=['0' * 24]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('car_detail', args=['nope']))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,141 @@
+import base64
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from cars.models import Car, Review
+from cars.queries import (
+    CAR_CURSOR_FIELDS, CAR_SORTS, REVIEW_CURSOR_FIELDS, decode_car_cursor, decode_review_cursor,
+    encode_cursor, fetch_car_page, parse_car_filters,
+)
+from cars.test_runner import MongoTestCase
+
+
+def cursor(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+OID = str(ObjectId())
+
+BAD_CAR_CURSORS = [
+    'not a cursor!',
+    cursor('not json'),
+    cursor('{"price": 1}'),
+    cursor('[1, 2020]'),
+    # json_util errors
+    cursor('[1, 2020, {"$oid": "zz"}]'),
+    cursor(f'[{{"$numberDecimal": "abc"}}, 2020, {{"$oid": "{OID}"}}]'),
+    cursor(f'[{{"$date": "2020"}}, 2020, {{"$oid": "{OID}"}}]'),
+    cursor(f'[{{"$date": 1e300}}, 2020, {{"$oid": "{OID}"}}]'),
+    # values of the wrong type
+    cursor(f'["cheap", 2020, {{"$oid": "{OID}"}}]'),
+    cursor(f'[true, 2020, {{"$oid": "{OID}"}}]'),
+    cursor('[1, 2020, "not an id"]'),
+    cursor(f'[1, [2020], {{"$oid": "{OID}"}}]'),
+]
+
+# operators smuggled into $match
+INJECTED_CAR_CURSORS = [
+    cursor('[{"$ne": null}, {"$ne": null}, {"$ne": null}]'),
+    cursor(f'[{{"$gt": 0}}, 2020, {{"$oid": "{OID}"}}]'),
+    cursor(f'[1, {{"$where": "sleep(1000)"}}, {{"$oid": "{OID}"}}]'),
+    cursor(f'[{{"$regex": ".*"}}, 2020, {{"$oid": "{OID}"}}]'),
+]
+
+BAD_REVIEW_CURSORS = [
+    cursor(f'[{{"$numberDecimal": "4"}}, {{"$date": "2024-01-01T00:00:00Z"}}, {{"$oid": "{OID}"}}]'),
+    cursor(f'[5, "yesterday", {{"$oid": "{OID}"}}]'),
+    cursor(f'[5, {{"$date": "2024"}}, {{"$oid": "{OID}"}}]'),
+    cursor(f'[{{"$gte": 1}}, {{"$date": "2024-01-01T00:00:00Z"}}, {{"$oid": "{OID}"}}]'),
+    cursor(f'[5, {{"$ne": null}}, {{"$oid": "{OID}"}}]'),
+]
+
+
+class DecodeCursorTest(SimpleTestCase):
+
+    def test_round_trip(self):
+        doc = {'price': Decimal128('12500.00'), 'year': 2019, '_id': ObjectId()}
+        self.assertEqual(decode_car_cursor(encode_cursor(doc, CAR_CURSOR_FIELDS)), doc)
+
+    def test_missing_field_round_trips_as_none(self):
+        doc = {'year': 2019, '_id': ObjectId()}
+        self.assertEqual(
+            decode_car_cursor(encode_cursor(doc, CAR_CURSOR_FIELDS)),
+            dict(doc, price=None),
+        )
+
+    def test_bad_and_injected_cursors_mean_first_page(self):
+        for value in BAD_CAR_CURSORS + INJECTED_CAR_CURSORS:
+            with self.subTest(cursor=value):
+                self.assertIsNone(decode_car_cursor(value))
+
+    def test_review_cursors(self):
+        doc = {'rating': 4, 'created_at': datetime(2024, 1, 1, tzinfo=timezone.utc), '_id': ObjectId()}
+        self.assertEqual(decode_review_cursor(encode_cursor(doc, REVIEW_CURSOR_FIELDS)), doc)
+        for value in BAD_REVIEW_CURSORS:
+            with self.subTest(cursor=value):
+                self.assertIsNone(decode_review_cursor(value))
+
+
+class CarListCursorTest(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cars = [
+            Car.objects.create(
+                make='Ford', model='Focus', year=2015 + i, price=Decimal(10000 + i),
+                description='', image_url='',
+            )
+            for i in range(3)
+        ]
+
+    def test_bad_cursors_give_the_first_page(self):
+        for name in ('car_list', 'car_list_more'):
+            for value in BAD_CAR_CURSORS + INJECTED_CAR_CURSORS:
+                with self.subTest(view=name, cursor=value):
+                    response = self.client.get(reverse(name), {'after': value})
+                    self.assertEqual(response.status_code, 200)
+                    content = b''.join(response) if response.streaming else response.content
+                    for car in self.cars:
+                        self.assertIn(str(car.pk).encode(), content)
+
+
+    def test_cars_without_a_price_or_year_are_paged_through(self):
+        # not possible through the form, but imports and raw writes can
+        Car.objects.mongo_insert_one({'make': 'Kia', 'model': 'Rio', 'year': 2016})
+        Car.objects.mongo_insert_one({'make': 'Kia', 'model': 'Rio', 'year': 2016, 'price': None})
+        Car.objects.mongo_insert_one({'make': 'Kia', 'model': 'Ceed', 'price': Decimal128('10001')})
+
+        for sort in CAR_SORTS:
+            with self.subTest(sort=sort):
+                filters = parse_car_filters({'sort': sort})
+                everything, _ = fetch_car_page(filters, page_size=100)
+                self.assertEqual(len(everything), 6)
+
+                paged, after = [], None
+                while True:
+                    cars, next_cursor = fetch_car_page(filters, after=after, page_size=2)
+                    paged += cars
+                    if next_cursor is None:
+                        break
+                    after = decode_car_cursor(next_cursor)
+                self.assertEqual([car.pk for car in paged], [car.pk for car in everything])
+
+
+class ReviewsCursorTest(MongoTestCase):
+
+    def test_bad_cursors_give_the_first_page(self):
+        for rating in (5, 3):
+            Review.objects.create(full_name='Ann', email='ann@example.com', rating=rating,
+                                  comment=f'rated {rating}')
+        for param in ('after', 'before'):
+            for value in BAD_REVIEW_CURSORS + INJECTED_CAR_CURSORS:
+                with self.subTest(param=param, cursor=value):
+                    response = self.client.get(reverse('reviews'), {param: value, 'sort': 'rating_high'})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertContains(response, 'rated 5')
+                    self.assertContains(response, 'rated 3')
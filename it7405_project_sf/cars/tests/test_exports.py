@@ -0,0 +1,58 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest import mock
+
+from cars import exports
+from cars.exports import csv_cell, export_lines
+from cars.models import Car, Order
+from cars.test_runner import MongoTestCase
+
+
+class CsvExportTest(MongoTestCase):
+
+    def test_csv_cell(self):
+        for value in ('=1+2', '+1', '-2+3', '@SUM(A1)', '\t=1', '\r=1'):
+            with self.subTest(value=value):
+                self.assertEqual(csv_cell(value), "'" + value)
+        for value in ('Ann', '1=1', '', 12):
+            with self.subTest(value=value):
+                self.assertEqual(csv_cell(value), value)
+
+    def test_formulas_in_orders_are_neutralized(self):
+        car = Car.objects.create(make='Ford', model='Focus', year=2019, price=Decimal('9000'),
+                                 description='', image_url='')
+        Order.objects.create(car=car, full_name='=HYPERLINK("http://x.test","click")',
+                             email='ann@example.com', phone='+1 555 0100', message='@cmd')
+
+        csv_text = ''.join(export_lines('orders', 'csv'))
+        row = list(csv.DictReader(io.StringIO(csv_text)))[0]
+        self.assertEqual(row['full_name'], '\'=HYPERLINK("http://x.test","click")')
+        self.assertEqual(row['phone'], "'+1 555 0100")
+        self.assertEqual(row['message'], "'@cmd")
+        self.assertEqual(row['car'], 'Ford Focus (2019)')
+
+        # JSON lines are data, not spreadsheet cells: left as they are
+        jsonl = ''.join(export_lines('orders', 'jsonl'))
+        self.assertIn('"full_name": "=HYPERLINK', jsonl)
+
+
+class StreamingExportTest(MongoTestCase):
+
+    def test_the_first_row_does_not_wait_for_the_batch(self):
+        car = Car.objects.create(make='Ford', model='Focus', year=2019, price=Decimal('9000'),
+                                 description='', image_url='')
+        orders = [
+            Order.objects.create(car=car, full_name=f'Buyer {i}', email='b@example.com', phone='1')
+            for i in range(3)
+        ]
+
+        with mock.patch.object(exports, '_row', wraps=exports._row) as rows:
+            lines = export_lines('orders', 'jsonl', batch_size=3)
+            first = json.loads(next(lines))
+            self.assertEqual(rows.call_count, 1)
+            rest = ''.join(lines).splitlines()
+
+        self.assertEqual(first['id'], str(orders[0]._id))
+        self.assertEqual([json.loads(line)['full_name'] for line in rest], ['Buyer 1', 'Buyer 2'])
@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from bson.decimal128 import Decimal128
+from django.template import Context, Template
+from django.urls import reverse
+
+from cars import recommendations
+from cars.models import Car, Review
+from cars.templatetags.fragment_cache import fragment_cache, fragment_cache_stats
+from cars.test_runner import MongoTestCase
+
+
+class FragmentCacheTest(MongoTestCase):
+
+    def test_hits_and_misses_are_counted_in_process(self):
+        template = Template("{% load fragment_cache %}{% cachefragment 'test' n %}{{ n }}{% endcachefragment %}")
+        before = fragment_cache_stats()
+        for n in (1, 1, 1, 2):
+            self.assertEqual(template.render(Context({'n': n})), str(n))
+        after = fragment_cache_stats()
+
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['misses'] - before['misses'], 2)
+        # only the two fragments are stored, no counters
+        self.assertEqual(len(fragment_cache()._cache), 2)
+
+
+class ReviewPageFragmentTest(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for rating in (5, 4, 2):
+            Review.objects.create(full_name='Ann', email='ann@example.com', rating=rating,
+                                  comment=f'rated {rating}')
+
+    def fragment_keys(self):
+        return [key for key in fragment_cache()._cache if ':fragment:review_page:' in key]
+
+    def test_query_string_noise_shares_one_fragment(self):
+        for noise in ('1', '2', '3'):
+            response = self.client.get(reverse('reviews'), {'utm_source': noise, 'after': noise * 20})
+            self.assertEqual(len(response.context['page_reviews']), 3)
+        self.assertEqual(len(self.fragment_keys()), 1)
+
+    def test_sort_and_filter_get_their_own_fragment(self):
+        self.client.get(reverse('reviews'))
+        self.client.get(reverse('reviews'), {'sort': 'rating_low'})
+        response = self.client.get(reverse('reviews'), {'rating': '4plus'})
+        self.assertEqual(sorted(r.rating for r in response.context['page_reviews']), [4, 5])
+        self.assertEqual(len(self.fragment_keys()), 3)
+
+
+class SimilarCarsFragmentTest(MongoTestCase):
+
+    def test_a_rebuild_reaches_the_cached_fragment(self):
+        cars = [
+            Car.objects.create(make='Ford', model='Focus', year=2015 + i, price=Decimal(9000 + i),
+                               description='', image_url='')
+            for i in range(3)
+        ]
+        recommendations.build_all()
+        url = reverse('car_detail', args=[cars[0].mongo_id])
+        self.client.get(url)
+
+        # added outside the ORM: no signal, the "car" version stays put
+        new_id = Car.objects.mongo_insert_one({
+            'make': 'Ford', 'model': 'Focus', 'year': 2015, 'price': Decimal128('9000.50'),
+            'description': '', 'image_url': '',
+        }).inserted_id
+        recommendations.build_all()
+
+        response = self.client.get(url)
+        self.assertContains(response, reverse('car_detail', args=[str(new_id)]))
@@ -0,0 +1,43 @@
+import io
+import shutil
+import tempfile
+
+from django.test import override_settings
+from PIL import Image
+
+from cars import counters, importer, versions
+from cars.models import Car, SimilarCars
+from cars.test_runner import MongoTestCase
+
+
+class FinishImportTest(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.photo = f'{self.media}/photo.png'
+        Image.new('RGB', (640, 480), 'red').save(self.photo)
+
+    def test_import_then_finish(self):
+        feed = io.StringIO(
+            "make,model,year,price,description,image_url\n"
+            f"Ford,Focus,2019,\"$12,500\",Clean,{self.photo}\n"
+            # an image that cannot be read leaves the car as it is
+            f"Kia,Rio,2020,9900,Small,{self.media}/missing.png\n"
+            "Kia,Rio,nope,9900,Small,\n"
+        )
+        stats = importer.import_cars(importer.iter_rows(feed, 'csv'))
+        self.assertEqual((stats.inserted, stats.rejected), (2, 1))
+
+        version = versions.get_versions()['car']
+        with override_settings(MEDIA_ROOT=self.media):
+            importer.finish_import(stdout=io.StringIO())
+
+        self.assertEqual(counters.get_counters()['cars'], 2)
+        self.assertGreater(versions.get_versions()['car'], version)
+        self.assertEqual(SimilarCars.objects.count(), 2)
+        ford = Car.objects.mongo_find_one({'make': 'Ford'})
+        self.assertEqual(ford['image_source'], self.photo)
+        self.assertTrue(ford['image_key'])
+        self.assertNotIn('image_key', Car.objects.mongo_find_one({'make': 'Kia'}))
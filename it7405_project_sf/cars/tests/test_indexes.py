@@ -0,0 +1,15 @@
+from cars.indexes import declared_indexes
+from cars.mongo import get_collection
+from cars.test_runner import MongoTestCase
+
+
+class MigrationIndexesTest(MongoTestCase):
+
+    def test_migrations_build_every_declared_index(self):
+        # the test database was migrated from scratch
+        missing = []
+        for model, name, keys, unique in declared_indexes():
+            info = get_collection(model).index_information().get(name)
+            if info is None or [(k, int(d)) for k, d in info['key']] != keys:
+                missing.append(f"{model._meta.db_table}.{name}")
+        self.assertEqual(missing, [])
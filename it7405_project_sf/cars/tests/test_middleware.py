@@ -0,0 +1,47 @@
+import asyncio
+import shutil
+import tempfile
+
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from cars.middleware import StaticFilesMiddleware
+
+
+class AsyncMiddlewareChainTest(SimpleTestCase):
+
+    @override_settings(DEBUG=True)
+    def test_asgi_chain_is_not_adapted(self):
+        # with DEBUG, Django logs every middleware it has to wrap in
+        # sync_to_async; none may be
+        handler = ASGIHandler()
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler.load_middleware(is_async=True)
+        self.assertTrue(asyncio.iscoroutinefunction(handler._middleware_chain))
+
+
+class StaticFilesMiddlewareTest(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        with open(f'{self.root}/site.css', 'w') as f:
+            f.write('body { color: red }')
+
+    async def get_response(self, request):
+        return HttpResponse('from the view')
+
+    def test_async_serves_static_files_and_passes_the_rest_on(self):
+        with override_settings(STATIC_ROOT=self.root):
+            middleware = StaticFilesMiddleware(self.get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+
+        factory = RequestFactory()
+        response = asyncio.run(middleware(factory.get('/static/site.css')))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'body { color: red }')
+        response.close()
+
+        response = asyncio.run(middleware(factory.get('/cars/')))
+        self.assertEqual(response.content, b'from the view')
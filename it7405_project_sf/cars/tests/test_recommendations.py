@@ -0,0 +1,39 @@
+from decimal import Decimal
+
+from cars import jobs
+from cars.models import Car, Job, SimilarCars
+from cars.mongo import get_collection
+from cars.test_runner import MongoTestCase
+
+
+class RefreshSimilarJobTest(MongoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cars = [
+            Car.objects.create(make='Ford', model='Focus', year=2015 + i, price=Decimal(9000 + i),
+                               description='', image_url='')
+            for i in range(3)
+        ]
+
+    def similar(self, car):
+        doc = SimilarCars.objects.mongo_find_one({'car_id': car._id}, {'similar': 1})
+        return None if doc is None else set(doc['similar'])
+
+    def test_saving_a_car_queues_the_refresh(self):
+        # nothing is recomputed while saving
+        self.assertIsNone(self.similar(self.cars[0]))
+        self.assertEqual(get_collection(Job).count_documents({'task': 'refresh_similar'}), 3)
+
+        self.assertEqual(jobs.run_batch(), (3, 0, 0))
+        self.assertEqual(self.similar(self.cars[0]), {self.cars[1]._id, self.cars[2]._id})
+
+    def test_deleting_a_car_queues_its_removal(self):
+        jobs.run_batch()
+        gone = self.cars[2]._id
+        self.cars[2].delete()
+        self.assertEqual(self.similar(self.cars[0]), {self.cars[1]._id, gone})
+
+        jobs.run_batch()
+        self.assertIsNone(SimilarCars.objects.mongo_find_one({'car_id': gone}))
+        self.assertEqual(self.similar(self.cars[0]), {self.cars[1]._id})
@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+import mongomock
+from bson.decimal128 import Decimal128
+from django.test import SimpleTestCase, override_settings
+
+from cars import loadtest, standin, synthetic
+from cars.test_runner import MongoTestCase
+
+
+class StandInTest(SimpleTestCase):
+
+    def setUp(self):
+        standin.install()
+        self.db = mongomock.MongoClient().db
+
+    def test_decimal128_sorts_and_compares_as_number(self):
+        self.db.cars.insert_many([
+            {'price': Decimal128('15000.50')}, {'price': Decimal128('900')}, {'price': 12000},
+        ])
+        prices = [doc['price'] for doc in self.db.cars.find().sort('price', 1)]
+        self.assertEqual([Decimal(str(p)) for p in prices], [900, 12000, Decimal('15000.50')])
+        self.assertEqual(self.db.cars.count_documents({'price': {'$gte': 12000}}), 2)
+
+    def test_decimal128_max_and_inc(self):
+        self.db.stats.insert_one({'_id': 1, 'total': 0})
+        self.db.stats.update_one({'_id': 1}, {
+            '$inc': {'total': Decimal128('10.25')}, '$max': {'highest': Decimal128('10.25')},
+        })
+        self.db.stats.update_one({'_id': 1}, {
+            '$inc': {'total': Decimal128('4.75')}, '$max': {'highest': Decimal128('4.75')},
+        })
+        doc = self.db.stats.find_one({'_id': 1})
+        self.assertEqual(doc['total'].to_decimal(), Decimal('15.00'))
+        self.assertEqual(doc['highest'].to_decimal(), Decimal('10.25'))
+
+    def test_decimal128_equality_ignores_the_scale(self):
+        self.db.stats.insert_one({'highest': Decimal128('1500')})
+        self.assertEqual(self.db.stats.count_documents({'highest': Decimal128('1500.00')}), 1)
+
+    def test_push_leaves_out_missing_fields(self):
+        self.db.rows.insert_many([{'car': 1, 'sum': 5}, {'car': 1}])
+        doc = next(self.db.rows.aggregate([
+            {'$group': {'_id': '$car', 'rows': {'$push': {'car': '$car', 'sum': '$sum'}}}},
+        ]))
+        self.assertEqual(doc['rows'], [{'car': 1, 'sum': 5}, {'car': 1}])
+
+    def test_union_with(self):
+        self.db.offers.insert_one({'kind': 'offer'})
+        self.db.orders.insert_many([{'kind': 'order'}, {'kind': 'order'}])
+        docs = list(self.db.offers.aggregate([
+            {'$unionWith': {'coll': 'orders', 'pipeline': [{'$project': {'_id': 0, 'kind': 1}}]}},
+        ]))
+        self.assertEqual([d['kind'] for d in docs], ['offer', 'order', 'order'])
+
+    def test_nested_inclusion_projection(self):
+        self.db.lists.insert_one({'cars': [{'make': 'Ford', 'price': 1}, {'make': 'Kia', 'price': 2}]})
+        doc = next(self.db.lists.aggregate([{'$project': {'_id': 0, 'cars': {'make': 1}}}]))
+        self.assertEqual(doc, {'cars': [{'make': 'Ford'}, {'make': 'Kia'}]})
+
+
+# the load-test client talks to localhost
+@override_settings(ALLOWED_HOSTS=['localhost'])
+class LoadtestEndpointsTest(MongoTestCase):
+
+    def test_every_endpoint_is_served(self):
+        synthetic.seed(cars=20, users=2, reviews=5, orders=5, offers=5, appointments=5)
+        for name, *_ in loadtest.ENDPOINTS:
+            with self.subTest(endpoint=name):
+                result = loadtest.run(requests=3, concurrency=1, only=[name])
+                endpoint = result['endpoints'].get(name)
+                self.assertIsNotNone(endpoint, "never requested")
+                self.assertEqual(endpoint['errors'], 0, endpoint['first_error'])
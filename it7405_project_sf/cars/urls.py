@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('cars/', views.car_list, name='car_list'),
+    path('cars/more/', views.car_list_more, name='car_list_more'),
     path('cars/<str:id>/', views.car_detail, name='car_detail'),
     path('cars/<str:id>/buy/', views.buy_car, name='buy_car'),
     path('cars/<str:id>/offer/', views.make_offer, name='make_offer'),
@@ -11,6 +12,8 @@ urlpatterns = [
     # New pages:
     path('reviews/', views.reviews_page, name='reviews'),
     path('appointments/', views.appointment_page, name='appointments'),
+    path('appointments/cars/', views.car_choice_search, name='car_choice_search'),
+    path('appointments/availability/', views.appointment_availability, name='appointment_availability'),
     path('my-activity/', views.my_activity, name='my_activity'),
 
     path('my-activity/order/<str:order_id>/delete/', views.delete_order, name='delete_order'),
@@ -19,6 +22,9 @@ urlpatterns = [
     path('my-activity/review/<str:review_id>/edit/', views.edit_review, name='edit_review'),
     path('my-activity/review/<str:review_id>/delete/', views.delete_review, name='delete_review'),
     path("account/", views.account_settings, name="account_settings"),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
+    path('pool-stats/', views.pool_stats, name='pool_stats'),
+    path('staff/export/<str:kind>/', views.export_data, name='export_data'),
 
 
 ]
@@ -0,0 +1,75 @@
+"""
+Per-model change versions.
+
+A version is a counter that goes up every time a row of that model is
+saved or deleted (see cars/signals.py). Anything derived from the data
+can be cached under a key that contains the version: when the data
+changes the key changes, and the stale entry is simply never read again.
+The time of the last change is stored next to it, for Last-Modified
+headers (see cars/conditional.py).
+
+The counters live in the SiteCounter collection ("version:car", ...) so
+that every process sees the same values. They are read once per request.
+"""
+from .models import SiteCounter
+from .queries import aware
+
+
+VERSIONED_MODELS = ('car', 'review')
+
+
+def _counter_name(name):
+    return f'version:{name}'
+
+
+def bump(name):
+    SiteCounter.objects.mongo_update_one(
+        {'name': _counter_name(name)},
+        {'$inc': {'value': 1}, '$currentDate': {'changed_at': True}},
+        upsert=True,
+    )
+
+
+VERSIONS_QUERY = {'name': {'$in': [_counter_name(n) for n in VERSIONED_MODELS]}}
+VERSIONS_PROJECTION = {'_id': 0, 'name': 1, 'value': 1, 'changed_at': 1}
+
+
+def _load(request=None):
+    """
+    {model name: (version, changed_at)} in one query, memoized on the
+    request so templates and views can ask for it many times.
+    """
+    if request is not None and hasattr(request, '_model_versions'):
+        return request._model_versions
+
+    docs = SiteCounter.objects.mongo_find(VERSIONS_QUERY, VERSIONS_PROJECTION)
+    return versions_from_docs(docs, request)
+
+
+def versions_from_docs(docs, request=None):
+    """
+    Build the _load() result from VERSIONS_QUERY rows (and memoize it on
+    the request). The async views read the rows with their own client.
+    """
+    versions = dict.fromkeys(VERSIONED_MODELS, (0, None))
+    for doc in docs:
+        name = doc['name'].split(':', 1)[1]
+        versions[name] = (doc.get('value', 0), aware(doc.get('changed_at')))
+
+    if request is not None:
+        request._model_versions = versions
+    return versions
+
+
+def get_versions(request=None):
+    """
+    {model name: version} for every versioned model.
+    """
+    return {name: value for name, (value, _) in _load(request).items()}
+
+
+def last_changed(name, request=None):
+    """
+    When a row of the model was last saved or deleted (None if unknown).
+    """
+    return _load(request)[name][1]
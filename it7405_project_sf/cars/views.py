@@ -1,14 +1,17 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
 from bson import ObjectId
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from .models import Car, Review, Appointment
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.contrib import messages
 
-from django.http import HttpResponseForbidden, Http404
+from django.conf import settings
+from django.http import HttpResponseForbidden, Http404, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.views.decorators.http import condition
 from bson.errors import InvalidId
 
 from .forms import UserUpdateForm
@@ -22,6 +25,32 @@ from .forms import (
     ReviewForm,
     AppointmentForm,
 )
+from . import conditional
+from .jobs import enqueue
+from .car_choices import label_for_car_id, search_car_labels
+from .slots import SlotFull, month_availability
+from .counters import get_counters
+from .car_stats import stats_from_doc
+from .exports import EXPORTS, EXPORT_FORMATS, export_lines
+from .recommendations import similar_cars_changed, similar_cars_from_docs
+from .queries import (
+    CarPageStream,
+    car_from_doc,
+    parse_car_filters,
+    decode_car_cursor,
+    fetch_car_page,
+    REVIEW_RATING_FILTERS,
+    REVIEW_SORTS,
+    decode_review_cursor,
+    fetch_review_page,
+    ACTIVITY_SECTION_SIZE,
+    parse_activity_limits,
+    fetch_user_activity,
+)
+from .review_stats import get_review_stats
+from .streaming import render_chunks, stream_template
+from .templatetags.fragment_cache import fragment_cache_stats
+from .pool_metrics import pool_metrics
 
 def mongo_pk_or_404(hex_id):
     """
@@ -35,16 +64,23 @@ def mongo_pk_or_404(hex_id):
 
 
 def home(request):
-    total_cars = Car.objects.count()
-    total_reviews = Review.objects.count()
-    total_appointments = Appointment.objects.count()
+    # Materialized counters: one small query instead of three count()s
+    counters = get_counters()
 
-    context = {
-        'total_cars': total_cars,
-        'total_reviews': total_reviews,
-        'total_appointments': total_appointments,
+    # Average rating + latest reviews from the precomputed review stats
+    review_stats = get_review_stats()
+
+    return render(request, 'cars/home.html', home_context(counters, review_stats))
+
+
+def home_context(counters, review_stats):
+    return {
+        'total_cars': counters['cars'],
+        'total_reviews': counters['reviews'],
+        'total_appointments': counters['appointments'],
+        'average_rating': review_stats['average'],
+        'latest_reviews': review_stats['latest'][:3],
     }
-    return render(request, 'cars/home.html', context)
 
 
 
@@ -58,6 +94,7 @@ def signup(request):
             user.last_name  = form.cleaned_data.get("last_name")
             user.email      = form.cleaned_data.get("email")
             user.save()
+            enqueue('welcome_email', user_id=user.pk)
             return redirect('login')
     else:
         form = CustomUserCreationForm()
@@ -66,41 +103,103 @@ def signup(request):
 
 
 
-def car_list(request):
-    q = request.GET.get('q')
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    year = request.GET.get('year')
+def car_page_context(request):
+    """
+    Shared by car_list and car_list_more: run the catalog query for the
+    page that starts after ?after=<cursor>.
+    """
+    filters = parse_car_filters(request.GET)
+    after = decode_car_cursor(request.GET.get('after'))
 
-    cars = Car.objects.all()
+    # One aggregation: filter + keyset page + sort + projection, all in MongoDB
+    cars, next_cursor = fetch_car_page(filters, after=after)
+    return car_list_context(request, cars, next_cursor, after)
 
-    if q:
-        cars = cars.filter(
-            Q(make__icontains=q) |
-            Q(model__icontains=q)
-        )
 
-    if min_price:
-        cars = cars.filter(price__gte=min_price)
+def car_list_context(request, cars, next_cursor, after):
+    # Keep the current filters in the "load more" links
+    params = request.GET.copy()
+    params.pop('after', None)
 
-    if max_price:
-        cars = cars.filter(price__lte=max_price)
+    return {
+        'cars': cars,
+        'next_cursor': next_cursor,
+        'is_first_page': after is None,
+        'filter_query': params.urlencode(),
+    }
 
-    if year:
-        cars = cars.filter(year=year)
 
-    return render(request, 'cars/car_list.html', {'cars': cars})
+# 304 Not Modified before any query runs; see cars/conditional.py
+@condition(etag_func=conditional.car_list_etag,
+           last_modified_func=conditional.car_list_last_modified)
+def car_list(request):
+    if settings.CAR_LIST_STREAMING:
+        return car_list_streaming(request)
+    return render(request, 'cars/car_list.html', car_page_context(request))
 
 
-def car_detail(request, id):
-    car = Car.objects.get(_id=ObjectId(id))
+def car_list_streaming(request):
+    """
+    car_list as a streamed response: head and filter form first, then the
+    cards in chunks of CAR_LIST_PAGE_SIZE straight from the cursor, then
+    the "load more" link (see cars/streaming.py).
+    """
+    after = decode_car_cursor(request.GET.get('after'))
+    stream = CarPageStream(
+        parse_car_filters(request.GET),
+        after=after,
+        page_size=settings.CAR_LIST_STREAM_PAGE_SIZE,
+    )
+    context = car_list_context(request, [], None, after)
+
+    def cards():
+        return render_chunks(request, 'cars/car_cards.html', stream)
+
+    def footer():
+        yield render_to_string('cars/car_list_footer.html', dict(
+            context, cars=stream.count, next_cursor=stream.next_cursor,
+        ), request)
+
+    return stream_template(request, 'cars/car_list.html', context, {
+        'car_stream': cards,
+        'car_stream_footer': footer,
+    })
+
+
+def car_list_more(request):
+    """
+    HTML fragment with the next page of car cards, used for infinite scroll.
+    The cursor for the page after this one is sent in the X-Next-Cursor
+    header (empty on the last page).
+    """
+    context = car_page_context(request)
+    response = render(request, 'cars/car_cards.html', context)
+    response['X-Next-Cursor'] = context['next_cursor'] or ''
+    return response
 
-    # Get other cars (exclude current one)
-    other_cars = Car.objects.filter().exclude(_id=ObjectId(id))[:6]  # limit to 6
+
+@condition(etag_func=conditional.car_detail_etag,
+           last_modified_func=conditional.car_detail_last_modified)
+def car_detail(request, id):
+    # The car with its offer/order figures (cars/car_stats.py) and its
+    # precomputed similar cars: one query each, already run by the
+    # ETag / Last-Modified validators
+    car_docs, similar_docs = conditional.car_detail_docs(request, mongo_pk_or_404(id))
+    if not car_docs:
+        raise Http404("Car not found.")
+    car = car_from_doc(car_docs[0])
+    car.updated_at = car_docs[0].get('updated_at')
+
+    # any 6 other cars until the recommendations have been built for this car
+    other_cars = similar_cars_from_docs(similar_docs)
+    if other_cars is None:
+        other_cars = Car.objects.filter().exclude(_id=ObjectId(id))[:6]  # limit to 6
 
     return render(request, 'cars/car_detail.html', {
         'car': car,
+        'car_stats': stats_from_doc(car_docs[0].get('stats')),
         'other_cars': other_cars,
+        'similar_changed': similar_cars_changed(similar_docs),
     })
 
 
@@ -116,6 +215,8 @@ def buy_car(request, id):
             if request.user.is_authenticated:
                 order.user = request.user
             order.save()
+            # the confirmation email goes out from the job queue
+            enqueue('order_confirmation', order_id=str(order._id))
             return redirect('car_detail', id=car.mongo_id)
     else:
         form = OrderForm()
@@ -134,6 +235,7 @@ def make_offer(request, id):
             if request.user.is_authenticated:
                 offer.user = request.user
             offer.save()
+            enqueue('offer_confirmation', offer_id=str(offer._id))
             return redirect('car_detail', id=car.mongo_id)
     else:
         form = OfferForm()
@@ -143,40 +245,12 @@ def make_offer(request, id):
 
 
 
+@condition(etag_func=conditional.reviews_etag,
+           last_modified_func=conditional.reviews_last_modified)
 def reviews_page(request):
-    # Base queryset: all reviews
-    all_reviews_qs = Review.objects.all()
-
-    # --- Filtering by rating ---
-    rating_filter = request.GET.get('rating', 'all')
-    if rating_filter == '5':
-        all_reviews_qs = all_reviews_qs.filter(rating=5)
-    elif rating_filter == '4plus':
-        all_reviews_qs = all_reviews_qs.filter(rating__gte=4)
-    elif rating_filter == '3plus':
-        all_reviews_qs = all_reviews_qs.filter(rating__gte=3)
-    # else -> "all": no filter
-
-    # --- Sorting ---
-    sort = request.GET.get('sort', 'newest')
-    if sort == 'oldest':
-        all_reviews_qs = all_reviews_qs.order_by('created_at')
-    elif sort == 'rating_high':
-        all_reviews_qs = all_reviews_qs.order_by('-rating', '-created_at')
-    elif sort == 'rating_low':
-        all_reviews_qs = all_reviews_qs.order_by('rating', '-created_at')
-    else:  # newest
-        all_reviews_qs = all_reviews_qs.order_by('-created_at')
-
-    # --- Pagination ---
-    paginator = Paginator(all_reviews_qs, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Latest 4 reviews for the right preview list
-    latest_reviews = Review.objects.order_by('-created_at')[:4]
-
     # --- Handle POST (new review submission) ---
+    # Nothing is read from the database on this path unless the form has
+    # errors and the page has to be shown again.
     if request.method == 'POST':
         # If user not logged in → redirect to login
         if not request.user.is_authenticated:
@@ -196,14 +270,57 @@ def reviews_page(request):
     else:
         form = ReviewForm()
 
+    rating_filter, sort, after, before = review_page_params(request)
+
+    # --- Keyset pagination (?after=<cursor> / ?before=<cursor>) ---
+    reviews, next_cursor, prev_cursor = fetch_review_page(
+        rating_filter, sort, after=after, before=before,
+    )
+
+    # Histogram, per-filter totals and the latest reviews, precomputed
+    stats = get_review_stats()
+
     # Render template
-    return render(request, 'cars/reviews.html', {
+    return render(request, 'cars/reviews.html', reviews_context(
+        form, reviews, next_cursor, prev_cursor, stats, rating_filter, sort,
+    ))
+
+
+def review_page_params(request):
+    """
+    (rating filter, sort, after cursor, before cursor) from request.GET.
+    """
+    # --- Filtering by rating ---
+    rating_filter = request.GET.get('rating', 'all')
+    if rating_filter not in REVIEW_RATING_FILTERS:
+        rating_filter = 'all'
+
+    # --- Sorting ---
+    sort = request.GET.get('sort', 'newest')
+    if sort not in REVIEW_SORTS:
+        sort = 'newest'
+
+    after = decode_review_cursor(request.GET.get('after'))
+    before = decode_review_cursor(request.GET.get('before'))
+    return rating_filter, sort, after, before
+
+
+def reviews_context(form, reviews, next_cursor, prev_cursor, stats, rating_filter, sort):
+    return {
         'form': form,
-        'reviews': latest_reviews,
-        'page_obj': page_obj,
+        # Latest 4 reviews for the right preview list
+        'reviews': stats['latest'][:4],
+        'page_reviews': reviews,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'total_reviews': stats['filter_counts'][rating_filter],
+        'review_stats': stats,
         'current_sort': sort,
         'current_rating_filter': rating_filter,
-    })
+        # with the filter and sort, the first and last review pin the page
+        # down: the key of its cached fragment (not the raw query string)
+        'page_key': f"{reviews[0].pk}-{reviews[-1].pk}" if reviews else '',
+    }
 
 
 
@@ -217,44 +334,107 @@ def appointment_page(request):
     initial = {}
 
     if car_id:
-        try:
-            car = Car.objects.get(_id=ObjectId(car_id))
-            car_label = f"{car.make} {car.model} ({car.year})"
+        # resolved from the cached car list
+        car_label = label_for_car_id(car_id, request)
+        if car_label:
             initial['car_interest'] = car_label
-        except Car.DoesNotExist:
-            pass
 
     if request.method == 'POST':
-        form = AppointmentForm(request.POST)
+        form = AppointmentForm(request.POST, request=request)
         if form.is_valid():
             appointment = form.save(commit=False)
             if request.user.is_authenticated:
                 appointment.user = request.user
-            appointment.save()
-            submitted = True
-            # clear form after submit but keep same car preselected if present
-            form = AppointmentForm(initial=initial)
+            try:
+                appointment.save()
+            except SlotFull as e:
+                # taken by another request since the form was validated
+                form.add_error('preferred_time', str(e))
+            else:
+                enqueue('appointment_confirmation', appointment_id=str(appointment._id))
+                submitted = True
+                # clear form after submit but keep same car preselected if present
+                form = AppointmentForm(initial=initial, request=request)
     else:
-        form = AppointmentForm(initial=initial)
+        form = AppointmentForm(initial=initial, request=request)
 
     return render(request, 'cars/appointments.html', {
         'form': form,
         'submitted': submitted,
     })
 
+def car_choice_search(request):
+    """
+    JSON list of car labels matching ?q=..., for the appointment car picker.
+    """
+    term = (request.GET.get('q') or '').strip()
+    return JsonResponse({'results': search_car_labels(term, request=request)})
+
+def appointment_availability(request):
+    """
+    JSON availability of every test-drive slot in ?month=YYYY-MM (default:
+    the current month), for the appointment form's calendar.
+    """
+    today = timezone.localdate()
+    try:
+        year, month = (int(part) for part in (request.GET.get('month') or f"{today:%Y-%m}").split('-'))
+        if not (1 <= year <= 9999 and 1 <= month <= 12):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': "month must be YYYY-MM"}, status=400)
+    return JsonResponse(month_availability(year, month, today))
+
+@staff_member_required
+def cache_stats(request):
+    """
+    Hit/miss counts of the template fragment cache in this process (staff only).
+    """
+    return JsonResponse(fragment_cache_stats())
+
+@staff_member_required
+def pool_stats(request):
+    """
+    MongoDB connection pool counters of this process (staff only).
+    """
+    return JsonResponse(pool_metrics.snapshot())
+
+@staff_member_required
+def export_data(request, kind):
+    """
+    Staff download of all orders / offers / appointments (?format=csv|jsonl),
+    streamed from a MongoDB cursor batch by batch (see cars/exports.py).
+    """
+    fmt = request.GET.get('format', 'csv')
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export")
+
+    response = StreamingHttpResponse(export_lines(kind, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    # let a proxy pass chunks through instead of buffering the whole file
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def my_activity(request):
-    # Get objects linked to this user
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    offers = Offer.objects.filter(user=request.user).order_by('-created_at')
-    appointments = Appointment.objects.filter(user=request.user).order_by('-preferred_date')
-    reviews = Review.objects.filter(user=request.user).order_by('-created_at')
+    # Orders, offers, appointments and reviews of this user in ONE query,
+    # with the car of each order / offer joined in (no per-row lookups)
+    limits = parse_activity_limits(request.GET)
+    activity = fetch_user_activity(request.user, limits)
+
+    # "Show more" link per section: same page, that section's limit raised
+    more_links = {}
+    for section, data in activity.items():
+        if data['has_more']:
+            params = request.GET.copy()
+            params[section] = data['limit'] + ACTIVITY_SECTION_SIZE
+            more_links[section] = params.urlencode()
 
     context = {
-        'orders': orders,
-        'offers': offers,
-        'appointments': appointments,
-        'reviews': reviews,
+        'orders': activity['orders']['rows'],
+        'offers': activity['offers']['rows'],
+        'appointments': activity['appointments']['rows'],
+        'reviews': activity['reviews']['rows'],
+        'more_links': more_links,
     }
     return render(request, 'cars/my_activity.html', context)
 
@@ -377,103 +557,3 @@ def account_settings(request):
 
     return render(request, "cars/account_settings.html", {"form": form})
 
-
-from django.shortcuts import render
-from .models import Car
-
-
-def car_list(request):
-    # ---------- helper: safe numeric conversions ----------
-    def to_float(value):
-        """
-        Convert price to float safely.
-        Handles Decimal, int, '28900', '28,900', '$28900.00', etc.
-        Returns None if it cannot be parsed.
-        """
-        if value is None:
-            return None
-        try:
-            s = str(value)
-            s = s.replace(',', '').replace('$', '').strip()
-            if s == '':
-                return None
-            return float(s)
-        except (ValueError, TypeError):
-            return None
-
-    def year_key(car):
-        """
-        Year as int (or 0 if missing/invalid) used for sorting.
-        """
-        try:
-            return int(car.year)
-        except (ValueError, TypeError):
-            return 0
-
-    def price_key(car):
-        """
-        Price as float (or 0 if missing/invalid) used for sorting.
-        """
-        val = to_float(car.price)
-        return val if val is not None else 0.0
-
-    # ---------- load all cars once as a Python list ----------
-    cars = list(Car.objects.all())
-
-    # ---------- SEARCH ----------
-    search = (request.GET.get('search') or '').strip().lower()
-    if search:
-        cars = [
-            c for c in cars
-            if search in (c.make or '').lower()
-            or search in (c.model or '').lower()
-        ]
-
-    # ---------- MIN PRICE ----------
-    min_price_raw = (request.GET.get('min_price') or '').strip()
-    if min_price_raw:
-        try:
-            min_price_val = float(min_price_raw)
-            cars = [
-                c for c in cars
-                if (
-                    to_float(c.price) is not None
-                    and to_float(c.price) >= min_price_val
-                )
-            ]
-        except ValueError:
-            # ignore invalid min_price input
-            pass
-
-    # ---------- MAX PRICE ----------
-    max_price_raw = (request.GET.get('max_price') or '').strip()
-    if max_price_raw:
-        try:
-            max_price_val = float(max_price_raw)
-            cars = [
-                c for c in cars
-                if (
-                    to_float(c.price) is not None
-                    and to_float(c.price) <= max_price_val
-                )
-            ]
-        except ValueError:
-            # ignore invalid max_price input
-            pass
-
-    # ---------- SORTING ----------
-    sort = (request.GET.get('sort') or '').strip()
-
-    if sort == 'price_asc':
-        cars = sorted(cars, key=price_key)
-    elif sort == 'price_desc':
-        cars = sorted(cars, key=price_key, reverse=True)
-    elif sort == 'year_new':
-        cars = sorted(cars, key=year_key, reverse=True)
-    elif sort == 'year_old':
-        cars = sorted(cars, key=year_key)
-    else:
-        # default: newest year first, then cheaper price
-        cars = sorted(cars, key=lambda c: (-year_key(c), price_key(c)))
-
-    return render(request, 'cars/car_list.html', {'cars': cars})